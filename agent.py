@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import shlex
+import socket
+import threading
+import time
+
+import paramiko
+
+
+# Агент сбора метрик на хостах: скрипт collector_agent.py загружается по SFTP поверх существующего
+# SSH-соединения и запускается в отдельном долгоживущем канале; выборки приходят строками JSON.
+# Вместо нескольких процессов и разбора текстового вывода на каждую выборку — чтение /proc
+# одним процессом Python на хосте.
+
+AGENT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "collector_agent.py")
+REMOTE_DIR = ".monitoring_bot"
+
+# Код выхода, если на хосте нет python3
+NO_PYTHON = 127
+
+
+# Агент не может работать на хосте (нет python3) — метрики собираются командами, как раньше
+class AgentUnavailable(Exception):
+    pass
+
+
+def load_source(path=AGENT_SOURCE):
+    with open(path, "rb") as f:
+        source = f.read()
+    # Имя файла на хосте содержит хеш содержимого: новая версия агента загружается автоматически
+    return source, f"{REMOTE_DIR}/collector_agent-{hashlib.sha256(source).hexdigest()[:12]}.py"
+
+
+# Загрузка агента по SFTP, если этой версии на хосте ещё нет; файл записывается во временный
+# и переименовывается, чтобы одновременный запуск не увидел его недописанным
+def upload(transport, source, path):
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    try:
+        try:
+            sftp.stat(path)
+            return False
+        except IOError:
+            pass
+        try:
+            sftp.mkdir(REMOTE_DIR, 0o700)
+        except IOError:
+            pass
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with sftp.open(temporary, "wb") as f:
+            f.write(source)
+        sftp.posix_rename(temporary, path)
+        return True
+    finally:
+        sftp.close()
+
+
+def agent_command(path, interval):
+    return (
+        f"command -v python3 >/dev/null 2>&1 || exit {NO_PYTHON}; "
+        f"exec python3 -u {shlex.quote(path)} {float(interval)}"
+    )
+
+
+# Поток выборок с одного хоста: загрузка и запуск агента, чтение строк, переподключение
+# с экспоненциальной задержкой. connect() возвращает SSH-сессию хоста (запрашивается при каждом
+# запуске, чтобы после /disconnect_ssh использовать новую); on_sample(host, timestamp, metrics)
+# вызывается в потоке чтения
+class AgentStream:
+    def __init__(self, name, connect, interval, on_sample, source):
+        self.name = name
+        self.connect = connect
+        self.interval = interval
+        self.on_sample = on_sample
+        self.source = source
+        self.last_sample = None
+        self.unavailable = None
+        self._channel = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"agent-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    # Выборки приходят вовремя — периодический сбор командами для хоста не нужен
+    @property
+    def live(self):
+        return self.last_sample is not None and time.monotonic() - self.last_sample < self.interval * 3
+
+    def stop(self):
+        self._stop.set()
+        channel = self._channel
+        if channel is not None:
+            channel.close()
+
+    def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                self._stream()
+                delay = 1
+            except AgentUnavailable as e:
+                self.unavailable = str(e)
+                logging.warning("Агент сбора метрик не запущен на %s: %s", self.name, e)
+                return
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                logging.warning("Поток метрик с %s прерван: %s", self.name, e)
+            self._stop.wait(delay)
+            delay = min(delay * 2, 60)
+
+    def _stream(self):
+        source, path = self.source
+        session = self.connect()
+        if upload(session.transport(), source, path):
+            logging.info("Агент сбора метрик загружен на %s (%s)", self.name, path)
+        # Нет данных дольше нескольких интервалов — канал считается зависшим
+        channel = session.open_channel(agent_command(path, self.interval), timeout=self.interval * 3 + 10)
+        self._channel = channel
+        logging.info("Агент сбора метрик запущен на %s, интервал %s с", self.name, self.interval)
+        try:
+            for line in channel.makefile("r"):
+                try:
+                    metrics = json.loads(line)
+                except ValueError:
+                    logging.warning("Агент на %s прислал некорректную строку: %.100s", self.name, line)
+                    continue
+                self.last_sample = time.monotonic()
+                self.on_sample(self.name, time.time(), metrics)
+            status = channel.recv_exit_status()
+            error = channel.recv_stderr(4096).decode(errors="replace").strip() if channel.recv_stderr_ready() else ""
+        except socket.timeout:
+            raise Exception("нет данных от агента")
+        finally:
+            self._channel = None
+            self.last_sample = None
+            channel.close()
+        if status == NO_PYTHON:
+            raise AgentUnavailable("на хосте нет python3")
+        if not self._stop.is_set():
+            raise Exception(f"агент завершился с кодом {status}" + (f": {error.splitlines()[-1]}" if error else ""))
+
+
+# Агенты на всех хостах инвентаря; connect(host) возвращает SSH-сессию хоста
+class AgentCollector:
+    def __init__(self, connect, interval, on_sample):
+        self.connect = connect
+        self.interval = interval
+        self.on_sample = on_sample
+        self.streams = {}
+
+    def start(self, hosts):
+        source = load_source()
+        for host in hosts:
+            stream = AgentStream(host.name, lambda host=host: self.connect(host), self.interval, self.on_sample, source)
+            self.streams[host.name] = stream
+            stream.start()
+
+    def live(self, name):
+        stream = self.streams.get(name)
+        return stream is not None and stream.live
+
+    def stop(self):
+        for stream in self.streams.values():
+            stream.stop()
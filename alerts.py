@@ -0,0 +1,197 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+
+# Правило оповещения: метрика (или префикс вида "disk:"), условие, порог,
+# время удержания условия в секундах и гистерезис для снятия оповещения
+AlertRule = namedtuple("AlertRule", "metric op threshold duration hysteresis")
+
+# Переход состояния оповещения: firing — сработало, resolved — снято, event — разовое событие
+AlertEvent = namedtuple("AlertEvent", "kind rule host metric value")
+
+# Метрики-счётчики событий: каждое ненулевое значение — отдельное оповещение, без снятия
+EVENT_METRICS = ("journal_errors",)
+
+_RULE_RE = re.compile(r"^\s*([\w:./-]+?)\s*([<>])\s*([\d.]+)\s*(?:/\s*(\w+))?\s*(?:/\s*([\d.]+))?\s*$")
+
+
+def _duration(value):
+    units = {"s": 1, "m": 60, "h": 3600}
+    if not value:
+        return 0.0
+    if value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+# Разбор правил вида "disk:>90/5m,mem>90/5m/3,journal_errors>0":
+# <метрика><условие><порог>[/<время удержания>][/<гистерезис>]
+def parse_rules(spec, default_hysteresis=5.0):
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        match = _RULE_RE.match(item)
+        if not match:
+            raise ValueError(f"Не удалось разобрать правило оповещения: {item}")
+        metric, op, threshold, duration, hysteresis = match.groups()
+        rules.append(AlertRule(
+            metric, op, float(threshold), _duration(duration),
+            float(hysteresis) if hysteresis else default_hysteresis,
+        ))
+    return rules
+
+
+def _matches(rule, metric):
+    return metric.startswith(rule.metric) if rule.metric.endswith(":") else metric == rule.metric
+
+
+def _breached(rule, value):
+    return value > rule.threshold if rule.op == ">" else value < rule.threshold
+
+
+def _recovered(rule, value):
+    if rule.op == ">":
+        return value <= rule.threshold - rule.hysteresis
+    return value >= rule.threshold + rule.hysteresis
+
+
+# Движок оповещений: правила проверяются инкрементально по каждой новой выборке,
+# наружу отдаются только переходы состояния, поэтому одно и то же оповещение не повторяется
+class AlertEngine:
+    def __init__(self, rules):
+        self.rules = rules
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, host, timestamp, metrics):
+        events = []
+        with self._lock:
+            for rule in self.rules:
+                for metric, value in metrics.items():
+                    if not _matches(rule, metric):
+                        continue
+                    if metric in EVENT_METRICS:
+                        if _breached(rule, value):
+                            events.append(AlertEvent("event", rule, host, metric, value))
+                        continue
+                    key = (rule, host, metric)
+                    state = self._state.setdefault(key, {"since": None, "firing": False})
+                    if state["firing"]:
+                        if _recovered(rule, value):
+                            state.update(since=None, firing=False)
+                            events.append(AlertEvent("resolved", rule, host, metric, value))
+                    elif _breached(rule, value):
+                        if state["since"] is None:
+                            state["since"] = timestamp
+                        if timestamp - state["since"] >= rule.duration:
+                            state["firing"] = True
+                            events.append(AlertEvent("firing", rule, host, metric, value))
+                    else:
+                        state["since"] = None
+        return events
+
+    # Сработавшие оповещения: [(правило, хост, метрика)]
+    def active(self):
+        with self._lock:
+            return [key for key, state in self._state.items() if state["firing"]]
+
+
+# Ограничение частоты отправки для каждого чата (token bucket): rate сообщений в секунду, запас burst
+class RateLimiter:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            return True
+
+    # Время в секундах до появления жетона (0 — можно отправлять); жетон не расходуется
+    def wait_time(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+# Подписки чатов на оповещения, сохраняются в JSON-файл
+class Subscriptions:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.chats = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.chats = set(json.load(f))
+
+    def _save(self):
+        if not self.path:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(sorted(self.chats), f)
+
+    def add(self, chat_id):
+        with self._lock:
+            added = chat_id not in self.chats
+            self.chats.add(chat_id)
+            self._save()
+        return added
+
+    def remove(self, chat_id):
+        with self._lock:
+            removed = chat_id in self.chats
+            self.chats.discard(chat_id)
+            self._save()
+        return removed
+
+    # Копия списка подписанных чатов (множество может меняться из обработчиков /subscribe)
+    def chat_ids(self):
+        with self._lock:
+            return list(self.chats)
+
+
+# Очередь оповещений для подписанных чатов. Оповещения копятся по чатам и при каждой отправке
+# уходят одним сообщением, если лимит чата позволяет; иначе ждут следующей отправки
+class AlertNotifier:
+    def __init__(self, subscriptions, limiter, max_lines=30):
+        self.subscriptions = subscriptions
+        self.limiter = limiter
+        self.max_lines = max_lines
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def push(self, lines):
+        if not lines:
+            return
+        with self._lock:
+            for chat_id in self.subscriptions.chat_ids():
+                self._pending.setdefault(chat_id, []).extend(lines)
+
+    # send(chat_id, text) отправляет сообщение (через очередь исходящих сообщений бота)
+    def flush(self, send):
+        with self._lock:
+            chats = list(self._pending)
+        for chat_id in chats:
+            if not self.limiter.allow(chat_id):
+                continue
+            with self._lock:
+                lines = self._pending.pop(chat_id, [])
+            if not lines:
+                continue
+            text = "\n".join(lines[:self.max_lines])
+            if len(lines) > self.max_lines:
+                text += f"\n… и ещё {len(lines) - self.max_lines} оповещений"
+            send(chat_id, text)
@@ -0,0 +1,262 @@
+import math
+import os
+import re
+import selectors
+import signal
+import struct
+import subprocess
+import threading
+import time
+
+import collector_agent
+import instrumentation
+from ssh_pool import READ_SIZE, CommandTimeout
+
+
+# Исполнители команд для хостов, на которых работает сам бот. Интерфейс тот же, что у SSHSession:
+# exec_command(command, timeout) → (stdout, stderr) и exec_stream(command, write, timeout) → stderr.
+# "local" запускает команду в /bin/sh на машине бота, "proc" отвечает на простые команды
+# (uptime, free, df, mpstat, uname, lsb_release) чтением /proc и os.statvfs без запуска процессов,
+# а остальные выполняет так же, как "local" — только если корень хоста совпадает с корнем бота.
+BACKENDS = ("ssh", "local", "proc")
+
+
+# Команду нельзя выполнить этим способом
+class UnsupportedCommand(Exception):
+    pass
+
+
+class LocalBackend:
+    def exec_command(self, command, timeout=None):
+        stdout = []
+        stderr = self.exec_stream(command, stdout.append, timeout=timeout)
+        return b"".join(stdout), stderr
+
+    # Команда выполняется в отдельной группе процессов: по таймауту или при ошибке в write
+    # завершается вся группа, включая процессы конвейера
+    def exec_stream(self, command, write, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stderr = []
+        with instrumentation.timer("local_exec"):
+            process = subprocess.Popen(
+                command, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                start_new_session=True,
+            )
+            targets = {process.stdout.fileno(): write, process.stderr.fileno(): stderr.append}
+            try:
+                with selectors.DefaultSelector() as selector:
+                    for fd in targets:
+                        selector.register(fd, selectors.EVENT_READ)
+                    while selector.get_map():
+                        wait = None
+                        if deadline is not None:
+                            wait = deadline - time.monotonic()
+                            if wait <= 0:
+                                raise CommandTimeout(f"Команда не завершилась за {timeout} с")
+                        for key, _ in selector.select(wait):
+                            data = os.read(key.fd, READ_SIZE)
+                            if data:
+                                targets[key.fd](data)
+                            else:
+                                selector.unregister(key.fd)
+                process.wait()
+            finally:
+                if process.poll() is None:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                process.stdout.close()
+                process.stderr.close()
+        return b"".join(stderr)
+
+
+# Человекочитаемый размер как в free -h (1.5Gi, 312Mi) или df -h (1.5G, 312M)
+def human_size(value, suffix="i"):
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if value < 1024 or unit == "P":
+            break
+        value /= 1024
+    if unit == "B":
+        return f"{int(value)}B" if suffix else str(int(value))
+    value = math.ceil(value * 10) / 10 if value < 10 else math.ceil(value)
+    return f"{value:.1f}{unit}{suffix}" if value < 10 else f"{value:.0f}{unit}{suffix}"
+
+
+# Запись utmp (glibc, 384 байта): ut_type — первое поле; USER_PROCESS = 7
+UTMP_RECORD = 384
+USER_PROCESS = 7
+
+
+class ProcBackend(LocalBackend):
+    def __init__(self, root="/"):
+        self.root = root
+        self.proc = os.path.join(root, "proc")
+        self._cpu = None
+        self._lock = threading.Lock()
+        self._renderers = {
+            "uptime": self.uptime,
+            "free -h": lambda: self.free(human=True),
+            "free -b": lambda: self.free(human=False),
+            "df -h": lambda: self.df(human=True),
+            "df -P -B1": lambda: self.df(human=False),
+            "mpstat": self.mpstat,
+            "uname -a": self.uname,
+            "lsb_release -a": self.lsb_release,
+        }
+
+    def exec_stream(self, command, write, timeout=None):
+        render = self._renderers.get(" ".join(command.split()))
+        if render is None:
+            # С корнем хоста, смонтированным в контейнер бота, команда показала бы процессы, пакеты
+            # и журналы контейнера, а не хоста
+            if os.path.abspath(self.root) != "/":
+                raise UnsupportedCommand(
+                    f"Команда недоступна для хоста с backend proc и root {self.root}: "
+                    "поддерживаются только /get_uptime, /get_free, /get_df, /get_mpstat, /get_uname и /get_release"
+                )
+            return super().exec_stream(command, write, timeout=timeout)
+        with instrumentation.timer("proc_read", command=command):
+            write(render().encode())
+        return b""
+
+    # Команда на машине бота без проверки выше — для команд, которые сами читают корень хоста
+    # (journalctl --root)
+    def exec_local(self, command, timeout=None):
+        stdout = []
+        stderr = LocalBackend.exec_stream(self, command, stdout.append, timeout=timeout)
+        return b"".join(stdout), stderr
+
+    # Метрики как у агента сбора (collector_agent): загрузка процессора — за время с прошлой выборки
+    def sample(self):
+        with self._lock:
+            metrics, self._cpu = collector_agent.sample(self._cpu, self.proc, self.root)
+        return metrics
+
+    def _read(self, *path):
+        with open(os.path.join(self.proc, *path)) as f:
+            return f.read()
+
+    def _users(self):
+        for path in ("run/utmp", "var/run/utmp"):
+            try:
+                with open(os.path.join(self.root, path), "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            return sum(
+                1 for offset in range(0, len(data) - UTMP_RECORD + 1, UTMP_RECORD)
+                if struct.unpack_from("i", data, offset)[0] == USER_PROCESS
+            )
+        return None
+
+    def uptime(self):
+        seconds = int(float(self._read("uptime").split()[0]))
+        days, rest = divmod(seconds, 86400)
+        hours, minutes = divmod(rest // 60, 60)
+        up = f"{days} day{'s' if days != 1 else ''}, " if days else ""
+        up += f"{hours:2}:{minutes:02}" if hours else f"{minutes} min"
+        users = self._users()
+        users = f"{users} user{'s' if users != 1 else ''},  " if users is not None else ""
+        load = ", ".join(self._read("loadavg").split()[:3])
+        return f" {time.strftime('%H:%M:%S')} up {up},  {users}load average: {load}\n"
+
+    def free(self, human):
+        memory = {name: value * 1024 for name, value in collector_agent.read_meminfo(self.proc).items()}
+        total = memory["MemTotal"]
+        cache = memory.get("Buffers", 0) + memory.get("Cached", 0) + memory.get("SReclaimable", 0)
+        available = memory.get("MemAvailable", memory["MemFree"])
+        # Как procps-ng 4: занято всё, что недоступно для новых процессов
+        used = total - available
+        swap_total = memory.get("SwapTotal", 0)
+        swap_free = memory.get("SwapFree", 0)
+        size = human_size if human else str
+        rows = [
+            ("Mem:", total, used, memory["MemFree"], memory.get("Shmem", 0), cache, available),
+            ("Swap:", swap_total, swap_total - swap_free, swap_free),
+        ]
+        lines = [f"{'':15}{'total':>12}{'used':>12}{'free':>12}{'shared':>12}{'buff/cache':>12}{'available':>12}"]
+        for kind, *values in rows:
+            lines.append(f"{kind:15}" + "".join(f"{size(value):>12}" for value in values))
+        return "\n".join(lines) + "\n"
+
+    # Файловые системы с ненулевым размером (как df без -a)
+    def df(self, human):
+        seen = set()
+        rows = []
+        for device, mount, _ in collector_agent.read_mounts(self.proc, self.root):
+            # Повторные монтирования одного устройства (bind) и одной точки показываются один раз
+            key = device if device.startswith("/") else mount
+            if key in seen:
+                continue
+            try:
+                stat = os.statvfs(os.path.join(self.root, mount.lstrip("/")))
+            except OSError:
+                continue
+            if not stat.f_blocks:
+                continue
+            seen.add(key)
+            size = stat.f_blocks * stat.f_frsize
+            used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+            avail = stat.f_bavail * stat.f_frsize
+            percent = f"{math.ceil(used * 100 / (used + avail))}%" if used + avail else "-"
+            rows.append((device, size, used, avail, percent, mount))
+        if human:
+            lines = [f"{'Filesystem':<20} {'Size':>6} {'Used':>6} {'Avail':>6} {'Use%':>5} Mounted on"]
+            template = "{:<20} {:>6} {:>6} {:>6} {:>5} {}"
+            size = lambda value: human_size(value, suffix="")
+        else:
+            lines = [f"{'Filesystem':<20} {'1-blocks':>15} {'Used':>15} {'Available':>15} {'Capacity':>8} Mounted on"]
+            template = "{:<20} {:>15} {:>15} {:>15} {:>8} {}"
+            size = str
+        for device, total, used, avail, percent, mount in rows:
+            lines.append(template.format(device, size(total), size(used), size(avail), percent, mount))
+        return "\n".join(lines) + "\n"
+
+    # Средняя загрузка процессора с момента загрузки системы, как mpstat без интервала
+    def mpstat(self):
+        fields = [int(value) for value in self._read("stat").split("\n", 1)[0].split()[1:]]
+        fields += [0] * (10 - len(fields))
+        user, nice, system, idle, iowait, irq, softirq, steal, guest, guest_nice = fields[:10]
+        values = (user - guest, nice - guest_nice, system, iowait, irq, softirq, steal, guest, guest_nice, idle)
+        total = sum(fields[:8]) or 1
+        now = time.strftime("%H:%M:%S")
+        header = "".join(f"{name:>8}" for name in ("%usr", "%nice", "%sys", "%iowait", "%irq", "%soft",
+                                                     "%steal", "%guest", "%gnice", "%idle"))
+        row = "".join(f"{value * 100 / total:8.2f}" for value in values)
+        cpus = len(re.findall(r"^cpu\d+ ", self._read("stat"), re.MULTILINE))
+        return f"{self._uname_prefix()}\t{time.strftime('%m/%d/%Y')}\t_{os.uname().machine}_\t({cpus} CPU)\n\n" \
+               f"{now}     CPU{header}\n{now}     all{row}\n"
+
+    def _hostname(self):
+        return self._read("sys", "kernel", "hostname").strip()
+
+    def _uname_prefix(self):
+        return f"Linux {self._read('sys', 'kernel', 'osrelease').strip()} ({self._hostname()})"
+
+    def uname(self):
+        machine = os.uname().machine
+        return (f"Linux {self._hostname()} {self._read('sys', 'kernel', 'osrelease').strip()} "
+                f"{self._read('sys', 'kernel', 'version').strip()} {machine} GNU/Linux\n")
+
+    def lsb_release(self):
+        release = {}
+        for path in ("etc/os-release", "usr/lib/os-release"):
+            try:
+                with open(os.path.join(self.root, path)) as f:
+                    for line in f:
+                        name, _, value = line.strip().partition("=")
+                        release[name] = value.strip('"')
+                break
+            except OSError:
+                continue
+        return (f"Distributor ID:\t{release.get('NAME', 'n/a').split()[0]}\n"
+                f"Description:\t{release.get('PRETTY_NAME', 'n/a')}\n"
+                f"Release:\t{release.get('VERSION_ID', 'n/a')}\n"
+                f"Codename:\t{release.get('VERSION_CODENAME', 'n/a')}\n")
+
+
+def create(kind, root="/"):
+    if kind == "local":
+        return LocalBackend()
+    if kind == "proc":
+        return ProcBackend(root)
+    raise ValueError(f"Неизвестный способ выполнения команд: {kind} (допустимо: {', '.join(BACKENDS)})")
@@ -0,0 +1,376 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import psycopg2
+
+from standins import SCHEMA, CannedOutputs, FakeSSHServer, FakeTelegram, throwaway_postgres
+
+
+# Сквозной бенчмарк команд бота. Обновления проходят через настоящий Dispatcher с обработчиками
+# из bot.add_handlers; внешние системы заменены локальными: SSH-сервер с заготовленным выводом
+# команд и заглушка Bot API работают в отдельном процессе (чтобы не попадать в замеры памяти),
+# база данных — одноразовый PostgreSQL (pgserver или initdb/pg_ctl), заполненный тестовыми строками.
+#
+# Для каждой команды concurrency клиентов выполняют по requests запросов подряд (замкнутая нагрузка:
+# следующий запрос — после окончания обработки предыдущего). Запрос считается выполненным,
+# когда обработчик завершился (запись логгера requests из logconfig.request).
+# Отдельным проходом меряется пик памяти, выделенной за время одного запроса (tracemalloc).
+#
+#   python bench/e2e_bench.py --concurrency 8 --requests 20 --save base.json
+#   python bench/e2e_bench.py --baseline base.json --tolerance 0.25
+#
+# Код возврата 1 — есть ошибки или, при --baseline, регрессия по p95 или пропускной способности.
+
+EMAIL_TEXT = " ".join(f"письмо {i}: User.{i}@Example{i % 7}.ru," for i in range(50))
+PHONE_TEXT = " ".join(f"звонок {i}: +7 (9{i % 100:02d}) 123-45-{i % 100:02d}," for i in range(50))
+
+# Сценарии: имя → (сообщения, номер измеряемого сообщения, нужна ли база данных).
+# Остальные сообщения сценария — вход в диалог и выход из него
+SCENARIOS = {
+    "get_release": (["/get_release"], 0, False),
+    "get_uptime": (["/get_uptime"], 0, False),
+    "get_df": (["/get_df"], 0, False),
+    "get_uname": (["/get_uname"], 0, False),
+    "get_free": (["/get_free"], 0, False),
+    "get_mpstat": (["/get_mpstat"], 0, False),
+    "get_ps": (["/get_ps"], 0, False),
+    "get_ps_all": (["/get_ps top=0"], 0, False),
+    "get_ps_diff": (["/get_ps diff"], 0, False),
+    "get_w": (["/get_w"], 0, False),
+    "get_auths": (["/get_auths"], 0, False),
+    "get_ss": (["/get_ss"], 0, False),
+    "get_services": (["/get_services"], 0, False),
+    "get_apt_list": (["/get_apt_list refresh"], 0, False),
+    "get_apt_search": (["/get_apt_list package-01"], 0, False),
+    "get_snapshot": (["/get_snapshot"], 0, False),
+    "get_critical": (["/get_critical reset"], 0, False),
+    "get_repl_logs": (["/get_repl_logs reset"], 0, False),
+    "find_email": (["/find_email", EMAIL_TEXT, "нет"], 1, False),
+    "find_phone_number": (["/find_phone_number", PHONE_TEXT, "нет"], 1, False),
+    "verify_password": (["/verify_password", "Str0ng!Passw0rd"], 1, False),
+    "get_emails": (["/get_emails"], 0, True),
+    "get_phone_numbers": (["/get_phone_numbers"], 0, True),
+}
+
+# Команды с кэшированием результата (см. CACHE_TTL в bot.py); без --cache кэш отключается
+CACHED_COMMANDS = ("get_release", "get_uname", "get_apt_list", "get_services")
+
+
+# Процесс с заменителями SSH и Bot API: сообщает порты и работает до завершения бенчмарка
+def serve_standins(connection, options):
+    outputs = CannedOutputs(processes=options["processes"], packages=options["packages"])
+    ssh = FakeSSHServer(outputs, delay=options["ssh_delay_ms"] / 1000)
+    telegram = FakeTelegram(api_delay=options["api_delay_ms"] / 1000)
+    connection.send((ssh.port, telegram.base_url))
+    connection.recv()
+
+
+# Обработчики завершения запросов: logconfig.request пишет в логгер requests запись с пользователем
+class Completions(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.waiting = {}
+
+    def register(self, user):
+        self.waiting[user] = queue.Queue()
+
+    def emit(self, record):
+        user = getattr(record, "user", None)
+        if user in self.waiting:
+            self.waiting[user].put((time.perf_counter(), getattr(record, "status", "ok")))
+
+    def reject(self, user):
+        if user in self.waiting:
+            self.waiting[user].put((time.perf_counter(), "rejected"))
+
+    def wait(self, user, timeout):
+        try:
+            return self.waiting[user].get(timeout=timeout)
+        except queue.Empty:
+            return time.perf_counter(), "timeout"
+
+
+class Harness:
+    def __init__(self, bot_module, bot, dispatcher, completions, timeout):
+        self.module = bot_module
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.completions = completions
+        self.timeout = timeout
+        self.update_ids = itertools.count(1)
+        self.chat_ids = itertools.count(10 ** 6)
+
+    def new_client(self):
+        chat_id = next(self.chat_ids)
+        self.completions.register(f"bench{chat_id}")
+        return chat_id
+
+    def send(self, chat_id, text):
+        message = {
+            "message_id": next(self.update_ids), "date": int(time.time()), "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "bench", "username": f"bench{chat_id}"},
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        update = self.module.Update.de_json({"update_id": message["message_id"], "message": message}, self.bot)
+        self.dispatcher.update_queue.put(update)
+
+    # Один проход сценария: задержка измеряемого сообщения и статус
+    # probe(), если задана, вызывается перед измеряемым сообщением и возвращает функцию,
+    # которая вызывается сразу после его обработки
+    def run_scenario(self, chat_id, steps, measured, probe=None):
+        result = None
+        for number, text in enumerate(steps):
+            done = probe() if probe and number == measured else None
+            started = time.perf_counter()
+            self.send(chat_id, text)
+            finished, status = self.completions.wait(f"bench{chat_id}", self.timeout)
+            if done:
+                done()
+            if number == measured:
+                result = (finished - started, status)
+            if status != "ok":
+                return result or (finished - started, status)
+        return result
+
+    def load(self, steps, measured, concurrency, requests):
+        results = []
+        lock = threading.Lock()
+
+        def client():
+            chat_id = self.new_client()
+            for _ in range(requests):
+                result = self.run_scenario(chat_id, steps, measured)
+                with lock:
+                    results.append(result)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+    # Пик памяти (байт), выделенной за время измеряемого сообщения; tracemalloc должен быть запущен
+    def memory(self, steps, measured, runs):
+        chat_id = self.new_client()
+        peaks = []
+
+        def probe():
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            return lambda: peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+
+        for _ in range(runs):
+            self.run_scenario(chat_id, steps, measured, probe)
+        return max(peaks)
+
+
+def quantile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def seed_database(params, rows):
+    connection = psycopg2.connect(**params)
+    with connection, connection.cursor() as cursor:
+        cursor.execute(SCHEMA)
+        cursor.execute("TRUNCATE emails, phone_numbers")
+        cursor.execute(
+            "INSERT INTO emails (email) SELECT 'user' || g || '@example.com' FROM generate_series(1, %s) g", (rows,)
+        )
+        cursor.execute(
+            "INSERT INTO phone_numbers (phone_number) SELECT '+7900' || lpad(g::text, 7, '0') "
+            "FROM generate_series(1, %s) g", (rows,)
+        )
+    connection.close()
+
+
+def configure_environment(args, workdir, ssh_port, database):
+    os.environ.update({
+        "TOKEN": "123:bench",
+        "RM_HOST": "127.0.0.1",
+        "RM_PORT": str(ssh_port),
+        "RM_USER": "bench",
+        "RM_PASSWORD": "bench",
+        "HOSTS_FILE": os.path.join(workdir, "hosts.json"),
+        "LOG_FILE": os.path.join(workdir, "bot.log"),
+        "LOG_CURSORS_FILE": "",
+        "COLLECT_INTERVAL": "0",
+        "HANDLER_WORKERS": str(args.handler_workers),
+        "HANDLER_QUEUE": str(max(args.concurrency * 2, 100)),
+        # Заменитель Bot API не ограничивает частоту, лимиты очереди исходящих сообщений
+        # только исказили бы задержки самого бота
+        "OUTBOX_RATE": "1000000",
+        "OUTBOX_CHAT_RATE": "1000000",
+        "OUTBOX_CHAT_BURST": "1000000",
+    })
+    if not args.cache:
+        os.environ["CACHE_TTL"] = ",".join(f"{name}=0" for name in CACHED_COMMANDS)
+    if database:
+        os.environ.update({
+            "DB_HOST": database["host"], "DB_PORT": str(database["port"]), "DB_USER": database["user"],
+            "DB_PASSWORD": database["password"], "DB_DATABASE": database["database"],
+        })
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance) and result["p95_ms"] - base["p95_ms"] > 1:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.1f} → {result['p95_ms']:.1f} мс")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: {base['throughput']:.1f} → {result['throughput']:.1f} запросов/с")
+        if base.get("peak_kb") and result.get("peak_kb", 0) > base["peak_kb"] * (1 + tolerance) + 64:
+            regressions.append(f"{name}: память {base['peak_kb']:.0f} → {result['peak_kb']:.0f} КБ")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк команд бота")
+    parser.add_argument("--commands", help="сценарии через запятую (по умолчанию все)")
+    parser.add_argument("--concurrency", type=int, default=4, help="одновременных клиентов на команду")
+    parser.add_argument("--requests", type=int, default=10, help="запросов на клиента")
+    parser.add_argument("--handler-workers", type=int, default=8, help="HANDLER_WORKERS бота")
+    parser.add_argument("--ssh-delay-ms", type=float, default=5, help="задержка выполнения команды по SSH, мс")
+    parser.add_argument("--api-delay-ms", type=float, default=5, help="задержка ответа заглушки Bot API, мс")
+    parser.add_argument("--processes", type=int, default=300, help="строк в выводе ps")
+    parser.add_argument("--packages", type=int, default=1500, help="пакетов в выводе dpkg-query")
+    parser.add_argument("--db-rows", type=int, default=10000, help="строк в каждой таблице базы данных")
+    parser.add_argument("--no-db", action="store_true", help="не запускать PostgreSQL, пропустить команды с базой")
+    parser.add_argument("--cache", action="store_true", help="не отключать кэш результатов (CACHE_TTL)")
+    parser.add_argument("--memory-runs", type=int, default=3, help="запросов в проходе замера памяти (0 — без него)")
+    parser.add_argument("--timeout", type=float, default=60, help="время ожидания одного запроса, с")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="сравнить с результатами из JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение относительно --baseline")
+    args = parser.parse_args()
+
+    names = args.commands.split(",") if args.commands else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)} (доступны: {', '.join(SCENARIOS)})")
+
+    # Процесс с заменителями запускается до импорта бота и создания потоков
+    context = multiprocessing.get_context("fork")
+    connection, child = context.Pipe()
+    process = context.Process(target=serve_standins, args=(child, vars(args)), daemon=True)
+    process.start()
+    ssh_port, api_url = connection.recv()
+
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    database = None
+    stop_database = None
+    if not args.no_db and any(SCENARIOS[name][2] for name in names):
+        started = throwaway_postgres(os.path.join(workdir, "pg"))
+        if started is None:
+            print("PostgreSQL недоступен (нет pgserver и initdb/pg_ctl), команды с базой пропущены")
+        else:
+            database, stop_database = started
+            seed_database(database, args.db_rows)
+    names = [name for name in names if database or not SCENARIOS[name][2]]
+
+    configure_environment(args, workdir, ssh_port, database)
+    import bot as bot_module
+    from telegram.utils.request import Request
+
+    log_listener = bot_module.start_logging()
+    bot_module.outbox.start()
+
+    completions = Completions()
+    logging.getLogger("requests").addHandler(completions)
+
+    # Сообщение о перегрузке пула обработчиков не проходит через logconfig.request
+    class BenchBot(bot_module.InstrumentedBot):
+        def _post(self, endpoint, data=None, *rest, **kwargs):
+            if data and str(data.get("text", "")).startswith("⏳ Бот перегружен"):
+                completions.reject(f"bench{data.get('chat_id')}")
+            return super()._post(endpoint, data, *rest, **kwargs)
+
+    bot = BenchBot(
+        "123:bench", base_url=api_url,
+        request=Request(con_pool_size=args.handler_workers + args.concurrency + 8),
+    )
+    updater = bot_module.serving.build_updater(bot, workers=4, queue_size=0)
+    bot_module.add_handlers(updater.dispatcher)
+    threading.Thread(target=updater.dispatcher.start, daemon=True).start()
+    harness = Harness(bot_module, bot, updater.dispatcher, completions, args.timeout)
+
+    print(f"Клиентов: {args.concurrency}, запросов на клиента: {args.requests}, "
+          f"HANDLER_WORKERS: {args.handler_workers}, кэш: {'включён' if args.cache else 'отключён'}")
+    print(f"{'команда':20} {'запр/с':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'макс':>8} {'ошибки':>7} {'пик КБ':>8}")
+    results = {}
+    failed = False
+    try:
+        for name in names:
+            steps, measured, _ = SCENARIOS[name]
+            harness.run_scenario(harness.new_client(), steps, measured)
+            outcomes, elapsed = harness.load(steps, measured, args.concurrency, args.requests)
+            latencies = sorted(latency for latency, _ in outcomes)
+            errors = sum(status != "ok" for _, status in outcomes)
+            failed |= errors > 0
+            results[name] = {
+                "throughput": len(outcomes) / elapsed,
+                "p50_ms": quantile(latencies, 0.5) * 1000,
+                "p95_ms": quantile(latencies, 0.95) * 1000,
+                "p99_ms": quantile(latencies, 0.99) * 1000,
+                "max_ms": latencies[-1] * 1000,
+                "errors": errors,
+            }
+        if args.memory_runs:
+            tracemalloc.start()
+            for name in names:
+                steps, measured, _ = SCENARIOS[name]
+                results[name]["peak_kb"] = harness.memory(steps, measured, args.memory_runs) / 1024
+            tracemalloc.stop()
+    finally:
+        updater.dispatcher.stop()
+        bot_module.handler_pool.shutdown()
+        bot_module.ssh_pool.close()
+        bot_module.db_pool.close()
+        log_listener.stop()
+        connection.send(None)
+        process.join(5)
+        if stop_database:
+            stop_database()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, result in results.items():
+        print(
+            f"{name:20} {result['throughput']:8.1f} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+            f"{result['p99_ms']:8.1f} {result['max_ms']:8.1f} {result['errors']:7} {result.get('peak_kb', 0):8.0f}"
+        )
+    print(f"Максимальный RSS процесса: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}")
+        failed |= bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import extraction
+
+
+# Бенчмарк извлечения email-адресов и номеров телефонов.
+# Скорость меряется на синтетическом корпусе (текст с адресами и номерами в разных форматах),
+# отдельно проверяются «враждебные» строки, на которых шаблоны с вложенными повторами
+# уходят в экспоненциальный или квадратичный перебор. Код возврата 1 — скорость ниже порога.
+#
+#   python bench/extraction_bench.py --size 16 --min-mbps 5
+
+# Шаблоны до появления модуля extraction — для сравнения
+LEGACY_PATTERNS = {
+    "email": r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    "phone": r'(\+?\d{1,2}\s?\d{3}\s?\d{3}\s?\d{2}\s?\d{2}|\d{3}\s?\d{3}\s?\d{2}\s?\d{2}|\d{10})',
+}
+
+WORDS = (
+    "сервер", "база", "данных", "отчёт", "пользователь", "заявка", "order", "invoice",
+    "status", "ok", "id", "2024-05-01", "12:30:45", "192.168.0.1", "—", "и", "по", "для",
+)
+
+PHONE_FORMATS = (
+    "+7 {a} {b} {c} {d}", "8{a}{b}{c}{d}", "8 ({a}) {b}-{c}-{d}", "+7({a}){b}-{c}-{d}", "{a} {b} {c} {d}",
+)
+
+
+def make_corpus(size, seed=1):
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        roll = rnd.random()
+        if roll < 0.03:
+            part = f"User.{rnd.randint(1, 10 ** 6)}@Mail{rnd.randint(1, 50)}.RU"
+        elif roll < 0.04:
+            part = f"info{rnd.randint(1, 999)}@пример{rnd.randint(1, 9)}.рф"
+        elif roll < 0.07:
+            part = rnd.choice(PHONE_FORMATS).format(
+                a=rnd.randint(900, 999), b=rnd.randint(100, 999), c=rnd.randint(10, 99), d=rnd.randint(10, 99),
+            )
+        else:
+            part = rnd.choice(WORDS)
+        parts.append(part)
+        length += len(part.encode()) + 1
+    return " ".join(parts)
+
+
+# Строки без совпадений, на которых наивные шаблоны работают за O(n²) и дольше
+def make_adversarial(size):
+    return {
+        "word-run": "a" * size,
+        "at-run": "a@" * (size // 2),
+        "domain-no-tld": "a@" + "b" * size,
+        "dots-no-tld": "a@" + "b." * (size // 2) + "1",
+        "digit-run": "1" * size,
+        "spaced-digits": "8 " * (size // 2),
+    }
+
+
+def measure(func, text, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк модуля extraction")
+    parser.add_argument("--size", type=float, default=8, help="размер корпуса, МБ")
+    parser.add_argument("--adversarial-size", type=float, default=1, help="размер враждебных строк, МБ")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов, берётся лучший результат")
+    parser.add_argument("--min-mbps", type=float, default=5, help="минимально допустимая скорость, МБ/с")
+    parser.add_argument("--legacy", action="store_true", help="сравнить со старыми шаблонами на корпусе")
+    args = parser.parse_args()
+
+    corpus = make_corpus(int(args.size * 1024 * 1024))
+    corpus_mb = len(corpus.encode()) / 1048576
+    failed = False
+
+    print(f"Корпус: {corpus_mb:.1f} МБ")
+    for kind in extraction.EXTRACTORS:
+        elapsed = measure(lambda text: extraction.extract(kind, text), corpus, args.repeat)
+        speed = corpus_mb / elapsed
+        found = len(extraction.extract(kind, corpus))
+        status = "OK" if speed >= args.min_mbps else "МЕДЛЕННО"
+        failed |= speed < args.min_mbps
+        print(f"  {kind:6} {speed:8.1f} МБ/с  найдено {found:7}  {status}")
+        if args.legacy:
+            legacy = re.compile(LEGACY_PATTERNS[kind])
+            elapsed = measure(legacy.findall, corpus, args.repeat)
+            print(f"  {kind:6} {corpus_mb / elapsed:8.1f} МБ/с  (старый шаблон, без нормализации)")
+
+    print(f"Враждебные строки: {args.adversarial_size:.1f} МБ")
+    for name, text in make_adversarial(int(args.adversarial_size * 1024 * 1024)).items():
+        text_mb = len(text.encode()) / 1048576
+        for kind in extraction.EXTRACTORS:
+            elapsed = measure(lambda value: extraction.extract(kind, value), text, 1)
+            speed = text_mb / elapsed
+            status = "OK" if speed >= args.min_mbps else "ПЕРЕБОР"
+            failed |= speed < args.min_mbps
+            print(f"  {name:14} {kind:6} {speed:8.1f} МБ/с  {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
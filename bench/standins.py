@@ -0,0 +1,326 @@
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paramiko
+from psycopg2.extensions import parse_dsn
+
+
+# Локальные заменители внешних систем для бенчмарков: Bot API, SSH-сервер с заготовленным
+# выводом команд и одноразовый PostgreSQL.
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Заглушка Bot API. Обновления выпускаются функцией release: через getUpdates или POST-запросами
+# на webhook (не больше max_connections одновременно, как у Telegram). Если задан key(params),
+# ответ бота (sendMessage) отмечается в replied[key] — так сопоставляются обновления и ответы
+class FakeTelegram:
+    def __init__(self, updates=(), api_delay=0, max_connections=40, key=None, port=0):
+        self.updates = updates
+        self.api_delay = api_delay
+        self.key = key
+        self.released = {}
+        self.replied = {}
+        self.available = []
+        self.webhook = None
+        self.done = threading.Event()
+        self._condition = threading.Condition()
+        self._senders = ThreadPoolExecutor(max_workers=max_connections)
+        self._message_ids = iter(range(1, 1 << 62))
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/bot"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Заголовки и тело отправляются отдельными записями: без TCP_NODELAY ответ задерживается
+            # алгоритмом Нейгла до подтверждения первой записи (до 40 мс)
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                result = fake.call(method, _parse_params(self.headers.get("Content-Type", ""), body))
+                if fake.api_delay:
+                    time.sleep(fake.api_delay)
+                data = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def call(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        if method == "setWebhook":
+            self.webhook = params.get("url")
+            return True
+        if method == "deleteWebhook":
+            self.webhook = None
+            return True
+        if method == "getUpdates":
+            return self.get_updates(int(params.get("offset") or 0), float(params.get("timeout") or 0))
+        if method.startswith("send") or method.startswith("edit"):
+            if method == "sendMessage" and self.key is not None:
+                self.replied[self.key(params)] = time.perf_counter()
+                if len(self.replied) == len(self.updates):
+                    self.done.set()
+            return {
+                "message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id") or 0), "type": "private"}, "text": params.get("text", ""),
+            }
+        return True
+
+    def get_updates(self, offset, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                self.available = [update for update in self.available if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self.available or remaining <= 0:
+                    return self.available[:100]
+                self._condition.wait(remaining)
+
+    def release(self, update):
+        self.released[update["update_id"]] = time.perf_counter()
+        if self.webhook:
+            self._senders.submit(self._post, self.webhook, update)
+        else:
+            with self._condition:
+                self.available.append(update)
+                self._condition.notify_all()
+
+    # Доставка на webhook с повтором, если бот ответил ошибкой (например, переполнена очередь)
+    def _post(self, url, update):
+        data = json.dumps(update).encode()
+        for _ in range(100):
+            request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(request, timeout=30).read()
+                return
+            except OSError:
+                time.sleep(0.1)
+
+    def close(self):
+        self._senders.shutdown(wait=False, cancel_futures=True)
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_FIELD_RE = re.compile(rb'name="([^"]+)"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', re.DOTALL)
+
+
+# Параметры запроса Bot API: JSON или multipart (отправка файлов; содержимое файлов не разбирается)
+def _parse_params(content_type, body):
+    if not body:
+        return {}
+    if content_type.startswith("multipart/"):
+        return {
+            name.decode(): value.decode(errors="replace") for name, value in _FIELD_RE.findall(body)
+            if len(value) < 4096
+        }
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {}
+
+
+# Заготовленный вывод команд мониторинга. Размер вывода задаётся числом строк:
+# processes — ps, packages — dpkg-query, journal — journalctl, log_lines — журнал репликации
+class CannedOutputs:
+    STATIC = {
+        "uptime": " 10:00:00 up 42 days,  3:12,  2 users,  load average: 0.52, 0.48, 0.41\n",
+        "uname": "Linux bench 6.1.0-18-amd64 #1 SMP PREEMPT_DYNAMIC Debian 6.1.76-1 x86_64 GNU/Linux\n",
+        "lsb_release": "Distributor ID:\tDebian\nDescription:\tDebian GNU/Linux 12 (bookworm)\n"
+                       "Release:\t12\nCodename:\tbookworm\n",
+        "free": "               total        used        free      shared  buff/cache   available\n"
+                "Mem:            15Gi       5.9Gi       1.2Gi       505Mi       8.4Gi       9.1Gi\n"
+                "Swap:          2.0Gi          0B       2.0Gi\n",
+        "mpstat": "Linux 6.1.0-18-amd64 (bench) \t10/18/2026 \t_x86_64_\t(8 CPU)\n\n"
+                  "10:00:00 AM  CPU    %usr   %nice    %sys %iowait    %irq   %soft  %steal  %guest  %gnice   %idle\n"
+                  "10:00:00 AM  all    7.12    0.01    2.31    0.42    0.00    0.11    0.00    0.00    0.00   90.03\n",
+        "w": " 10:00:00 up 42 days,  3:12,  2 users,  load average: 0.52, 0.48, 0.41\n"
+             "USER     TTY      FROM             LOGIN@   IDLE   JCPU   PCPU WHAT\n"
+             "admin    pts/0    10.0.0.5         09:12    1:02   0.05s  0.05s -bash\n",
+        "last": "".join(
+            f"admin    pts/{i}        10.0.0.{i}        Mon Oct 12 09:{i:02d}   still logged in\n" for i in range(10)
+        ) + "\nwtmp begins Mon Oct  1 00:00:00 2026\n",
+    }
+
+    def __init__(self, processes=300, packages=1500, journal=50, log_lines=200, seed=1):
+        rnd = random.Random(seed)
+        self.df = "Filesystem      Size  Used Avail Use% Mounted on\n" + "".join(
+            f"/dev/sd{chr(97 + i)}1       100G   {rnd.randint(1, 99)}G   {rnd.randint(1, 99)}G  "
+            f"{rnd.randint(1, 99)}% /mnt/disk{i}\n" for i in range(12)
+        )
+        self.ss = "Netid State  Recv-Q Send-Q Local Address:Port Peer Address:Port\n" + "".join(
+            f"tcp   LISTEN 0      128    0.0.0.0:{8000 + i}      0.0.0.0:*\n" for i in range(40)
+        )
+        self.services = "".join(
+            f"  service{i}.service loaded active running Bench service {i}\n" for i in range(60)
+        )
+        self.ps = "USER                              PID %CPU %MEM    VSZ   RSS TT       STAT START     TIME COMMAND\n" + "".join(
+            f"user{i % 7:<28} {100 + i:>6} {rnd.random() * 20:4.1f} {rnd.random() * 5:4.1f} "
+            f"{rnd.randint(10000, 900000):>7} {rnd.randint(1000, 400000):>6} ?        S    09:00 00:00:{i % 60:02d} "
+            f"/usr/bin/worker --id {i} --queue q{i % 13}\n" for i in range(processes)
+        )
+        self.packages = "".join(
+            f"ii \tpackage-{i:05d}\t{i % 9}.{i % 17}.{i % 5}-1\tamd64\n" for i in range(packages)
+        )
+        self.journal = "".join(
+            f"Oct 18 10:{i // 60 % 60:02d}:{i % 60:02d} bench kernel: critical event {i}\n" for i in range(journal)
+        ) + "-- cursor: s=bench;i=1\n"
+        self.log = "".join(
+            f"2026-10-18 10:00:{i % 60:02d} UTC [1234] LOG:  started streaming WAL from primary at 0/{i:X} "
+            f"on timeline 1 (replication)\n" for i in range(log_lines)
+        )
+
+    def output(self, command):
+        # Снимок состояния: составной скрипт из snapshot.build_script
+        sections = re.findall(r"echo '(\S+) begin (\w+)'; (.*?) 2>&1; echo", command)
+        if sections:
+            return "".join(
+                f"{marker} begin {name}\n{self.output(part)}{marker} end {name} 0\n" for marker, name, part in sections
+            )
+        # Чтение журнала с позиции: logtail.file_tail_script
+        match = re.search(r'echo "(\S+) \$1 \$off', command)
+        if match:
+            marker = match.group(1)
+            return f"{marker} 1234 0 {len(self.log.encode())} 1\n{self.log}{marker} 0\n"
+        # Индекс пакетов: packages.inventory_script
+        if "dpkg-query" in command:
+            return "1760000000\n" + self.packages
+        word = command.split()[0]
+        if word == "ps":
+            match = re.search(r"head -n (\d+)", command)
+            if match:
+                return "".join(self.ps.splitlines(keepends=True)[:int(match.group(1))])
+            return self.ps
+        if word == "journalctl":
+            return self.journal
+        if word == "df":
+            return self.df
+        if word == "ss":
+            return self.ss
+        if word == "systemctl":
+            return self.services
+        return self.STATIC.get(word, "")
+
+
+# SSH-сервер: принимает любой пароль и на каждую команду отвечает заготовленным выводом.
+# delay — искусственная задержка выполнения команды
+class FakeSSHServer:
+    def __init__(self, outputs, delay=0, port=0):
+        self.outputs = outputs
+        self.delay = delay
+        self.key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", port))
+        self.sock.listen(100)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.sock.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.key)
+            transport.start_server(server=_SSHInterface(self))
+
+    def run(self, channel, command):
+        if self.delay:
+            time.sleep(self.delay)
+        channel.sendall(self.outputs.output(command).encode())
+        channel.send_exit_status(0)
+        # Канал закрывает клиент: если закрыть его раньше, чем сервер подтвердит запрос exec,
+        # клиент получит «Channel closed»
+        channel.shutdown_write()
+        deadline = time.monotonic() + 30
+        while not channel.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        channel.close()
+
+
+class _SSHInterface(paramiko.ServerInterface):
+    def __init__(self, server):
+        self.server = server
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.server.run, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS emails (id SERIAL PRIMARY KEY, email VARCHAR(255) NOT NULL UNIQUE);"
+    "CREATE TABLE IF NOT EXISTS phone_numbers (id SERIAL PRIMARY KEY, phone_number VARCHAR(50) NOT NULL UNIQUE);"
+)
+
+
+# Одноразовый PostgreSQL в каталоге path: через пакет pgserver, если он установлен,
+# иначе через initdb/pg_ctl из PATH. Возвращает (параметры подключения, функция остановки)
+# или None, если ни то ни другое недоступно
+def throwaway_postgres(path):
+    try:
+        import pgserver
+    except ImportError:
+        pgserver = None
+    if pgserver is not None:
+        server = pgserver.get_server(path, cleanup_mode="stop")
+        uri = parse_dsn(server.get_uri())
+        params = {
+            "host": uri.get("host", path), "port": uri.get("port", "5432"), "user": uri.get("user", "postgres"),
+            "password": uri.get("password", ""), "database": uri.get("dbname", "postgres"),
+        }
+        return params, server.cleanup
+    if not (shutil.which("initdb") and shutil.which("pg_ctl")):
+        return None
+    data = os.path.join(path, "data")
+    port = str(free_port())
+    subprocess.run(["initdb", "-D", data, "-U", "postgres", "-A", "trust"], check=True, capture_output=True)
+    subprocess.run(
+        ["pg_ctl", "-D", data, "-w", "-l", os.path.join(path, "postgres.log"),
+         "-o", f"-k {path} -p {port} -c listen_addresses=''", "start"],
+        check=True, capture_output=True,
+    )
+    params = {"host": path, "port": port, "user": "postgres", "password": "", "database": "postgres"}
+    return params, lambda: subprocess.run(["pg_ctl", "-D", data, "-m", "fast", "stop"], capture_output=True)
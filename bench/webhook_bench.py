@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram import Bot
+from telegram.ext import TypeHandler
+from telegram.utils.request import Request
+
+import serving
+from standins import FakeTelegram, free_port
+from workers import HandlerPool
+
+
+# Нагрузочный тест получения обновлений: длинный опрос против webhook.
+# Локальный сервер-заглушка изображает Bot API: выдаёт записанную пачку обновлений через getUpdates
+# или отправляет их POST-запросами на webhook бота (не больше max_connections одновременно,
+# как Telegram), и отмечает время ответа бота (sendMessage) на каждое обновление.
+# Обновления выпускаются с заданной частотой; задержка — от выпуска обновления до получения ответа.
+# Обработчик устроен как команды бота (bot.background): диспетчер передаёт его в HandlerPool
+# из --workers потоков (HANDLER_WORKERS), run_async не используется.
+#
+#   python bench/webhook_bench.py --updates 2000 --rate 200 --work-ms 20 --workers 8
+#
+# Вместо синтетических обновлений можно воспроизвести записанные: --replay updates.json
+# (ответ getUpdates целиком или список обновлений); учитываются обновления с чатом.
+
+
+def make_updates(count, chats):
+    return [
+        {
+            "update_id": number + 1,
+            "message": {
+                "message_id": number + 1,
+                "date": int(time.time()),
+                "chat": {"id": 1000 + number % chats, "type": "private"},
+                "from": {"id": 1000 + number % chats, "is_bot": False, "first_name": "bench"},
+                "text": "/get_uptime",
+            },
+        }
+        for number in range(count)
+    ]
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    updates = data["result"] if isinstance(data, dict) else data
+    chats = [update for update in updates if _chat(update) is not None]
+    # Идентификаторы перенумеровываются: по ним сопоставляются ответы бота
+    for number, update in enumerate(chats, 1):
+        update["update_id"] = number
+    return chats
+
+
+def _chat(update):
+    for kind in ("message", "edited_message", "channel_post", "callback_query"):
+        item = update.get(kind)
+        if item:
+            return (item.get("message") or item).get("chat")
+    return None
+
+
+def run_mode(mode, updates, args):
+    fake = FakeTelegram(updates, args.api_delay_ms / 1000, args.max_connections, key=lambda params: int(params["text"]))
+    bot = Bot("123:bench", base_url=fake.base_url, request=Request(con_pool_size=args.workers + 8))
+    updater = serving.build_updater(bot, queue_size=args.queue_size, nonblocking=mode == "webhook")
+    pool = HandlerPool(workers=args.workers, max_queue=args.queue_size)
+
+    def reply(update, context):
+        if args.work_ms:
+            time.sleep(args.work_ms / 1000)
+        context.bot.send_message(chat_id=update.effective_chat.id, text=str(update.update_id))
+
+    updater.dispatcher.add_handler(TypeHandler(object, lambda update, context: pool.submit(reply, update, context)))
+    if mode == "webhook":
+        port = free_port()
+        serving.start(updater, url=f"http://127.0.0.1:{port}", port=port, max_connections=args.max_connections)
+    else:
+        serving.start(updater, poll_timeout=1)
+    while mode == "webhook" and not fake.webhook:
+        time.sleep(0.01)
+
+    started = time.perf_counter()
+    for number, update in enumerate(updates):
+        if args.rate:
+            delay = started + number / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        fake.release(update)
+    completed = fake.done.wait(args.timeout)
+    finished = max(fake.replied.values(), default=started)
+    updater.stop()
+    pool.shutdown()
+    fake.close()
+
+    latencies = sorted(fake.replied[key] - fake.released[key] for key in fake.replied)
+    return {
+        "replied": len(latencies),
+        "completed": completed,
+        "throughput": len(latencies) / (finished - started) if finished > started else 0,
+        "latencies": latencies,
+        "rejected": updater.update_queue.rejected,
+    }
+
+
+def quantile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: длинный опрос против webhook")
+    parser.add_argument("--updates", type=int, default=1000, help="число синтетических обновлений")
+    parser.add_argument("--replay", help="JSON-файл с записанными обновлениями (ответ getUpdates)")
+    parser.add_argument("--chats", type=int, default=50, help="число чатов в синтетических обновлениях")
+    parser.add_argument("--rate", type=float, default=200, help="обновлений в секунду (0 — все сразу)")
+    parser.add_argument("--work-ms", type=float, default=10, help="время обработки одного обновления, мс")
+    parser.add_argument("--api-delay-ms", type=float, default=20, help="задержка ответа заглушки Bot API, мс")
+    parser.add_argument("--workers", type=int, default=8, help="воркеры пула обработчиков (HANDLER_WORKERS)")
+    parser.add_argument("--queue-size", type=int, default=1000, help="размер очереди обновлений (UPDATE_QUEUE)")
+    parser.add_argument("--max-connections", type=int, default=40, help="одновременных запросов на webhook")
+    parser.add_argument("--modes", default="polling,webhook", help="режимы через запятую")
+    parser.add_argument("--timeout", type=float, default=120, help="максимальное время одного прогона, с")
+    args = parser.parse_args()
+
+    updates = load_updates(args.replay) if args.replay else make_updates(args.updates, args.chats)
+    print(f"Обновлений: {len(updates)}, частота: {args.rate or 'все сразу'}, обработка: {args.work_ms} мс, "
+          f"задержка API: {args.api_delay_ms} мс, воркеров: {args.workers}")
+    failed = False
+    for mode in args.modes.split(","):
+        result = run_mode(mode, [dict(update) for update in updates], args)
+        latencies = result["latencies"]
+        failed |= not result["completed"]
+        print(
+            f"  {mode:8} ответов {result['replied']:6}/{len(updates)}  {result['throughput']:8.1f} обн/с  "
+            f"p50 {quantile(latencies, 0.5) * 1000:7.1f}  p95 {quantile(latencies, 0.95) * 1000:7.1f}  "
+            f"p99 {quantile(latencies, 0.99) * 1000:7.1f}  макс {(latencies[-1] if latencies else 0) * 1000:7.1f} мс  "
+            f"отклонено очередью {result['rejected']}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
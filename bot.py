@@ -1,57 +1,210 @@
 import os
-from io import BytesIO
+import tempfile
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
 import re
 import logging
-from telegram import Update
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext, ConversationHandler
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.utils.helpers import DEFAULT_NONE
+from telegram.utils.request import Request
+from telegram.ext import CommandHandler, MessageHandler, CallbackQueryHandler, Filters, CallbackContext, ConversationHandler
 from dotenv import load_dotenv
-import paramiko
-import psycopg2
-from psycopg2 import Error
+from psycopg2 import Error, sql
+from psycopg2.extras import execute_values
+import instrumentation
+import logconfig
+import serving
+from db_pool import DatabasePool
+from result_cache import ResultCache
+import snapshot
+import packages
+import processes
+from packages import PackageInventory
+from processes import ProcessSnapshots
+import delivery
+import extraction
+import textscan
+import logtail
+from logtail import CursorStore
+import filefetch
+import collector
+from timeseries import MetricsStore, downsample, sparkline
+from agent import AgentCollector
+from alerts import AlertEngine, AlertNotifier, RateLimiter, Subscriptions, parse_rules
+from inventory import Inventory, fan_out
+from ssh_pool import SSHSessionManager
+import backends
+from workers import HandlerPool
+from outbox import Outbox, replayable
 
 # Загружаем переменные окружения из .env
 load_dotenv()
 TOKEN = os.getenv("TOKEN")
 RM_HOST = os.getenv("RM_HOST")
+RM_PORT = int(os.getenv("RM_PORT", 22))
 RM_USER = os.getenv("RM_USER")
 RM_PASSWORD = os.getenv("RM_PASSWORD")
+RM_BACKEND = os.getenv("RM_BACKEND", "ssh")
+RM_ROOT = os.getenv("RM_ROOT", "/")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_DATABASE = os.getenv("DB_DATABASE")
-
-
-# Функция для подключения к базе данных
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 5))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_STREAM_CHUNK = int(os.getenv("DB_STREAM_CHUNK", 2000))
+DB_SPOOL_SIZE = int(os.getenv("DB_SPOOL_SIZE", 1024 * 1024))
+DB_PAGE_SIZE = int(os.getenv("DB_PAGE_SIZE", 50))
+DB_PAGE_MAX = int(os.getenv("DB_PAGE_MAX", 200))
+SSH_MAX_CHANNELS = int(os.getenv("SSH_MAX_CHANNELS", 4))
+SSH_KEEPALIVE = int(os.getenv("SSH_KEEPALIVE", 30))
+HOSTS_FILE = os.getenv("HOSTS_FILE", "hosts.json")
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", 16))
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", 30))
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", 256))
+COLLECT_INTERVAL = int(os.getenv("COLLECT_INTERVAL", 60))
+COLLECT_RETENTION = float(os.getenv("COLLECT_RETENTION", 24))
+COLLECT_AGENT = os.getenv("COLLECT_AGENT", "0") not in ("0", "false", "no", "")
+COLLECT_AGENT_INTERVAL = float(os.getenv("COLLECT_AGENT_INTERVAL", 10))
+HISTORY_BUCKETS = int(os.getenv("HISTORY_BUCKETS", 30))
+ALERT_RULES = os.getenv("ALERT_RULES", "disk:>90/5m,mem>90/5m,cpu>95/5m,journal_errors>0")
+ALERT_HYSTERESIS = float(os.getenv("ALERT_HYSTERESIS", 5))
+ALERT_RATE = float(os.getenv("ALERT_RATE", 20))
+ALERT_BURST = int(os.getenv("ALERT_BURST", 3))
+ALERT_SUBSCRIBERS_FILE = os.getenv("ALERT_SUBSCRIBERS_FILE", "alert_subscribers.json")
+PG_LOG_PATH = os.getenv("PG_LOG_PATH", "/var/log/postgresql/postgresql.log")
+REPL_LOG_PATTERN = os.getenv("REPL_LOG_PATTERN", "replication|wal|streaming")
+LOG_CURSORS_FILE = os.getenv("LOG_CURSORS_FILE", "log_cursors.json")
+LOG_READ_LIMIT = int(os.getenv("LOG_READ_LIMIT", 4 * 1024 * 1024))
+LOG_INITIAL_BYTES = int(os.getenv("LOG_INITIAL_BYTES", 64 * 1024))
+LOG_MAX_ENTRIES = int(os.getenv("LOG_MAX_ENTRIES", 500))
+FOLLOW_INTERVAL = float(os.getenv("FOLLOW_INTERVAL", 10))
+LOG_ALLOWED_PATHS = [path.strip() for path in os.getenv("LOG_ALLOWED_PATHS", "/var/log/*").split(",") if path.strip()]
+LOG_GET_MAX_BYTES = int(os.getenv("LOG_GET_MAX_BYTES", 64 * 1024 * 1024))
+LOG_GET_MAX_UPLOAD = int(os.getenv("LOG_GET_MAX_UPLOAD", 45 * 1024 * 1024))
+LOG_GET_COMPRESSION = os.getenv("LOG_GET_COMPRESSION", "gzip").lower()
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", os.cpu_count() or 2))
+SCAN_WINDOW = int(os.getenv("SCAN_WINDOW", 1024 * 1024))
+SCAN_MAX_SIZE = int(os.getenv("SCAN_MAX_SIZE", 20 * 1024 * 1024))
+SCAN_PROGRESS_INTERVAL = float(os.getenv("SCAN_PROGRESS_INTERVAL", 2))
+OUTPUT_MESSAGE_LIMIT = min(int(os.getenv("OUTPUT_MESSAGE_LIMIT", 4000)), delivery.TELEGRAM_LIMIT)
+OUTPUT_MAX_MESSAGES = int(os.getenv("OUTPUT_MAX_MESSAGES", 3))
+OUTPUT_SPOOL_SIZE = int(os.getenv("OUTPUT_SPOOL_SIZE", 1024 * 1024))
+PS_TOP = int(os.getenv("PS_TOP", 50))
+PS_DIFF_GROWTH = float(os.getenv("PS_DIFF_GROWTH", 10))
+LOG_FILE = os.getenv("LOG_FILE", "monitoring_bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN") or None
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", 7))
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") not in ("0", "false", "no")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+ADMIN_IDS = {int(value) for value in os.getenv("ADMIN_IDS", "").split(",") if value.strip()}
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+HANDLER_WORKERS = int(os.getenv("HANDLER_WORKERS", 8))
+HANDLER_QUEUE = int(os.getenv("HANDLER_QUEUE", 100))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH")
+WEBHOOK_CERT = os.getenv("WEBHOOK_CERT")
+WEBHOOK_KEY = os.getenv("WEBHOOK_KEY")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", 10))
+UPDATE_QUEUE = int(os.getenv("UPDATE_QUEUE", 1000))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 4))
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", 25))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", 1))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", 3))
+OUTBOX_GROUP_RATE = float(os.getenv("OUTBOX_GROUP_RATE", 20))
+OUTBOX_CHAT_QUEUE = int(os.getenv("OUTBOX_CHAT_QUEUE", 100))
+OUTBOX_RETRIES = int(os.getenv("OUTBOX_RETRIES", 5))
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", 30))
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 30000))
+
+
+# Словарь "команда → число" со значениями по умолчанию, переопределяемый
+# переменной окружения вида "get_release=3600,get_services=30"
+def env_mapping(name, defaults, cast=int):
+    mapping = dict(defaults)
+    for item in filter(None, os.getenv(name, "").split(",")):
+        key, _, value = item.partition("=")
+        mapping[key.strip()] = cast(value)
+    return mapping
+
+# Время жизни кэша (в секундах) для команд, результат которых меняется редко
+CACHE_TTL = env_mapping("CACHE_TTL", {
+    "get_release": 3600,
+    "get_uname": 3600,
+    "get_apt_list": 60,
+    "get_services": 60,
+})
+# Таймауты (в секундах) для команд, которые выполняются дольше COMMAND_TIMEOUT
+COMMAND_TIMEOUTS = env_mapping("COMMAND_TIMEOUTS", {
+    "get_apt_list": 120,
+    "get_repl_logs": 120,
+    "get_log": 300,
+}, cast=float)
+
+# Пул соединений с базой данных (схема проверяется один раз при первом обращении)
+db_pool = DatabasePool(
+    minconn=DB_POOL_MIN,
+    maxconn=DB_POOL_MAX,
+    wait_timeout=DB_POOL_TIMEOUT,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_DATABASE,
+    options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+)
+
+# Функция для подключения к базе данных: выдаёт соединение из пула
+@contextmanager
 def db_connect():
     try:
-        connection = psycopg2.connect(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_DATABASE
-        )
-	 # Проверка существования таблиц
-        cursor = connection.cursor()
-        cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'emails')")
-        emails_table_exists = cursor.fetchone()[0]
-        cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'phone_numbers')")
-        phones_table_exists = cursor.fetchone()[0]
-        cursor.close()
-        
-        if not emails_table_exists or not phones_table_exists:
-            raise Exception("Одна или обе таблицы (emails, phone_numbers) не существуют")
-            
-        logging.info("✅ Подключение к базе данных %s успешно", DB_DATABASE)
-        return connection
+        with db_pool.connection() as connection:
+            yield connection
     except Error as e:
-        logging.error("❌ Ошибка подключения к базе данных: %s", str(e))
-        raise Exception(f"Ошибка подключения к базе данных: {str(e)}")
+        logging.error("❌ Ошибка базы данных: %s", str(e))
+        raise Exception(f"Ошибка базы данных: {str(e)}")
+
+# Запись новых значений в таблицу одним запросом.
+# Дубликаты внутри пачки отбрасываются до обращения к базе, уже существующие
+# значения отсекаются в самом запросе; возвращает число действительно добавленных строк.
+# От одновременной записи одного значения защищает только уникальный индекс на столбце
+# (ON CONFLICT DO NOTHING пропускает такие строки); без индекса дубликат возможен
+def db_insert_new(table, column, values):
+    values = list(dict.fromkeys(values))
+    if not values:
+        return 0
+    query = sql.SQL(
+        "INSERT INTO {table} ({column}) "
+        "SELECT v.value FROM (VALUES %s) AS v(value) "
+        "WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{column} = v.value) "
+        "ON CONFLICT DO NOTHING RETURNING 1"
+    ).format(table=sql.Identifier(table), column=sql.Identifier(column))
+    with db_connect() as connection:
+        with connection.cursor() as cursor, instrumentation.timer("db_query", query="insert", table=table):
+            inserted = execute_values(cursor, query, [(value,) for value in values],
+                                      page_size=len(values), fetch=True)
+    return len(inserted)
+
+# Настройка логирования: запись в файл выполняется в отдельном потоке через очередь.
+# Поток запускается из main(), а не при импорте модуля (см. scan_executor); возвращает QueueListener
+def start_logging():
+    return logconfig.setup(
+        LOG_FILE, level=LOG_LEVEL, max_bytes=LOG_MAX_BYTES, when=LOG_ROTATE_WHEN,
+        backups=LOG_BACKUPS, compress=LOG_COMPRESS, json_format=LOG_FORMAT == "json",
+    )
 
-# Настройка логирования
-handler = logging.FileHandler("monitoring_bot.log", encoding="utf-8")
-logging.basicConfig(handlers=[handler], level=logging.INFO)
 # Загрузка токена
 TOKEN = os.getenv("TOKEN")
 
@@ -63,21 +216,20 @@ FIND_EMAIL, FIND_PHONE, VERIFY_PASSWORD, SAVE_EMAIL, SAVE_PHONE = range(5)
 def start(update: Update, context: CallbackContext):
     update.message.reply_text("👋 Привет! Я бот для мониторинга и работы с базой данных. Используйте команды из меню.")
     logging.info("🚀 Пользователь %s вызвал /start", update.effective_user.username)
+    return ConversationHandler.END
 
 # Обработчик команды /find_email
 def handle_find_email(update: Update, context: CallbackContext):
-    update.message.reply_text("📧 Введите текст для поиска email-адресов:")
+    update.message.reply_text("📧 Введите текст для поиска email-адресов или отправьте файл (txt, csv, gz, zip):")
     logging.info("📧 Пользователь %s вызвал /find_email", update.effective_user.username)
     return FIND_EMAIL
 
 # Обработчик текста для поиска email
 def find_email(update: Update, context: CallbackContext):
     text = update.message.text
-    logging.info("📧 Пользователь %s ввёл текст для поиска email: %s", update.effective_user.username, text)
+    logging.info("📧 Пользователь %s ввёл текст для поиска email (%d символов)", update.effective_user.username, len(text))
     
-    # Регулярное выражение для поиска email
-    email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-    emails = re.findall(email_pattern, text)
+    emails = extraction.extract("email", text)
 
     if not emails:
         update.message.reply_text("📭 Email-адреса не найдены в тексте.")
@@ -91,6 +243,20 @@ def find_email(update: Update, context: CallbackContext):
     logging.info("✅ Найдено %d email-адресов для пользователя %s", len(emails), update.effective_user.username)
     return SAVE_EMAIL
 
+# Запись найденных email-адресов в базу данных (выполняется в пуле воркеров)
+def store_emails(update: Update, username, emails):
+    try:
+        inserted_count = db_insert_new("emails", "email", emails)
+        if inserted_count > 0:
+            update.effective_message.reply_text(f"✅ {inserted_count} email-адреса успешно записаны в базу данных!")
+            logging.info("✅ Пользователь %s записал %d email-адресов в базу данных", username, inserted_count)
+        else:
+            update.effective_message.reply_text("ℹ️ Все email-адреса уже есть в базе данных.")
+            logging.info("ℹ️ Пользователь %s: все email-адреса уже существуют", username)
+    except Exception as e:
+        update.effective_message.reply_text(f"❌ Ошибка при записи email-адресов: {str(e)}")
+        logging.error("❌ Ошибка при записи email-адресов для пользователя %s: %s", username, str(e))
+
 # Обработчик подтверждения записи email
 def save_email(update: Update, context: CallbackContext):
     response = update.message.text.lower()
@@ -98,28 +264,8 @@ def save_email(update: Update, context: CallbackContext):
     emails = context.user_data.get('emails', [])
 
     if response == 'да':
-        try:
-            connection = db_connect()
-            cursor = connection.cursor()
-            inserted_count = 0
-            for email in emails:
-                # Проверяем, существует ли email в базе
-                cursor.execute("SELECT email FROM emails WHERE email = %s", (email,))
-                if not cursor.fetchone():
-                    cursor.execute("INSERT INTO emails (email) VALUES (%s)", (email,))
-                    inserted_count += 1
-            connection.commit()
-            cursor.close()
-            connection.close()
-            if inserted_count > 0:
-                update.message.reply_text(f"✅ {inserted_count} email-адреса успешно записаны в базу данных!")
-                logging.info("✅ Пользователь %s записал %d email-адресов в базу данных", username, inserted_count)
-            else:
-                update.message.reply_text("ℹ️ Все email-адреса уже есть в базе данных.")
-                logging.info("ℹ️ Пользователь %s: все email-адреса уже существуют", username)
-        except Exception as e:
-            update.message.reply_text(f"❌ Ошибка при записи email-адресов: {str(e)}")
-            logging.error("❌ Ошибка при записи email-адресов для пользователя %s: %s", username, str(e))
+        if not handler_pool.submit(store_emails, update, username, list(emails)):
+            update.message.reply_text("⏳ Бот перегружен, попробуйте позже.")
     elif response == 'нет':
         update.message.reply_text("🚫 Запись email-адресов отменена.")
         logging.info("🚫 Пользователь %s отказался от записи email-адресов", username)
@@ -133,18 +279,16 @@ def save_email(update: Update, context: CallbackContext):
 
 # Обработчик команды /find_phone_number
 def handle_find_phone_number(update: Update, context: CallbackContext):
-    update.message.reply_text("📞 Введите текст для поиска номеров телефонов:")
+    update.message.reply_text("📞 Введите текст для поиска номеров телефонов или отправьте файл (txt, csv, gz, zip):")
     logging.info("📞 Пользователь %s вызвал /find_phone_number", update.effective_user.username)
     return FIND_PHONE
 
 # Обработчик текста для поиска номеров телефонов
 def find_phone_number(update: Update, context: CallbackContext):
     text = update.message.text
-    logging.info("📞 Пользователь %s ввёл текст для поиска номеров телефонов: %s", update.effective_user.username, text)
+    logging.info("📞 Пользователь %s ввёл текст для поиска номеров телефонов (%d символов)", update.effective_user.username, len(text))
     
-    # Регулярное выражение для поиска номеров телефонов
-    phone_pattern = r'(\+?\d{1,2}\s?\d{3}\s?\d{3}\s?\d{2}\s?\d{2}|\d{3}\s?\d{3}\s?\d{2}\s?\d{2}|\d{10})'
-    phones = re.findall(phone_pattern, text)
+    phones = extraction.extract("phone", text)
 
     if not phones:
         update.message.reply_text("📭 Номера телефонов не найдены в тексте.")
@@ -158,6 +302,20 @@ def find_phone_number(update: Update, context: CallbackContext):
     logging.info("✅ Найдено %d номеров телефонов для пользователя %s", len(phones), update.effective_user.username)
     return SAVE_PHONE
 
+# Запись найденных номеров телефонов в базу данных (выполняется в пуле воркеров)
+def store_phones(update: Update, username, phones):
+    try:
+        inserted_count = db_insert_new("phone_numbers", "phone_number", phones)
+        if inserted_count > 0:
+            update.effective_message.reply_text(f"✅ {inserted_count} номеров телефонов успешно записаны в базу данных!")
+            logging.info("✅ Пользователь %s записал %d номеров телефонов в базу данных", username, inserted_count)
+        else:
+            update.effective_message.reply_text("ℹ️ Все номера телефонов уже есть в базе данных.")
+            logging.info("ℹ️ Пользователь %s: все номера телефонов уже существуют", username)
+    except Exception as e:
+        update.effective_message.reply_text(f"❌ Ошибка при записи номеров телефонов: {str(e)}")
+        logging.error("❌ Ошибка при записи номеров телефонов для пользователя %s: %s", username, str(e))
+
 # Обработчик подтверждения записи номеров телефонов
 def save_phone(update: Update, context: CallbackContext):
     response = update.message.text.lower()
@@ -165,28 +323,8 @@ def save_phone(update: Update, context: CallbackContext):
     phones = context.user_data.get('phones', [])
 
     if response == 'да':
-        try:
-            connection = db_connect()
-            cursor = connection.cursor()
-            inserted_count = 0
-            for phone in phones:
-                # Проверяем, существует ли номер телефона в базе
-                cursor.execute("SELECT phone_number FROM phone_numbers WHERE phone_number = %s", (phone,))
-                if not cursor.fetchone():
-                    cursor.execute("INSERT INTO phone_numbers (phone_number) VALUES (%s)", (phone,))
-                    inserted_count += 1
-            connection.commit()
-            cursor.close()
-            connection.close()
-            if inserted_count > 0:
-                update.message.reply_text(f"✅ {inserted_count} номеров телефонов успешно записаны в базу данных!")
-                logging.info("✅ Пользователь %s записал %d номеров телефонов в базу данных", username, inserted_count)
-            else:
-                update.message.reply_text("ℹ️ Все номера телефонов уже есть в базе данных.")
-                logging.info("ℹ️ Пользователь %s: все номера телефонов уже существуют", username)
-        except Exception as e:
-            update.message.reply_text(f"❌ Ошибка при записи номеров телефонов: {str(e)}")
-            logging.error("❌ Ошибка при записи номеров телефонов для пользователя %s: %s", username, str(e))
+        if not handler_pool.submit(store_phones, update, username, list(phones)):
+            update.message.reply_text("⏳ Бот перегружен, попробуйте позже.")
     elif response == 'нет':
         update.message.reply_text("🚫 Запись номеров телефонов отменена.")
         logging.info("🚫 Пользователь %s отказался от записи номеров телефонов", username)
@@ -198,73 +336,118 @@ def save_phone(update: Update, context: CallbackContext):
     context.user_data.clear()
     return ConversationHandler.END
 
-# Функции get_emails и get_phone_numbers
-def get_emails(update: Update, context: CallbackContext):
-    logging.info("📧 Пользователь %s вызвал /get_emails", update.effective_user.username)
-    
-    try:
-        connection = db_connect()
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, email FROM emails")
-        emails = cursor.fetchall()
-        cursor.close()
-        connection.close()
-
-        if not emails:
-            update.message.reply_text("📭 Email-адреса не найдены в базе данных.")
-            logging.info("📭 Email-адреса не найдены для пользователя %s", update.effective_user.username)
-            return
-
-        email_list = [f"{email[0]}: {email[1]}" for email in emails]
-        output = "\n".join(email_list)
-
-        if len(output) > 4000:
-            file = BytesIO()
-            file.write(output.encode())
-            file.seek(0)
-            update.message.reply_document(document=file, filename="emails.txt")
-            logging.info("✅ Email-адреса отправлены как файл для пользователя %s", update.effective_user.username)
-        else:
-            update.message.reply_text(f"📧 Найденные email-адреса:\n{output}")
-            logging.info("✅ Email-адреса отправлены текстом для пользователя %s", update.effective_user.username)
 
-    except Exception as e:
-        logging.error("❌ Ошибка при получении email-адресов: %s", str(e))
-        update.message.reply_text(f"❌ Произошла ошибка: {str(e)}")
-
-def get_phone_numbers(update: Update, context: CallbackContext):
-    logging.info("📞 Пользователь %s вызвал /get_phone_numbers", update.effective_user.username)
-    
-    try:
-        connection = db_connect()
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, phone_number FROM phone_numbers")
-        phones = cursor.fetchall()
-        cursor.close()
-        connection.close()
-
-        if not phones:
-            update.message.reply_text("📭 Номера телефонов не найдены в базе данных.")
-            logging.info("📭 Номера телефонов не найдены для пользователя %s", update.effective_user.username)
+# Поиск в документах: тип → (ключ в user_data, заголовок, имя файла с результатом, функция записи в БД)
+SCAN_KINDS = {
+    "email": ("emails", "📧 Найденные email-адреса", "emails.txt", store_emails),
+    "phone": ("phones", "📞 Найденные номера телефонов", "phones.txt", store_phones),
+}
+
+# Пул процессов для поиска в больших файлах. Процессы запускаются fork'ом в main()
+# до старта потоков бота: потока записи логов (start_logging), потоков отправки сообщений
+# (outbox.start) и остальных, поэтому не наследуют захваченных блокировок. При импорте модуля
+# потоки не запускаются: пулы потоков создают их при первой задаче
+scan_executor = ProcessPoolExecutor(max_workers=SCAN_WORKERS, mp_context=multiprocessing.get_context("fork"))
+
+# Запуск процессов пула поиска (ProcessPoolExecutor с fork создаёт все процессы при первой задаче)
+def start_scan_workers():
+    scan_executor.submit(int).result()
+
+# Поиск в файле: текст читается и распаковывается порциями, окна по SCAN_WINDOW символов
+# обрабатываются в пуле процессов. Одновременно в работе не больше 2 * SCAN_WORKERS окон,
+# поэтому память ограничена независимо от размера файла
+def scan_file(path, kind, progress=None):
+    found = {}
+    pending = deque()
+    for window in textscan.iter_windows(textscan.read_chunks(path, 64 * 1024, progress), SCAN_WINDOW):
+        pending.append(scan_executor.submit(textscan.scan_window, kind, *window))
+        if len(pending) >= 2 * SCAN_WORKERS:
+            found.update(dict.fromkeys(pending.popleft().result()))
+    while pending:
+        found.update(dict.fromkeys(pending.popleft().result()))
+    return list(found)
+
+# Обработка присланного документа (выполняется в пуле воркеров): загрузка во временный файл,
+# поиск с сообщением о прогрессе, результат — файлом (больше OUTPUT_SPOOL_SIZE — сжатым)
+# и кнопки для записи в базу данных
+def scan_document(update: Update, context: CallbackContext, kind):
+    key, title, filename, _ = SCAN_KINDS[kind]
+    username = update.effective_user.username
+    document = update.message.document
+    if document.file_size and document.file_size > SCAN_MAX_SIZE:
+        update.message.reply_text(f"❌ Файл слишком большой (максимум {SCAN_MAX_SIZE // (1024 * 1024)} МБ).")
+        return
+    status = update.message.reply_text("⏳ Загрузка файла...")
+    last_update = [time.monotonic()]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if now - last_update[0] < SCAN_PROGRESS_INTERVAL:
             return
+        last_update[0] = now
+        try:
+            status.edit_text(f"⏳ Обработано {done * 100 // max(total, 1)}% ({done / 1048576:.1f} из {total / 1048576:.1f} МБ)")
+        except Exception as e:
+            logging.warning("Не удалось обновить прогресс поиска: %s", str(e))
 
-        phone_list = [f"{phone[0]}: {phone[1]}" for phone in phones]
-        output = "\n".join(phone_list)
+    with tempfile.NamedTemporaryFile(suffix=".scan") as file:
+        try:
+            document.get_file().download(out=file)
+            file.flush()
+            status.edit_text("⏳ Поиск...")
+            started = time.monotonic()
+            found = scan_file(file.name, kind, progress)
+        except Exception as e:
+            logging.error("❌ Ошибка при обработке файла %s пользователя %s: %s", document.file_name, username, str(e))
+            status.edit_text(f"❌ Ошибка при обработке файла: {str(e)}")
+            return
+    logging.info("✅ Файл %s (%d байт) пользователя %s обработан за %.1f с, найдено: %d",
+                 document.file_name, document.file_size or 0, username, time.monotonic() - started, len(found))
+    if not found:
+        status.edit_text("📭 Ничего не найдено в файле.")
+        return
+    status.edit_text(f"✅ Найдено: {len(found)}")
+    context.user_data[key] = found
+    delivery.deliver_file(update.effective_message, f"{title}: {len(found)}", "\n".join(found), filename, OUTPUT_SPOOL_SIZE)
+    update.message.reply_text(
+        "Хотите записать их в базу данных?",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("Да", callback_data=f"save:{kind}:yes"),
+            InlineKeyboardButton("Нет", callback_data=f"save:{kind}:no"),
+        ]]),
+    )
 
-        if len(output) > 4000:
-            file = BytesIO()
-            file.write(output.encode())
-            file.seek(0)
-            update.message.reply_document(document=file, filename="phone_numbers.txt")
-            logging.info("✅ Номера телефонов отправлены как файл для пользователя %s", update.effective_user.username)
-        else:
-            update.message.reply_text(f"📞 Найденные номера телефонов:\n{output}")
-            logging.info("✅ Номера телефонов отправлены текстом для пользователя %s", update.effective_user.username)
+# Обработчик документа для /find_email
+def find_email_document(update: Update, context: CallbackContext):
+    logging.info("📧 Пользователь %s прислал файл для поиска email: %s", update.effective_user.username, update.message.document.file_name)
+    if not handler_pool.submit(scan_document, update, context, "email"):
+        update.message.reply_text("⏳ Бот перегружен, попробуйте позже.")
+    return ConversationHandler.END
 
-    except Exception as e:
-        logging.error("❌ Ошибка при получении номеров телефонов: %s", str(e))
-        update.message.reply_text(f"❌ Произошла ошибка: {str(e)}")
+# Обработчик документа для /find_phone_number
+def find_phone_document(update: Update, context: CallbackContext):
+    logging.info("📞 Пользователь %s прислал файл для поиска номеров телефонов: %s", update.effective_user.username, update.message.document.file_name)
+    if not handler_pool.submit(scan_document, update, context, "phone"):
+        update.message.reply_text("⏳ Бот перегружен, попробуйте позже.")
+    return ConversationHandler.END
 
+# Обработчик кнопок записи результатов поиска в файле
+def save_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    _, kind, answer = query.data.split(":")
+    query.answer()
+    if kind not in SCAN_KINDS:
+        return
+    key, _, _, store = SCAN_KINDS[kind]
+    values = context.user_data.pop(key, None)
+    if answer != "yes":
+        query.edit_message_text("🚫 Запись отменена.")
+        return
+    if not values:
+        query.edit_message_text("ℹ️ Результаты поиска уже записаны или устарели.")
+        return
+    query.edit_message_text("⏳ Запись в базу данных...")
+    store(update, update.effective_user.username, values)
 
 # Функция для проверки сложности пароля
 def verify_password(update: Update, context: CallbackContext):
@@ -277,170 +460,480 @@ def verify_password(update: Update, context: CallbackContext):
         update.message.reply_text("Пароль не соответствует требованиям сложности. Он должен содержать минимум 8 символов, включая заглавные и строчные буквы, цифры и специальные символы.")
     return ConversationHandler.END
 
-# Инициализация SSH-клиента
-def ssh_connect():
-    logging.info("Устанавливается SSH-соединение с %s от имени пользователя %s", RM_HOST, RM_USER)
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(RM_HOST, username=RM_USER, password=RM_PASSWORD)
-    return ssh
+# Пул SSH-сессий: одно соединение на хост, отдельный канал на каждую команду
+ssh_pool = SSHSessionManager(
+    RM_USER, RM_PASSWORD,
+    port=RM_PORT,
+    max_channels=SSH_MAX_CHANNELS,
+    keepalive=SSH_KEEPALIVE,
+)
+
+# Инвентарь хостов (без файла инвентаря — единственный хост RM_HOST из .env); хост по умолчанию — см. Inventory.load
+inventory = Inventory.load(HOSTS_FILE, RM_HOST, RM_PORT, RM_USER, RM_PASSWORD, RM_BACKEND, RM_ROOT)
+
+# Исполнители команд для хостов, на которых работает сам бот (backend "local" или "proc");
+# создаются при запуске, поэтому ошибка в инвентаре видна сразу
+host_backends = {
+    host.name: backends.create(host.backend, host.root)
+    for host in inventory.hosts.values() if host.backend != "ssh"
+}
+
+# Пул потоков для параллельного выполнения команды на группе хостов
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+# Получение SSH-сессии к удалённому хосту (соединение переиспользуется между командами)
+def ssh_connect(host=None):
+    host = host or inventory.default
+    return ssh_pool.get(host.host, port=host.port, username=host.user, password=host.password)
+
+# Исполнитель команд хоста: SSH-сессия из пула или локальный исполнитель (backends.py)
+def host_backend(host=None):
+    host = host or inventory.default
+    if host.backend == "ssh":
+        return ssh_connect(host)
+    return host_backends[host.name]
+
+# Выполнение команды на хосте, возвращает (stdout, stderr)
+def host_exec(command, host=None, timeout=COMMAND_TIMEOUT):
+    stdout, stderr = host_backend(host).exec_command(command, timeout=timeout)
+    return stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+# Цель команды из аргументов (@хост или @группа) и оставшиеся аргументы
+def split_target(args):
+    target = None
+    rest = []
+    for arg in args or []:
+        if arg.startswith("@") and target is None:
+            target = arg[1:]
+        else:
+            rest.append(arg)
+    return target, rest
+
+# Отправка частей вывода через очередь исходящих сообщений без ожидания: обработчик освобождается сразу
+def post_to(message):
+    return lambda text: outbox.post(message.bot, message.chat_id, text)
+
+# Отправка вывода команды: до OUTPUT_MAX_MESSAGES сообщений с разбиением по строкам,
+# длиннее — сжатым файлом
+def send_output(update: Update, title, output, filename):
+    delivery.deliver_text(update.effective_message, title, output, filename,
+                          OUTPUT_MESSAGE_LIMIT, OUTPUT_MAX_MESSAGES, OUTPUT_SPOOL_SIZE,
+                          send=post_to(update.effective_message))
+
+# Выполнение команды с отправкой вывода: stdout пишется из SSH-канала прямо в буфер отправки,
+# без сборки и декодирования всей строки
+def stream_output(update: Update, command, title, filename, host=None, timeout=COMMAND_TIMEOUT):
+    buffer = delivery.OutputBuffer(OUTPUT_MAX_MESSAGES, OUTPUT_MESSAGE_LIMIT, OUTPUT_SPOOL_SIZE)
+    try:
+        host_backend(host).exec_stream(command, buffer.write, timeout=timeout)
+    except Exception:
+        buffer.close()
+        raise
+    delivery.deliver(update.effective_message, title, buffer, filename, OUTPUT_MESSAGE_LIMIT, OUTPUT_MAX_MESSAGES,
+                     send=post_to(update.effective_message))
+
+# Кэш результатов редко меняющихся команд: ключ — (хост, команда)
+result_cache = ResultCache(maxsize=CACHE_SIZE)
+
+# Выполнение команды с кэшированием результата на ttl секунд, возвращает (stdout, возраст данных)
+def cached_exec(command, host=None, ttl=0, refresh=False, timeout=COMMAND_TIMEOUT):
+    host = host or inventory.default
+    if ttl <= 0:
+        return host_exec(command, host, timeout)[0], 0.0
+    return result_cache.get_or_run((host.name, command), ttl,
+                                   lambda: host_exec(command, host, timeout)[0], refresh=refresh)
+
+# Пометка о возрасте данных из кэша
+def age_note(age):
+    if age < 1:
+        return ""
+    return f" (из кэша, получено {int(age)} с назад)"
+
+# Сводный отчёт по результатам выполнения команды на нескольких хостах
+def format_fanout(results):
+    failed = sum(1 for result in results if result.error)
+    lines = [f"Хостов: {len(results)}, успешно: {len(results) - failed}, с ошибкой: {failed}", ""]
+    for result in results:
+        latency = int(result.latency * 1000)
+        if result.error:
+            lines.append(f"=== {result.host.name} ({result.host.host}) — ❌ {result.error}, {latency} мс ===")
+        else:
+            output, age = result.output
+            lines.append(f"=== {result.host.name} ({result.host.host}) — {latency} мс{age_note(age)} ===")
+            lines.append(output.rstrip("\n"))
+        lines.append("")
+    return "\n".join(lines)
+
+# Выполнение команды мониторинга name: на хосте по умолчанию или, если указан @хост/@группа,
+# параллельно на всех хостах цели со сводным отчётом.
+# Для команд из CACHE_TTL результат кэшируется, аргумент refresh принудительно обновляет данные.
+# render, если задан, преобразует вывод команды перед отправкой.
+def run_command(update: Update, context: CallbackContext, name, command, title, filename="output.txt", render=None):
+    target, args = split_target(context.args)
+    refresh = "refresh" in args
+    ttl = CACHE_TTL.get(name, 0)
+    timeout = COMMAND_TIMEOUTS.get(name, COMMAND_TIMEOUT)
+    if target is None and ttl <= 0 and render is None:
+        try:
+            stream_output(update, command, title, filename, timeout=timeout)
+        except Exception as e:
+            logging.error("Ошибка при выполнении /%s: %s", name, str(e))
+            update.message.reply_text(f"❌ Ошибка при выполнении команды: {str(e)}")
+        return
+    if target is None:
+        try:
+            output, age = cached_exec(command, ttl=ttl, refresh=refresh, timeout=timeout)
+            if render is not None:
+                output = render(output)
+        except Exception as e:
+            logging.error("Ошибка при выполнении /%s: %s", name, str(e))
+            update.message.reply_text(f"❌ Ошибка при выполнении команды: {str(e)}")
+            return
+        send_output(update, title + age_note(age), output, filename)
+        return
+    try:
+        hosts = inventory.resolve(target)
+    except KeyError as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return
+    logging.info("Команда %s выполняется на %d хостах (%s)", command, len(hosts), target)
+    def run_on_host(host):
+        output, age = cached_exec(command, host, ttl=ttl, refresh=refresh, timeout=timeout)
+        return (render(output) if render is not None else output), age
+
+    results = fan_out(fanout_executor, hosts, run_on_host, FANOUT_TIMEOUT)
+    send_output(update, f"{title} — @{target}", format_fanout(results), filename)
+
+# Выполнение func(host) → текст на хосте по умолчанию или на всех хостах @цели с отправкой результата;
+# для команд, которым недостаточно одной команды оболочки
+def run_on_targets(update: Update, name, target, func, title, filename="output.txt"):
+    if target is None:
+        try:
+            output = func(inventory.default)
+        except Exception as e:
+            logging.error("Ошибка при выполнении /%s: %s", name, str(e))
+            update.message.reply_text(f"❌ Ошибка при выполнении команды: {str(e)}")
+            return
+        send_output(update, title, output, filename)
+        return
+    try:
+        hosts = inventory.resolve(target)
+    except KeyError as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return
+    results = fan_out(fanout_executor, hosts, lambda host: (func(host), 0.0), FANOUT_TIMEOUT)
+    send_output(update, f"{title} — @{target}", format_fanout(results), filename)
 
 # Команда для получения информации о релизе
 def get_release(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_release", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("lsb_release -a")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Информация о релизе:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_release", "lsb_release -a", "Информация о релизе")
 
 # Команда для получения информации о времени работы системы
 def get_uptime(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_uptime", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("uptime")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Время работы системы:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_uptime", "uptime", "Время работы системы")
 
 # Команда для получения информации о состоянии дисков
 def get_df(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_df", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("df -h")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Информация о файловой системе:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_df", "df -h", "Информация о файловой системе")
 
 # Команда для получения информации о системе
 def get_uname(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_uname", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("uname -a")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Информация о системе:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_uname", "uname -a", "Информация о системе")
 
 # Команда для получения информации о состоянии оперативной памяти
 def get_free(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_free", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("free -h")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Информация о памяти:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_free", "free -h", "Информация о памяти")
 
 # Команда для получения информации о производительности системы
 def get_mpstat(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_mpstat", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("mpstat")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Информация о производительности:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_mpstat", "mpstat", "Информация о производительности")
 
 # Команда для получения списка запущенных процессов
 def get_ps(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_ps", update.effective_user.username)
-    
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("ps aux")
-    output = stdout.read().decode()
-    ssh.close()
-
-    # Проверка длины вывода до отправки
-    if len(output) > 4000:
-        file = BytesIO()
-        file.write(output.encode())
-        file.seek(0)
-        update.message.reply_document(document=file, filename="ps_output.txt")
-    else:
-        update.message.reply_text(f"Список процессов:\n{output}")
+    target, args = split_target(context.args)
+    if "diff" in args:
+        run_on_targets(update, "get_ps", target, ps_diff, "Изменения в списке процессов", "ps_diff.txt")
+        return
+    options = parse_args(args)
+    top = options.get("top", PS_TOP)
+    try:
+        command = processes.ps_command(
+            sort=options.get("sort", "cpu"),
+            user=options.get("user"),
+            match=options.get("match"),
+            top=PS_TOP if top is True else int(top),
+        )
+    except ValueError as e:
+        update.message.reply_text(f"❌ {str(e)}")
+        return
+    run_command(update, context, "get_ps", command, "Список процессов", "ps_output.txt")
+
+# Последние снимки процессов по хостам для /get_ps diff
+process_snapshots = ProcessSnapshots()
+
+# Изменения в списке процессов хоста с прошлого вызова /get_ps diff
+def ps_diff(host):
+    output, error = host_exec(processes.ps_command(sort="pid"), host)
+    current = processes.parse_snapshot(output)
+    if not current:
+        raise Exception(error.strip() or "Не удалось получить список процессов")
+    previous = process_snapshots.swap(host.name, current)
+    if previous is None:
+        return "Снимок сохранён, изменения будут показаны при следующем вызове /get_ps diff."
+    return processes.format_diff(*processes.diff_processes(previous, current, PS_DIFF_GROWTH * 1048576))
 
 # Команда для получения информации о пользователях
 def get_w(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_w", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("w")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Список пользователей:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_w", "w", "Список пользователей")
 
 # Команда для получения логов (последние 10 входов в систему)
 def get_auths(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_auths", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("last -n 10")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Последние 10 входов:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_auths", "last -n 10", "Последние 10 входов")
 
-# Команда для получения последних 5 критических событий
+# Команда для получения критических событий (при первом вызове — последние 5, затем только новые)
 def get_critical(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_critical", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("journalctl -p 3 -n 5")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Последние 5 критических событий:\n{output}")
-    ssh.close()
+    run_log_command(update, context, "critical")
 
 # Команда для получения информации об используемых портах
 def get_ss(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_ss", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("ss -tuln")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Информация об используемых портах:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_ss", "ss -tuln", "Информация об используемых портах")
 
 # Команда для получения информации об установленных пакетах
 def get_apt_list(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_apt_list", update.effective_user.username)
-    
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("apt list --installed")
-    output = stdout.read().decode()
-    ssh.close()
-
-    # Проверка длины вывода
-    if len(output) > 4000:
-        file = BytesIO()
-        file.write(output.encode())
-        file.seek(0)
-        update.message.reply_document(document=file, filename="apt_list.txt")
+    target, args = split_target(context.args)
+    max_age = 0 if "refresh" in args else CACHE_TTL.get("get_apt_list", 0)
+    args = [arg for arg in args if arg != "refresh"]
+    timeout = COMMAND_TIMEOUTS.get("get_apt_list", COMMAND_TIMEOUT)
+
+    def query(host):
+        index = package_inventory.refresh(host.name, lambda script: host_exec(script, host, timeout)[0], max_age)
+        if not args:
+            return packages.format_packages(index.all())
+        if args[0] == "diff":
+            diff = package_inventory.last_diff(host.name)
+            return packages.format_diff(diff) if diff else "Изменений с момента первой загрузки списка пакетов не было."
+        found = index.search(args[0])
+        return packages.format_packages(found) if found else f"Пакеты, содержащие «{args[0]}», не найдены."
+
+    if not args:
+        title = "Список установленных пакетов"
+    elif args[0] == "diff":
+        title = "Изменения в списке пакетов"
     else:
-        update.message.reply_text(f"Список установленных пакетов:\n{output}")
+        title = f"Поиск пакета «{args[0]}»"
+    run_on_targets(update, "get_apt_list", target, query, title, "apt_list.txt")
+
+# Индексы установленных пакетов по хостам (перечитываются при изменении базы dpkg)
+package_inventory = PackageInventory()
 
 # Команда для получения информации о запущенных сервисах
 def get_services(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_services", update.effective_user.username)
-    ssh = ssh_connect()
-    stdin, stdout, stderr = ssh.exec_command("systemctl list-units --type=service --state=running")
-    output = stdout.read().decode()
-    update.message.reply_text(f"Запущенные сервисы:\n{output}")
-    ssh.close()
+    run_command(update, context, "get_services", "systemctl list-units --type=service --state=running", "Запущенные сервисы")
+
+# Команда для получения снимка состояния системы: uptime, free, df, mpstat, ss и сервисы
+# выполняются одним составным скриптом в одном SSH-канале
+def get_snapshot(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /get_snapshot", update.effective_user.username)
+    marker = snapshot.new_marker()
+    run_command(
+        update, context, "get_snapshot",
+        snapshot.build_script(snapshot.SNAPSHOT_SECTIONS, marker),
+        "Снимок состояния системы", "snapshot.txt",
+        render=lambda output: snapshot.format_snapshot(snapshot.SNAPSHOT_SECTIONS, snapshot.parse_output(output, marker)),
+    )
+
+# Хранилище метрик: кольцевые буферы на COLLECT_RETENTION часов при интервале сбора COLLECT_INTERVAL
+# (или COLLECT_AGENT_INTERVAL, если метрики присылает агент)
+SAMPLE_INTERVAL = min(COLLECT_INTERVAL, COLLECT_AGENT_INTERVAL) if COLLECT_AGENT else COLLECT_INTERVAL
+metrics_store = MetricsStore(capacity=max(int(COLLECT_RETENTION * 3600 / max(SAMPLE_INTERVAL, 1)), 1))
+
+# Движок оповещений и очередь оповещений для подписанных чатов
+alert_engine = AlertEngine(parse_rules(ALERT_RULES, ALERT_HYSTERESIS))
+alert_notifier = AlertNotifier(
+    Subscriptions(ALERT_SUBSCRIBERS_FILE),
+    RateLimiter(rate=ALERT_RATE / 60, burst=ALERT_BURST),
+)
+
+# Курсоры journalctl последней успешной выборки по хостам (для подсчёта новых записей журнала)
+journal_cursors = {}
+
+# Текст оповещения о переходе состояния
+def format_alert(event):
+    rule = event.rule
+    if event.kind == "event":
+        return f"⚠️ {event.host}: новых критических событий в журнале — {int(event.value)} (/get_critical @{event.host})"
+    if event.kind == "resolved":
+        return f"🟢 {event.host}: {event.metric} = {event.value:.1f} — снова в норме"
+    held = f" дольше {int(rule.duration)} с" if rule.duration else ""
+    return f"🔴 {event.host}: {event.metric} = {event.value:.1f} (порог {rule.op} {rule.threshold:g}{held})"
+
+# Запись выборки метрик хоста и проверка правил оповещений; возвращает тексты оповещений
+def record_metrics(host, timestamp, metrics):
+    metrics_store.record(host, timestamp, metrics)
+    alerts = []
+    for event in alert_engine.evaluate(host, timestamp, metrics):
+        logging.info("Оповещение %s: %s %s = %s", event.kind, event.host, event.metric, event.value)
+        alerts.append(format_alert(event))
+    return alerts
+
+# Выборка от агента сбора метрик (в потоке чтения агента); оповещения отправляет flush_alerts
+def agent_sample(host, timestamp, metrics):
+    alert_notifier.push(record_metrics(host, timestamp, metrics))
+
+# Агенты сбора метрик на хостах (COLLECT_AGENT)
+agent_collector = AgentCollector(ssh_connect, COLLECT_AGENT_INTERVAL, agent_sample)
+
+# Одна выборка метрик хоста: командами, а для хостов с агентом или backend "proc" —
+# только журнал командой, остальное из потока агента или прямым чтением /proc.
+# Для backend "proc" журнал читается с машины бота из корня хоста (journalctl --root).
+# Возвращает (метрики, новый курсор журнала)
+def sample_host(host):
+    backend = host_backend(host)
+    direct = isinstance(backend, backends.ProcBackend)
+    live = direct or agent_collector.live(host.name)
+    if direct:
+        execute = lambda script: backend.exec_local(script, timeout=COMMAND_TIMEOUT)[0].decode(errors="replace")
+    else:
+        execute = lambda script: host_exec(script, host)[0]
+    metrics, cursor = collector.collect_sample(
+        execute, journal_cursor=journal_cursors.get(host.name),
+        sections=() if live else collector.COLLECT_SECTIONS, root=backend.root if direct else "/")
+    if direct:
+        metrics.update(backend.sample())
+    return metrics, cursor
+
+# Периодическая задача: сбор метрик со всех хостов инвентаря одним составным скриптом на хост
+# и проверка правил оповещений по новой выборке (см. sample_host)
+def collect_metrics(context: CallbackContext):
+    hosts = list(inventory.hosts.values())
+    results = fan_out(fanout_executor, hosts, sample_host, FANOUT_TIMEOUT)
+    now = time.time()
+    alerts = []
+    for result in results:
+        if result.error:
+            logging.warning("Не удалось собрать метрики с %s: %s", result.host.name, result.error)
+            continue
+        metrics, cursor = result.output
+        # Курсор сдвигается только вместе с учтённой выборкой, иначе записи журнала потеряются
+        if cursor:
+            journal_cursors[result.host.name] = cursor
+        alerts.extend(record_metrics(result.host.name, now, metrics))
+    alert_notifier.push(alerts)
+    alert_notifier.flush(lambda chat_id, text: outbox.post(context.bot, chat_id, text))
+
+# Периодическая задача: отправка оповещений, отложенных из-за ограничения частоты
+def flush_alerts(context: CallbackContext):
+    alert_notifier.flush(lambda chat_id, text: outbox.post(context.bot, chat_id, text))
+
+# Команда для подписки чата на оповещения
+def subscribe_alerts(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /subscribe", update.effective_user.username)
+    if alert_notifier.subscriptions.add(update.effective_chat.id):
+        update.message.reply_text("🔔 Чат подписан на оповещения.")
+    else:
+        update.message.reply_text("Чат уже подписан на оповещения.")
+
+# Команда для отписки чата от оповещений
+def unsubscribe_alerts(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /unsubscribe", update.effective_user.username)
+    if alert_notifier.subscriptions.remove(update.effective_chat.id):
+        update.message.reply_text("🔕 Чат отписан от оповещений.")
+    else:
+        update.message.reply_text("Чат не был подписан на оповещения.")
+
+# Команда для просмотра правил и сработавших оповещений
+def get_alerts(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /alerts", update.effective_user.username)
+    lines = ["Правила:"]
+    for rule in alert_engine.rules:
+        held = f" дольше {int(rule.duration)} с" if rule.duration else ""
+        lines.append(f"• {rule.metric} {rule.op} {rule.threshold:g}{held}")
+    active = alert_engine.active()
+    lines.append("")
+    lines.append(f"Сработавшие оповещения: {len(active)}")
+    for rule, host, metric in active:
+        last = metrics_store.last(host, metric)
+        value = f" = {last[1]:.1f}" if last else ""
+        lines.append(f"🔴 {host}: {metric}{value} ({rule.op} {rule.threshold:g})")
+    update.message.reply_text("\n".join(lines))
+
+# Команда для просмотра истории метрик из локального хранилища (без обращения к серверу):
+# /history <cpu|load|free|df> [период, например 30m, 6h, 1d] [@хост|@группа]
+def get_history(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /history", update.effective_user.username)
+    target, args = split_target(context.args)
+    if not args or args[0] not in collector.METRIC_GROUPS:
+        update.message.reply_text("Использование: /history <cpu|load|free|df> [30m|6h|1d] [@хост]")
+        return
+    title, prefixes, scale = collector.METRIC_GROUPS[args[0]]
+    try:
+        period = collector.parse_period(args[1]) if len(args) > 1 else 3600
+        hosts = inventory.resolve(target) if target else [inventory.default]
+    except (KeyError, ValueError) as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return
+    since = time.time() - period
+    lines = []
+    for host in hosts:
+        lines.append(f"=== {host.name} ===")
+        for metric in collector.group_metrics(metrics_store.metrics(host.name), prefixes):
+            points = metrics_store.series(host.name, metric, since)
+            if not points:
+                continue
+            values = [value for _, value in points]
+            averages = [average for _, _, average, _ in downsample(points, HISTORY_BUCKETS)]
+            lines.append(
+                f"{metric}: сейчас {values[-1]:.1f}, мин. {min(values):.1f}, "
+                f"сред. {sum(values) / len(values):.1f}, макс. {max(values):.1f} ({len(values)} точек)"
+            )
+            lines.append(sparkline(averages, *(scale or (None, None))))
+        if lines[-1].startswith("==="):
+            lines.append("Нет данных за период.")
+        lines.append("")
+    send_output(update, f"{title} за {args[1] if len(args) > 1 else '1h'}", "\n".join(lines), "history.txt")
+
+# Команда для сброса кэша результатов (для всех хостов или для @хоста/@группы)
+def refresh_cache(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /refresh", update.effective_user.username)
+    target, _ = split_target(context.args)
+    try:
+        names = {host.name for host in inventory.resolve(target)} if target else None
+    except KeyError as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return
+    dropped = result_cache.invalidate(None if names is None else lambda key: key[0] in names)
+    update.message.reply_text(f"🔄 Кэш очищен, удалено записей: {dropped}.")
 
 # Команда для разрыва SSH-соединения
 def disconnect_ssh(update: Update, context: CallbackContext):
     logging.info("Пользователь %s разорвал SSH-соединение", update.effective_user.username)
-    update.message.reply_text("Соединение с сервером разорвано.")
-    return ConversationHandler.END
-
-
-# Функции для обработки текстовых сообщений
-def start(update: Update, context: CallbackContext):
-    logging.info("Пользователь %s начал сессию через /start", update.effective_user.username)
-    update.message.reply_text("Привет! Я могу помочь вам с различными задачами. Используйте команду /find_email, /find_phone_number или /verify_password.")
+    target, _ = split_target(context.args)
+    try:
+        hosts = inventory.resolve(target) if target else [inventory.default]
+    except KeyError as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return ConversationHandler.END
+    if sum(ssh_pool.close(host.host) for host in hosts if host.backend == "ssh"):
+        update.message.reply_text("Соединение с сервером разорвано.")
+    else:
+        update.message.reply_text("Активного соединения с сервером нет.")
     return ConversationHandler.END
 
-def handle_find_email(update: Update, context: CallbackContext):
-    update.message.reply_text("Введите текст для поиска email-адресов:")
-    return FIND_EMAIL
-
-def handle_find_phone_number(update: Update, context: CallbackContext):
-    update.message.reply_text("Введите текст для поиска номеров телефонов:")
-    return FIND_PHONE
 
+# Обработчик команды /verify_password
 def handle_verify_password(update: Update, context: CallbackContext):
     update.message.reply_text("Введите пароль для проверки его сложности:")
     return VERIFY_PASSWORD
@@ -450,148 +943,297 @@ def handle_verify_password(update: Update, context: CallbackContext):
 
 
 
-# Команда для получения логов репликации
-def get_repl_logs(update: Update, context: CallbackContext):
-    logging.info("Пользователь %s вызвал /get_repl_logs", update.effective_user.username)
-    
-    try:
-        ssh = ssh_connect()
-        # Команда для чтения логов PostgreSQL и фильтрации строк, связанных с репликацией
-        command = "grep -i 'replication\\|wal\\|streaming' /var/log/postgresql/postgresql.log | tail -n 50"
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
-        ssh.close()
-
-        if error:
-            update.message.reply_text(f"Ошибка при получении логов: {error}")
-            return
-
-        if not output:
-            update.message.reply_text("Логи репликации не найдены или пусты.")
-            return
-
-        # Проверка длины вывода
-        if len(output) > 4000:
-            file = BytesIO()
-            file.write(output.encode())
-            file.seek(0)
-            update.message.reply_document(document=file, filename="replication_logs.txt")
-        else:
-            update.message.reply_text(f"Логи репликации (последние 50 строк):\n{output}")
 
-    except Exception as e:
-        logging.error("Ошибка при получении логов репликации: %s", str(e))
-        update.message.reply_text(f"Произошла ошибка: {str(e)}")
-#-------------------------------------------------------------------
 
+# Таблицы, которые можно выгружать командами /get_emails и /get_phone_numbers
+DB_TABLES = {
+    "emails": {
+        "column": "email",
+        "title": "📧 Найденные email-адреса",
+        "empty": "📭 Email-адреса не найдены в базе данных.",
+        "filename": "emails.txt",
+    },
+    "phone_numbers": {
+        "column": "phone_number",
+        "title": "📞 Найденные номера телефонов",
+        "empty": "📭 Номера телефонов не найдены в базе данных.",
+        "filename": "phone_numbers.txt",
+    },
+}
+
+# Разбор аргументов команды вида key=value (остальные слова возвращаются как флаги)
+def parse_args(args):
+    options = {}
+    for arg in args or []:
+        key, sep, value = arg.partition("=")
+        options[key.lower()] = value if sep else True
+    return options
+
+# Построчное чтение таблицы через именованный (серверный) курсор порциями по DB_STREAM_CHUNK строк
+def db_stream_rows(table):
+    query = sql.SQL("SELECT id, {column} FROM {table} ORDER BY id").format(
+        column=sql.Identifier(DB_TABLES[table]["column"]), table=sql.Identifier(table))
+    with db_connect() as connection:
+        # Время выгрузки включает чтение всех порций серверного курсора
+        with connection.cursor(name=f"stream_{table}") as cursor, \
+                instrumentation.timer("db_query", query="stream", table=table):
+            cursor.itersize = DB_STREAM_CHUNK
+            cursor.execute(query)
+            for row in cursor:
+                yield row
+
+# Одна страница таблицы по ключу id (keyset-пагинация): строки после after или перед before.
+# Возвращает строки по возрастанию id и признак того, что в направлении чтения есть ещё строки.
+def db_fetch_page(table, limit, after=None, before=None):
+    column = sql.Identifier(DB_TABLES[table]["column"])
+    if before is not None:
+        query = sql.SQL("SELECT id, {column} FROM {table} WHERE id < %s ORDER BY id DESC LIMIT %s")
+        params = (before, limit + 1)
+    else:
+        query = sql.SQL("SELECT id, {column} FROM {table} WHERE id > %s ORDER BY id LIMIT %s")
+        params = (after or 0, limit + 1)
+    with db_connect() as connection:
+        with connection.cursor() as cursor, instrumentation.timer("db_query", query="page", table=table):
+            cursor.execute(query.format(column=column, table=sql.Identifier(table)), params)
+            rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    return rows, has_more
+
+# Текст и кнопки навигации для страницы таблицы
+def render_page(table, limit, after=None, before=None):
+    rows, has_more = db_fetch_page(table, limit, after=after, before=before)
+    if not rows:
+        return DB_TABLES[table]["empty"], None
+    title = DB_TABLES[table]["title"]
+    lines = []
+    length = len(title) + 32
+    last_id = rows[0][0]
+    truncated = False
+    for row_id, value in rows:
+        line = f"{row_id}: {value}"
+        if lines and length + len(line) + 1 > 4000:
+            # Страница не помещается в сообщение — следующая начнётся с этой строки
+            truncated = True
+            break
+        lines.append(line)
+        length += len(line) + 1
+        last_id = row_id
+    first_id = rows[0][0]
+    if before is not None:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(after), has_more or truncated
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"page:{table}:b:{first_id}:{limit}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Вперёд ➡️", callback_data=f"page:{table}:a:{last_id}:{limit}"))
+    text = f"{title} (id {first_id}–{last_id}):\n" + "\n".join(lines)
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+# Выгрузка всей таблицы: строки читаются потоком и пишутся в буфер отправки; большая таблица
+# сжимается на лету во временный файл, который держится в памяти только до DB_SPOOL_SIZE байт.
+# Возвращает True, если таблица отправлена файлом
+def send_table(update: Update, table):
+    spec = DB_TABLES[table]
+    buffer = delivery.OutputBuffer(OUTPUT_MAX_MESSAGES, OUTPUT_MESSAGE_LIMIT, DB_SPOOL_SIZE)
+    chunk = []
+    count = 0
+    try:
+        for row_id, value in db_stream_rows(table):
+            chunk.append(f"{row_id}: {value}\n")
+            count += 1
+            if len(chunk) >= DB_STREAM_CHUNK:
+                buffer.write("".join(chunk).encode())
+                chunk = []
+        buffer.write("".join(chunk).encode())
+    except Exception:
+        buffer.close()
+        raise
+
+    if not count:
+        buffer.close()
+        update.message.reply_text(spec["empty"])
+        return False
+    delivery.deliver(update.effective_message, spec["title"], buffer, spec["filename"],
+                     OUTPUT_MESSAGE_LIMIT, OUTPUT_MAX_MESSAGES, send=post_to(update.effective_message))
+    return buffer.compressed
+
+# Общая логика /get_emails и /get_phone_numbers:
+# без аргументов — выгрузка всей таблицы, с after=/before=/limit= — постраничный просмотр
+def handle_get_table(update: Update, context: CallbackContext, table):
+    username = update.effective_user.username
+    options = parse_args(context.args)
+    if {"after", "before", "limit", "page"} & options.keys():
+        limit = min(max(int(options.get("limit") or DB_PAGE_SIZE), 1), DB_PAGE_MAX)
+        after = int(options["after"]) if options.get("after") not in (None, True) else None
+        before = int(options["before"]) if options.get("before") not in (None, True) else None
+        text, markup = render_page(table, limit, after=after, before=before)
+        update.message.reply_text(text, reply_markup=markup)
+        logging.info("✅ Страница таблицы %s отправлена пользователю %s", table, username)
+        return
+    if send_table(update, table):
+        logging.info("✅ Таблица %s отправлена как файл для пользователя %s", table, username)
+    else:
+        logging.info("✅ Таблица %s отправлена текстом для пользователя %s", table, username)
 
 # Команда для получения email-адресов
 def get_emails(update: Update, context: CallbackContext):
     logging.info("📧 Пользователь %s вызвал /get_emails", update.effective_user.username)
-    
     try:
-        connection = db_connect()
-        cursor = connection.cursor()
-        # Выбираем id и email из таблицы emails
-        cursor.execute("SELECT id, email FROM emails")
-        emails = cursor.fetchall()
-        cursor.close()
-        connection.close()
-
-        if not emails:
-            update.message.reply_text("📭 Email-адреса не найдены в базе данных.")
-            logging.info("📭 Email-адреса не найдены для пользователя %s", update.effective_user.username)
-            return
-
-        # Формируем список email-адресов с id
-        email_list = [f"{email[0]}: {email[1]}" for email in emails]
-        output = "\n".join(email_list)
-
-        # Проверка длины вывода
-        if len(output) > 4000:
-            file = BytesIO()
-            file.write(output.encode())
-            file.seek(0)
-            update.message.reply_document(document=file, filename="emails.txt")
-            logging.info("✅ Email-адреса отправлены как файл для пользователя %s", update.effective_user.username)
-        else:
-            update.message.reply_text(f"📧 Найденные email-адреса:\n{output}")
-            logging.info("✅ Email-адреса отправлены текстом для пользователя %s", update.effective_user.username)
-
+        handle_get_table(update, context, "emails")
     except Exception as e:
         logging.error("❌ Ошибка при получении email-адресов: %s", str(e))
         update.message.reply_text(f"❌ Произошла ошибка: {str(e)}")
 
-
-
 # Команда для получения номеров телефонов
 def get_phone_numbers(update: Update, context: CallbackContext):
     logging.info("📞 Пользователь %s вызвал /get_phone_numbers", update.effective_user.username)
-    
     try:
-        connection = db_connect()
-        cursor = connection.cursor()
-        # Выбираем id и phone_number из таблицы phone_numbers
-        cursor.execute("SELECT id, phone_number FROM phone_numbers")
-        phones = cursor.fetchall()
-        cursor.close()
-        connection.close()
-
-        if not phones:
-            update.message.reply_text("📭 Номера телефонов не найдены в базе данных.")
-            logging.info("📭 Номера телефонов не найдены для пользователя %s", update.effective_user.username)
-            return
-
-        # Формируем список номеров телефонов с id
-        phone_list = [f"{phone[0]}: {phone[1]}" for phone in phones]
-        output = "\n".join(phone_list)
-
-        # Проверка длины вывода
-        if len(output) > 4000:
-            file = BytesIO()
-            file.write(output.encode())
-            file.seek(0)
-            update.message.reply_document(document=file, filename="phone_numbers.txt")
-            logging.info("✅ Номера телефонов отправлены как файл для пользователя %s", update.effective_user.username)
-        else:
-            update.message.reply_text(f"📞 Найденные номера телефонов:\n{output}")
-            logging.info("✅ Номера телефонов отправлены текстом для пользователя %s", update.effective_user.username)
-
+        handle_get_table(update, context, "phone_numbers")
     except Exception as e:
         logging.error("❌ Ошибка при получении номеров телефонов: %s", str(e))
         update.message.reply_text(f"❌ Произошла ошибка: {str(e)}")
 
-
-
-
-
-# Настройка ConversationHandler
-def main():
-    updater = Updater(TOKEN)
-    dispatcher = updater.dispatcher
-
-    # Обработчик состояний
-    conversation_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start)],
-        states={
-	    FIND_EMAIL: [MessageHandler(Filters.text & ~Filters.command, find_email)],
-            FIND_PHONE: [MessageHandler(Filters.text & ~Filters.command, find_phone_number)],
-            VERIFY_PASSWORD: [MessageHandler(Filters.text & ~Filters.command, verify_password)],
-            SAVE_EMAIL: [MessageHandler(Filters.text & ~Filters.command, save_email)],
-            SAVE_PHONE: [MessageHandler(Filters.text & ~Filters.command, save_phone)],
-        },
-        fallbacks=[CommandHandler('start', start)]
+# Обработчик кнопок навигации по страницам таблиц
+def page_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    _, table, direction, row_id, limit = query.data.split(":")
+    query.answer()
+    if table not in DB_TABLES:
+        return
+    try:
+        if direction == "a":
+            text, markup = render_page(table, int(limit), after=int(row_id))
+        else:
+            text, markup = render_page(table, int(limit), before=int(row_id))
+        query.edit_message_text(text, reply_markup=markup)
+    except Exception as e:
+        logging.error("❌ Ошибка при переходе по страницам таблицы %s: %s", table, str(e))
+        query.edit_message_text(f"❌ Произошла ошибка: {str(e)}")
+
+
+# Пул воркеров для обработчиков, выполняющих SSH- и DB-запросы
+handler_pool = HandlerPool(workers=HANDLER_WORKERS, max_queue=HANDLER_QUEUE)
+
+# Очередь исходящих сообщений: лимиты Telegram на чат и на бота, объединение коротких сообщений,
+# повтор после RetryAfter. Потоки отправки запускаются в main() (см. scan_executor)
+outbox = Outbox(
+    workers=OUTBOX_WORKERS,
+    rate=OUTBOX_RATE,
+    chat_rate=OUTBOX_CHAT_RATE,
+    chat_burst=OUTBOX_CHAT_BURST,
+    group_rate=OUTBOX_GROUP_RATE / 60,
+    max_queue=OUTBOX_CHAT_QUEUE,
+    retries=OUTBOX_RETRIES,
+    limit=delivery.TELEGRAM_LIMIT,
+)
+instrumentation.registry.gauge("outbox_queued", lambda: outbox.stats()["queued"])
+
+# Запуск обработчика в пуле воркеров: диспетчер не ждёт медленных SSH- и DB-вызовов
+# и продолжает обрабатывать обновления из других чатов
+def background(callback):
+    callback = traced(callback)
+
+    @wraps(callback)
+    def wrapper(update: Update, context: CallbackContext):
+        if not handler_pool.submit(callback, update, context):
+            outbox.post(context.bot, update.effective_chat.id, "⏳ Бот перегружен, попробуйте позже.")
+    return wrapper
+
+# Обработчик в контексте запроса: записи лога получают общий идентификатор,
+# по завершении в лог пишется длительность обработки
+def traced(callback):
+    @wraps(callback)
+    def wrapper(update: Update, context: CallbackContext):
+        user = update.effective_user.username if update.effective_user else None
+        with logconfig.request(callback.__name__, user), instrumentation.timer("handler", command=callback.__name__):
+            return callback(update, context)
+    return wrapper
+
+# Бот с замером времени каждого запроса к Telegram Bot API (кроме длинного опроса getUpdates).
+# Отправка и изменение сообщений идут через очередь outbox (такие сообщения не объединяются с соседними).
+# В потоках пула обработчиков вызов ждёт своей очереди и возвращает результат как обычно; в остальных
+# потоках (диспетчер, очередь задач) сообщение ставится в очередь без ожидания и вызов возвращает None,
+# иначе лимит или RetryAfter одного чата останавливал бы обработку обновлений всех чатов
+# Содержимое документа читается при постановке в очередь: вызывающий может сразу закрыть файл
+class InstrumentedBot(Bot):
+    def _post(self, endpoint, data=None, timeout=DEFAULT_NONE, api_kwargs=None):
+        if endpoint == "getUpdates":
+            return super()._post(endpoint, data, timeout, api_kwargs)
+        with instrumentation.timer("telegram", method=endpoint):
+            return super()._post(endpoint, data, timeout, api_kwargs)
+
+    def _queued(self, chat_id, send):
+        if chat_id is None or outbox.in_sender():
+            return send()
+        future = outbox.submit(chat_id, send)
+        if handler_pool.in_worker():
+            return future.result()
+        outbox.detach(chat_id, future)
+        return None
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        return self._queued(chat_id, lambda: Bot.send_message(self, chat_id, text, *args, **kwargs))
+
+    def send_document(self, chat_id, document, *args, **kwargs):
+        document = replayable(document)
+        return self._queued(chat_id, lambda: Bot.send_document(self, chat_id, document(), *args, **kwargs))
+
+    def edit_message_text(self, text, chat_id=None, *args, **kwargs):
+        return self._queued(chat_id, lambda: Bot.edit_message_text(self, text, chat_id, *args, **kwargs))
+
+# Команда /stats (только для ADMIN_IDS): задержки и ошибки по командам, хостам и обращениям
+# к SSH, базе данных и Telegram; аргумент — префикс имени операции, например /stats ssh
+def get_stats(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /stats", update.effective_user.username)
+    if update.effective_user.id not in ADMIN_IDS:
+        update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+    prefix = context.args[0] if context.args else ""
+    lines = []
+    for name, labels, count, errors, _, p50, p95, p99 in instrumentation.registry.snapshot():
+        if not name.startswith(prefix):
+            continue
+        label = ",".join(str(value) for value in labels.values())
+        lines.append(
+            f"{name}{f'[{label}]' if label else ''}: n={count} ошибок={errors} "
+            f"p50={p50 * 1000:.1f} p95={p95 * 1000:.1f} p99={p99 * 1000:.1f}"
+        )
+    send_output(update, "Задержки, мс", "\n".join(lines) or "Данных пока нет.", "stats.txt")
+
+# Команда для получения статистики пула воркеров
+def get_bot_stats(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /bot_stats", update.effective_user.username)
+    stats = handler_pool.stats()
+    sending = outbox.stats()
+    update.message.reply_text(
+        "Пул обработчиков:\n"
+        f"Воркеров: {stats['workers']}, выполняется: {stats['running']}\n"
+        f"В очереди: {stats['queued']} (макс. {stats['max_queued']}), отклонено: {stats['rejected']}\n"
+        f"Выполнено: {stats['completed']}, с ошибкой: {stats['failed']}\n\n"
+        "Очередь исходящих сообщений:\n"
+        f"В очереди: {sending['queued']} (макс. {sending['max_queued']}), чатов: {sending['chats']}, "
+        f"отправляется: {sending['sending']}\n"
+        f"Отправлено: {sending['sent']}, объединено: {sending['coalesced']}, повторов: {sending['retried']}\n"
+        f"С ошибкой: {sending['failed']}, отброшено: {sending['rejected']}"
     )
 
-    # Добавляем обработчики
-    dispatcher.add_handler(conversation_handler)
-    dispatcher.add_handler(CommandHandler("get_release", get_release))
-    dispatcher.add_handler(CommandHandler("get_uptime", get_uptime))
-    dispatcher.add_handler(CommandHandler("get_df", get_df))
+# Команда для получения статистики пула соединений с базой данных
+def get_db_stats(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /db_stats", update.effective_user.username)
+    stats = db_pool.stats()
+    update.message.reply_text(
+        "Пул соединений с базой данных:\n"
+        f"Размер: {stats['size']}, занято: {stats['in_use']}\n"
+        f"Выдано соединений: {stats['checkouts']}, переподключений: {stats['broken']}\n"
+        f"Ожидание: среднее {stats['wait_avg_ms']:.1f} мс, макс. {stats['wait_max_ms']:.1f} мс\n"
+        f"Выдача: среднее {stats['checkout_avg_ms']:.1f} мс, макс. {stats['checkout_max_ms']:.1f} мс"
+    )
 
-    updater.start_polling()
-    updater.idle()
 
 def set_bot_commands(updater):
     updater.bot.set_my_commands([
@@ -605,104 +1247,285 @@ def set_bot_commands(updater):
         ('get_uname', 'Информация о системе'),
         ('get_free', 'Информация о памяти'),
         ('get_mpstat', 'Информация о производительности системы'),
-        ('get_ps', 'Список процессов'),
+        ('get_ps', 'Процессы: /get_ps top=20 sort=mem user=postgres match=java, /get_ps diff'),
         ('get_w', 'Список пользователей'),
         ('get_auths', 'Последние 10 входов в систему'),
-        ('get_critical', 'Последние 5 критических событий'),
+        ('get_critical', 'Новые критические события'),
         ('get_ss', 'Информация об используемых портах'),
-        ('get_apt_list', 'Информация об установленных пакетах'),
+        ('get_apt_list', 'Установленные пакеты: /get_apt_list <имя>, /get_apt_list diff'),
         ('get_services', 'Запущенные сервисы'),
+        ('get_snapshot', 'Снимок состояния системы одним запросом'),
+        ('history', 'История метрик: /history free 6h'),
+        ('alerts', 'Правила и сработавшие оповещения'),
+        ('subscribe', 'Подписаться на оповещения 🔔'),
+        ('unsubscribe', 'Отписаться от оповещений'),
         ('get_repl_logs', 'Логи репликации PostgreSQL 📜'),
+        ('follow', 'Отслеживание журнала: /follow repl, /follow stop'),
+        ('get_log', 'Файл журнала сжатым документом: /get_log /var/log/syslog since=6h grep=error'),
         ('get_emails', 'Получить email-адреса из базы данных 📧'),
         ('get_phone_numbers', 'Получить номера телефонов из базы данных 📞'),
+        ('refresh', 'Сброс кэша результатов команд'),
+        ('db_stats', 'Статистика пула соединений с базой данных'),
+        ('bot_stats', 'Статистика пула обработчиков'),
+        ('stats', 'Задержки и ошибки по командам (для администраторов)'),
         ('disconnect_ssh', 'Разрыв SSH-соединения'),
     ])
 
 
 #---
-# Команда для получения логов репликации
+# Позиции чтения логов по хостам (сохраняются между перезапусками)
+log_cursors = CursorStore(LOG_CURSORS_FILE)
+
+# Новые строки журнала PostgreSQL о репликации после позиции state: (строки, новая позиция).
+# Без позиции читаются последние initial байт журнала.
+def read_repl_logs(host, state, initial=LOG_INITIAL_BYTES):
+    marker = snapshot.new_marker()
+    script = logtail.file_tail_script(PG_LOG_PATH, REPL_LOG_PATTERN, state, LOG_READ_LIMIT, marker, initial=initial)
+    output, error = host_exec(script, host, timeout=COMMAND_TIMEOUTS.get("get_repl_logs", COMMAND_TIMEOUT))
+    try:
+        return logtail.parse_file_tail(output, marker, LOG_READ_LIMIT)
+    except ValueError as e:
+        raise Exception(error.strip() or str(e))
+
+# Новые критические события журнала после курсора: (записи, новый курсор).
+# Без курсора читаются последние initial записей.
+def read_critical(host, cursor, initial=5):
+    output, error = host_exec(logtail.journal_command(3, cursor, initial, LOG_MAX_ENTRIES), host)
+    if error and not output:
+        raise Exception(error.strip())
+    entries, new_cursor = logtail.parse_journal(output)
+    return entries, new_cursor or cursor
+
+# Журналы, доступные для инкрементального чтения: имя → (функция чтения, заголовок, имя файла)
+LOG_READERS = {
+    "repl": (read_repl_logs, "Логи репликации", "replication_logs.txt"),
+    "critical": (read_critical, "Критические события", "critical.txt"),
+}
+
+# Инкрементальное чтение журнала: показываются только записи, появившиеся с прошлого вызова.
+# Аргумент reset сбрасывает сохранённую позицию и показывает последние записи.
+def run_log_command(update: Update, context: CallbackContext, kind):
+    read, title, filename = LOG_READERS[kind]
+    target, args = split_target(context.args)
+
+    def read_new(host):
+        state = None if "reset" in args else log_cursors.get(host.name, kind)
+        lines, state = read(host, state)
+        log_cursors.set(host.name, kind, state)
+        return "\n".join(lines) or "Новых записей нет."
+
+    run_on_targets(update, kind, target, read_new, f"{title} (новые записи)", filename)
+
+# Команда для получения логов репликации (только новые строки с прошлого вызова)
 def get_repl_logs(update: Update, context: CallbackContext):
     logging.info("Пользователь %s вызвал /get_repl_logs", update.effective_user.username)
-    
+    run_log_command(update, context, "repl")
+
+# Периодическая задача режима /follow: новые строки журнала отправляются в чат по мере появления.
+# У задачи собственные позиции чтения, не влияющие на /get_repl_logs и /get_critical.
+def follow_job(context: CallbackContext):
+    job = context.job.context
+    read, title, _ = LOG_READERS[job["kind"]]
+
+    def read_new(host):
+        primed = host.name in job["states"]
+        lines, state = read(host, job["states"].get(host.name), initial=0 if job["kind"] == "repl" else 1)
+        job["states"][host.name] = state
+        return lines if primed else []
+
+    for result in fan_out(fanout_executor, job["hosts"], read_new, FANOUT_TIMEOUT):
+        if result.error:
+            logging.warning("Ошибка /follow для %s: %s", result.host.name, result.error)
+            continue
+        text = "\n".join(result.output)
+        for start in range(0, len(text), 4000):
+            outbox.post(context.bot, job["chat_id"], f"📡 {result.host.name}:\n{text[start:start + 4000]}")
+
+# Команда /follow <repl|critical> [@хост] — отслеживание новых строк журнала, /follow stop — остановка
+def follow_logs(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /follow", update.effective_user.username)
+    chat_id = update.effective_chat.id
+    name = f"follow:{chat_id}"
+    target, args = split_target(context.args)
+    for job in context.job_queue.get_jobs_by_name(name):
+        job.schedule_removal()
+    if not args or args[0] == "stop":
+        update.message.reply_text("⏹ Отслеживание журналов остановлено." if args else
+                                  "Использование: /follow <repl|critical> [@хост], /follow stop")
+        return
+    if args[0] not in LOG_READERS:
+        update.message.reply_text("Использование: /follow <repl|critical> [@хост], /follow stop")
+        return
     try:
-        ssh = ssh_connect()
-        # Команда для чтения логов PostgreSQL и фильтрации строк, связанных с репликацией
-        command = "grep -i 'replication\\|wal\\|streaming' /var/log/postgresql/postgresql.log | tail -n 50"
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
-        ssh.close()
-
-        if error:
-            update.message.reply_text(f"Ошибка при получении логов: {error}")
-            return
-
-        if not output:
-            update.message.reply_text("Логи репликации не найдены или пусты.")
-            return
-
-        # Проверка длины вывода
-        if len(output) > 4000:
-            file = BytesIO()
-            file.write(output.encode())
-            file.seek(0)
-            update.message.reply_document(document=file, filename="replication_logs.txt")
-        else:
-            update.message.reply_text(f"Логи репликации (последние 50 строк):\n{output}")
-
-    except Exception as e:
-        logging.error("Ошибка при получении логов репликации: %s", str(e))
-        update.message.reply_text(f"Произошла ошибка: {str(e)}")
+        hosts = inventory.resolve(target) if target else [inventory.default]
+    except KeyError as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return
+    context.job_queue.run_repeating(
+        follow_job, interval=FOLLOW_INTERVAL, first=0, name=name,
+        context={"chat_id": chat_id, "kind": args[0], "hosts": hosts, "states": {}},
+    )
+    update.message.reply_text(f"▶️ Отслеживание журнала {args[0]} запущено, новые строки будут приходить в этот чат.")
+
+# Получение файла с хоста: чтение, фильтрация и сжатие выполняются на сервере, сжатый поток
+# порциями пишется во временный файл, не собираясь в памяти целиком
+def fetch_log(host, path, since=None, grep=None):
+    marker = snapshot.new_marker()
+    script = filefetch.fetch_script(path, LOG_ALLOWED_PATHS, marker, LOG_GET_MAX_BYTES,
+                                    since=since, grep=grep, compression=LOG_GET_COMPRESSION)
+    download = filefetch.Download(marker, LOG_GET_MAX_UPLOAD, OUTPUT_SPOOL_SIZE)
+    try:
+        stderr = host_backend(host).exec_stream(script, download.write,
+                                               timeout=COMMAND_TIMEOUTS.get("get_log", COMMAND_TIMEOUT))
+        download.check(stderr, marker)
+    except Exception:
+        download.close()
+        raise
+    return download
+
+# Команда /get_log <путь> [since=6h] [grep=шаблон] [@хост|@группа] — файл журнала сжатым документом.
+# Путь должен подходить под LOG_ALLOWED_PATHS; since добавляет ротированные копии, изменённые за период
+def get_log(update: Update, context: CallbackContext):
+    logging.info("Пользователь %s вызвал /get_log", update.effective_user.username)
+    usage = "Использование: /get_log <путь> [since=6h] [grep=шаблон] [@хост]"
+    target, args = split_target(context.args)
+    paths = [arg for arg in args if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in args if "=" in arg)
+    if len(paths) != 1 or set(options) - {"since", "grep"}:
+        update.message.reply_text(usage)
+        return
+    path = paths[0]
+    if not filefetch.path_allowed(path, LOG_ALLOWED_PATHS):
+        update.message.reply_text(f"⛔ Путь {path} не входит в разрешённые: {', '.join(LOG_ALLOWED_PATHS)}")
+        return
+    try:
+        since = collector.parse_period(options["since"]) if "since" in options else None
+        hosts = inventory.resolve(target) if target else [inventory.default]
+    except (KeyError, ValueError) as e:
+        update.message.reply_text(f"❌ {e.args[0]}")
+        return
+    filters = "".join(f", {name}={value}" for name, value in options.items())
+    for host in hosts:
+        try:
+            download = fetch_log(host, path, since, options.get("grep"))
+        except Exception as e:
+            logging.error("Ошибка /get_log %s на %s: %s", path, host.name, str(e))
+            update.message.reply_text(f"❌ {host.name}: {str(e)}")
+            continue
+        try:
+            size = download.original_size()
+            if size == 0:
+                update.message.reply_text(f"📭 {host.name}: {path} — нет данных{filters}.")
+                continue
+            note = "" if size is None else f"{size / 1024:.0f} КБ, "
+            if size is not None and size >= LOG_GET_MAX_BYTES:
+                note = f"последние {LOG_GET_MAX_BYTES / 1024 / 1024:.0f} МБ, "
+            download.file.seek(0)
+            update.message.reply_document(
+                document=download.file,
+                filename=f"{host.name}-{os.path.basename(path)}{download.extension}",
+                caption=f"{path} ({host.name}{filters}): {note}сжато до {download.size / 1024:.0f} КБ",
+            )
+        finally:
+            download.close()
 
 #---
 
 
-def main():
-    updater = Updater(TOKEN)
-    dispatcher = updater.dispatcher
-
-    # Настройка команд бота
-    set_bot_commands(updater)
-    
+# Регистрация обработчиков команд (используется и в main, и в бенчмарке bench/e2e_bench.py)
+def add_handlers(dispatcher):
     # Обработчик состояний
     conversation_handler = ConversationHandler(
         entry_points=[
-            CommandHandler('start', start), 
-            CommandHandler('find_email', handle_find_email),
-            CommandHandler('find_phone_number', handle_find_phone_number),
-            CommandHandler('verify_password', handle_verify_password)
+            CommandHandler('start', traced(start)), 
+            CommandHandler('find_email', traced(handle_find_email)),
+            CommandHandler('find_phone_number', traced(handle_find_phone_number)),
+            CommandHandler('verify_password', traced(handle_verify_password))
         ],
         states={
-	    FIND_EMAIL: [MessageHandler(Filters.text & ~Filters.command, find_email)],
-            FIND_PHONE: [MessageHandler(Filters.text & ~Filters.command, find_phone_number)],
-            VERIFY_PASSWORD: [MessageHandler(Filters.text & ~Filters.command, verify_password)],
-            SAVE_EMAIL: [MessageHandler(Filters.text & ~Filters.command, save_email)],
-            SAVE_PHONE: [MessageHandler(Filters.text & ~Filters.command, save_phone)],
+            FIND_EMAIL: [
+                MessageHandler(Filters.text & ~Filters.command, traced(find_email)),
+                MessageHandler(Filters.document, traced(find_email_document)),
+            ],
+            FIND_PHONE: [
+                MessageHandler(Filters.text & ~Filters.command, traced(find_phone_number)),
+                MessageHandler(Filters.document, traced(find_phone_document)),
+            ],
+            VERIFY_PASSWORD: [MessageHandler(Filters.text & ~Filters.command, traced(verify_password))],
+            SAVE_EMAIL: [MessageHandler(Filters.text & ~Filters.command, traced(save_email))],
+            SAVE_PHONE: [MessageHandler(Filters.text & ~Filters.command, traced(save_phone))],
         },
-        fallbacks=[CommandHandler('start', start)]
+        fallbacks=[CommandHandler('start', traced(start))]
     )
 
     # Добавляем обработчики
     dispatcher.add_handler(conversation_handler)
-    dispatcher.add_handler(CommandHandler("get_release", get_release))
-    dispatcher.add_handler(CommandHandler("get_uptime", get_uptime))
-    dispatcher.add_handler(CommandHandler("get_df", get_df))
-    dispatcher.add_handler(CommandHandler("get_uname", get_uname))
-    dispatcher.add_handler(CommandHandler("get_free", get_free))
-    dispatcher.add_handler(CommandHandler("get_mpstat", get_mpstat))
-    dispatcher.add_handler(CommandHandler("get_ps", get_ps))
-    dispatcher.add_handler(CommandHandler("get_w", get_w))
-    dispatcher.add_handler(CommandHandler("get_auths", get_auths))
-    dispatcher.add_handler(CommandHandler("get_critical", get_critical))
-    dispatcher.add_handler(CommandHandler("get_ss", get_ss))
-    dispatcher.add_handler(CommandHandler("get_apt_list", get_apt_list))
-    dispatcher.add_handler(CommandHandler("get_services", get_services))
-    dispatcher.add_handler(CommandHandler("get_repl_logs", get_repl_logs))
-    dispatcher.add_handler(CommandHandler("get_emails", get_emails))
-    dispatcher.add_handler(CommandHandler("get_phone_numbers", get_phone_numbers))
-    dispatcher.add_handler(CommandHandler("disconnect_ssh", disconnect_ssh))
-    updater.start_polling()
+    dispatcher.add_handler(CommandHandler("get_release", background(get_release)))
+    dispatcher.add_handler(CommandHandler("get_uptime", background(get_uptime)))
+    dispatcher.add_handler(CommandHandler("get_df", background(get_df)))
+    dispatcher.add_handler(CommandHandler("get_uname", background(get_uname)))
+    dispatcher.add_handler(CommandHandler("get_free", background(get_free)))
+    dispatcher.add_handler(CommandHandler("get_mpstat", background(get_mpstat)))
+    dispatcher.add_handler(CommandHandler("get_ps", background(get_ps)))
+    dispatcher.add_handler(CommandHandler("get_w", background(get_w)))
+    dispatcher.add_handler(CommandHandler("get_auths", background(get_auths)))
+    dispatcher.add_handler(CommandHandler("get_critical", background(get_critical)))
+    dispatcher.add_handler(CommandHandler("get_ss", background(get_ss)))
+    dispatcher.add_handler(CommandHandler("get_apt_list", background(get_apt_list)))
+    dispatcher.add_handler(CommandHandler("get_services", background(get_services)))
+    dispatcher.add_handler(CommandHandler("get_snapshot", background(get_snapshot)))
+    dispatcher.add_handler(CommandHandler("history", traced(get_history)))
+    dispatcher.add_handler(CommandHandler("alerts", traced(get_alerts)))
+    dispatcher.add_handler(CommandHandler("subscribe", traced(subscribe_alerts)))
+    dispatcher.add_handler(CommandHandler("unsubscribe", traced(unsubscribe_alerts)))
+    dispatcher.add_handler(CommandHandler("get_repl_logs", background(get_repl_logs)))
+    dispatcher.add_handler(CommandHandler("follow", traced(follow_logs)))
+    dispatcher.add_handler(CommandHandler("get_log", background(get_log)))
+    dispatcher.add_handler(CommandHandler("get_emails", background(get_emails)))
+    dispatcher.add_handler(CommandHandler("get_phone_numbers", background(get_phone_numbers)))
+    dispatcher.add_handler(CallbackQueryHandler(background(page_callback), pattern=r"^page:"))
+    dispatcher.add_handler(CallbackQueryHandler(background(save_callback), pattern=r"^save:"))
+    dispatcher.add_handler(CommandHandler("refresh", traced(refresh_cache)))
+    dispatcher.add_handler(CommandHandler("db_stats", traced(get_db_stats)))
+    dispatcher.add_handler(CommandHandler("bot_stats", traced(get_bot_stats)))
+    dispatcher.add_handler(CommandHandler("stats", traced(get_stats)))
+    dispatcher.add_handler(CommandHandler("disconnect_ssh", traced(disconnect_ssh)))
+
+def main():
+    start_scan_workers()
+    log_listener = start_logging()
+    outbox.start()
+    if METRICS_PORT:
+        instrumentation.start_http_server(METRICS_PORT, METRICS_HOST)
+    # Соединений с Telegram хватает на все воркеры, отправку сообщений, диспетчер, получение обновлений и очередь задач
+    bot = InstrumentedBot(TOKEN, request=Request(con_pool_size=HANDLER_WORKERS + OUTBOX_WORKERS + 4))
+    updater = serving.build_updater(bot, queue_size=UPDATE_QUEUE, nonblocking=bool(WEBHOOK_URL))
+
+    # Настройка команд бота
+    set_bot_commands(updater)
+    add_handlers(updater.dispatcher)
+
+    # Периодический сбор метрик и проверка оповещений
+    if COLLECT_INTERVAL > 0:
+        updater.job_queue.run_repeating(collect_metrics, interval=COLLECT_INTERVAL, first=5)
+    if COLLECT_AGENT:
+        agent_collector.start(host for host in inventory.hosts.values() if host.backend == "ssh")
+    if COLLECT_INTERVAL > 0 or COLLECT_AGENT:
+        updater.job_queue.run_repeating(flush_alerts, interval=5, first=10)
+
+    serving.start(
+        updater, url=WEBHOOK_URL, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+        cert=WEBHOOK_CERT, key=WEBHOOK_KEY, max_connections=WEBHOOK_MAX_CONNECTIONS, poll_timeout=POLL_TIMEOUT,
+    )
     updater.idle()
+    agent_collector.stop()
+    handler_pool.shutdown()
+    outbox.stop()
+    fanout_executor.shutdown(wait=False)
+    scan_executor.shutdown(wait=False)
+    ssh_pool.close()
+    db_pool.close()
+    log_listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+import shlex
+
+import parsers
+import snapshot
+
+
+# Команды для периодического сбора метрик: один составной скрипт на хост за один проход
+COLLECT_SECTIONS = [
+    ("uptime", "uptime", "Загрузка"),
+    ("free", "free -b", "Память"),
+    ("df", "df -P -B1", "Диски"),
+    ("mpstat", "mpstat 1 1", "Процессор"),
+]
+
+# Группы метрик для /history: имя группы → (заголовок, метрики или префиксы метрик, шкала графика)
+PERCENT = (0.0, 100.0)
+METRIC_GROUPS = {
+    "cpu": ("Процессор, %", ("cpu",), PERCENT),
+    "mpstat": ("Процессор, %", ("cpu",), PERCENT),
+    "load": ("Средняя загрузка", ("load1", "load5", "load15"), None),
+    "uptime": ("Средняя загрузка", ("load1", "load5", "load15"), None),
+    "mem": ("Память, %", ("mem", "swap"), PERCENT),
+    "free": ("Память, %", ("mem", "swap"), PERCENT),
+    "disk": ("Диски, %", ("disk:",), PERCENT),
+    "df": ("Диски, %", ("disk:",), PERCENT),
+}
+
+
+def _percent(part, total):
+    return part / total * 100 if total else 0.0
+
+
+# Метрики из разобранного вывода: cpu, load1/5/15, mem, swap и disk:<точка монтирования> (в процентах),
+# journal_errors — число новых записей журнала
+def extract_metrics(sections):
+    metrics = {}
+    if "uptime" in sections:
+        load = parsers.parse_uptime(sections["uptime"][0])
+        metrics.update(load1=load.load1, load5=load.load5, load15=load.load15)
+    if "free" in sections:
+        for record in parsers.parse_free(sections["free"][0]):
+            if record.kind == "Mem":
+                metrics["mem"] = _percent(record.total - (record.available if record.available is not None else record.free), record.total)
+            elif record.kind == "Swap":
+                metrics["swap"] = _percent(record.used, record.total)
+    if "df" in sections:
+        for record in parsers.parse_df(sections["df"][0]):
+            if record.filesystem.startswith("/dev/"):
+                metrics[f"disk:{record.mount}"] = record.use_percent
+    if "journal" in sections:
+        count = sections["journal"][0].split("\n", 1)[0].strip()
+        if count.isdigit():
+            metrics["journal_errors"] = float(count)
+    if "mpstat" in sections:
+        for record in parsers.parse_mpstat(sections["mpstat"][0]):
+            if record.cpu == "all":
+                metrics["cpu"] = 100.0 - record.idle
+    return metrics
+
+
+# Раздел сбора с числом записей журнала с приоритетом err и выше после курсора journalctl
+# (первая строка) и курсором последней из них (вторая строка). Записи считаются на сервере,
+# в формате json каждая запись — одна строка. Без курсора считать нечего: запоминается
+# курсор последней записи журнала, а вместо числа выводится "-".
+# root — корень файловой системы хоста, если журнал читается с машины бота (journalctl --root)
+def journal_section(cursor, root="/"):
+    command = "journalctl" if root == "/" else f"journalctl --root={shlex.quote(root)}"
+    if cursor:
+        command += f" -p 3 -q --no-pager -o json --show-cursor --after-cursor={shlex.quote(cursor)}"
+    else:
+        command += " -q --no-pager -o json --show-cursor -n 1"
+    count = "n + 0" if cursor else '"-"'
+    return (
+        "journal",
+        f"{command} | awk '/^-- cursor: / {{ c = substr($0, 12); next }} {{ n++ }} END {{ print {count}; print c }}'",
+        "Журнал",
+    )
+
+
+# Снимает одну выборку метрик; execute(script) выполняет скрипт на хосте и возвращает stdout.
+# Дополнительно считаются новые записи журнала с приоритетом err и выше после journal_cursor
+# (метрика journal_errors, см. journal_section).
+# sections — разделы сбора; для хостов с агентом (agent.py) остаётся только журнал.
+# Возвращает (метрики, новый курсор журнала или None, если его не удалось получить)
+def collect_sample(execute, journal_cursor=None, sections=COLLECT_SECTIONS, root="/"):
+    sections = list(sections) + [journal_section(journal_cursor, root)]
+    marker = snapshot.new_marker()
+    output = execute(snapshot.build_script(sections, marker))
+    sections = {
+        name: section for name, section in snapshot.parse_output(output, marker).items() if section[1] == 0
+    }
+    cursor = None
+    if "journal" in sections:
+        cursor = (sections["journal"][0].split("\n") + [""])[1].strip() or None
+    return extract_metrics(sections), cursor
+
+
+# Разбор периода вида 30m, 6h, 2d (в секундах)
+def parse_period(value):
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value) * 3600
+
+
+# Метрики группы в порядке перечисления: точное имя метрики или префикс вида "disk:"
+def group_metrics(metrics, names):
+    ordered = []
+    for name in names:
+        if name.endswith(":"):
+            ordered.extend(sorted(metric for metric in metrics if metric.startswith(name)))
+        elif name in metrics:
+            ordered.append(name)
+    return ordered
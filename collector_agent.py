@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Агент сбора метрик, который бот загружает на хост по SFTP и запускает через SSH (см. agent.py).
+# Читает /proc и statvfs напрямую, без запуска процессов, и раз в interval секунд печатает
+# строку JSON с метриками под теми же именами, что и collector.extract_metrics:
+# cpu, load1, load5, load15, mem, swap (проценты) и disk:<точка монтирования> (процент занятого места).
+# Только стандартная библиотека и синтаксис Python 3.5, чтобы запускаться на старых серверах.
+# Завершается, когда бот закрывает канал (запись в закрытый stdout).
+# Функции чтения используются и ботом напрямую для хостов с backend "proc" (см. backends.py):
+# proc и root позволяют читать /proc и файловые системы хоста, смонтированные в контейнер.
+import json
+import os
+import sys
+import time
+
+
+def read_cpu(proc="/proc"):
+    with open(os.path.join(proc, "stat")) as f:
+        fields = [int(value) for value in f.readline().split()[1:]]
+    # Простой — только idle, как %idle в mpstat: iowait считается занятостью, как в collector.extract_metrics,
+    # чтобы метрика cpu не зависела от способа сбора (guest не учитывается, он уже входит в user)
+    return sum(fields[:8]), fields[3]
+
+
+def read_meminfo(proc="/proc"):
+    values = {}
+    with open(os.path.join(proc, "meminfo")) as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            values[name] = int(rest.split()[0])
+    return values
+
+
+# Точки монтирования хоста: (устройство, точка монтирования, тип). Вне корня ("/host")
+# /proc/mounts показывал бы монтирования читающего процесса, поэтому берутся монтирования init
+def read_mounts(proc="/proc", root="/"):
+    mounts = []
+    with open(os.path.join(proc, "mounts" if root == "/" else "1/mounts")) as f:
+        for line in f:
+            device, mount, kind = line.split()[:3]
+            mounts.append((device, mount.replace("\\040", " "), kind))
+    return mounts
+
+
+def read_disks(proc="/proc", root="/"):
+    disks = {}
+    seen = set()
+    for device, mount, _ in read_mounts(proc, root):
+        if not device.startswith("/dev/") or device in seen:
+            continue
+        seen.add(device)
+        try:
+            stat = os.statvfs(os.path.join(root, mount.lstrip("/")))
+        except OSError:
+            continue
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        avail = stat.f_bavail * stat.f_frsize
+        if used + avail:
+            # Как Use% в df: доля от места, доступного непривилегированным пользователям
+            disks["disk:" + mount] = round(used * 100.0 / (used + avail), 1)
+    return disks
+
+
+def sample(previous_cpu, proc="/proc", root="/"):
+    metrics = {}
+    total, idle = read_cpu(proc)
+    if previous_cpu is not None and total > previous_cpu[0]:
+        metrics["cpu"] = round(100.0 - (idle - previous_cpu[1]) * 100.0 / (total - previous_cpu[0]), 1)
+    with open(os.path.join(proc, "loadavg")) as f:
+        load = f.read().split()
+    metrics["load1"], metrics["load5"], metrics["load15"] = (float(value) for value in load[:3])
+    memory = read_meminfo(proc)
+    if memory.get("MemTotal"):
+        available = memory.get("MemAvailable", memory.get("MemFree", 0))
+        metrics["mem"] = round((memory["MemTotal"] - available) * 100.0 / memory["MemTotal"], 1)
+    swap_total = memory.get("SwapTotal", 0)
+    metrics["swap"] = round((swap_total - memory.get("SwapFree", 0)) * 100.0 / swap_total, 1) if swap_total else 0.0
+    metrics.update(read_disks(proc, root))
+    return metrics, (total, idle)
+
+
+def main():
+    interval = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    cpu = read_cpu()
+    while True:
+        time.sleep(interval)
+        metrics, cpu = sample(cpu)
+        try:
+            sys.stdout.write(json.dumps(metrics, separators=(",", ":")) + "\n")
+            sys.stdout.flush()
+        except (BrokenPipeError, OSError):
+            return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import Error
+
+import instrumentation
+
+
+REQUIRED_TABLES = ("emails", "phone_numbers")
+
+
+# Пул соединений с PostgreSQL. Число соединений ограничено семафором: новое соединение открывается
+# только после захвата места и без удержания блокировок, поэтому медленное подключение к базе
+# не задерживает запросы, которым досталось простаивающее соединение. Простаивающими остаются
+# до minconn соединений, остальные закрываются при возврате. Схема проверяется один раз,
+# соединения проверяются при выдаче из пула, если простаивали дольше health_check_interval секунд.
+class DatabasePool:
+    def __init__(self, minconn=1, maxconn=5, wait_timeout=10, health_check_interval=30, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.wait_timeout = wait_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+        self._idle = []
+        self._connections = set()
+        self._schema_checked = False
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._checkout_total = 0.0
+        self._checkout_max = 0.0
+        self._broken = 0
+
+    def _connect(self):
+        connection = psycopg2.connect(**self.connect_kwargs)
+        with self._lock:
+            self._connections.add(connection)
+        logging.debug("Установлено соединение с базой данных %s", self.connect_kwargs.get("database"))
+        return connection
+
+    # Проверка существования таблиц — одним запросом и только один раз
+    def _validate_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_name FROM information_schema.tables WHERE table_name IN %s",
+                (REQUIRED_TABLES,)
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+        connection.rollback()
+        missing = [table for table in REQUIRED_TABLES if table not in existing]
+        if missing:
+            raise Exception(f"Таблицы не существуют: {', '.join(missing)}")
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        last_used = self._last_used.get(id(connection), 0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Error:
+            return False
+
+    # Простаивающее соединение или новое (вызывается после захвата места в семафоре)
+    def _checkout(self):
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._connect()
+            if self._is_healthy(connection):
+                return connection
+            logging.warning("Соединение с базой данных неработоспособно, переподключение")
+            with self._stats_lock:
+                self._broken += 1
+            self._putconn(connection, close=True)
+
+    def _putconn(self, connection, close=False):
+        with self._lock:
+            keep = not close and not connection.closed and connection in self._connections \
+                and len(self._idle) < self.minconn
+            if keep:
+                self._idle.append(connection)
+            else:
+                self._connections.discard(connection)
+                self._last_used.pop(id(connection), None)
+        if not keep and not connection.closed:
+            connection.close()
+
+    # Выдаёт соединение из пула; при ошибке внутри блока транзакция откатывается
+    @contextmanager
+    def connection(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            instrumentation.observe("db_checkout", time.monotonic() - started, error=True)
+            raise Exception("Превышено время ожидания свободного соединения с базой данных")
+        waited = time.monotonic() - started
+        try:
+            connection = self._checkout()
+        except Exception:
+            self._slots.release()
+            instrumentation.observe("db_checkout", time.monotonic() - started, error=True)
+            raise
+        latency = time.monotonic() - started
+        instrumentation.observe("db_checkout", latency)
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._checkout_total += latency
+            self._checkout_max = max(self._checkout_max, latency)
+        try:
+            # Проверка схемы на первом выданном соединении; при одновременном первом обращении
+            # из нескольких потоков она может выполниться несколько раз, это безвредно
+            if not self._schema_checked:
+                self._validate_schema(connection)
+                self._schema_checked = True
+            yield connection
+            if not connection.closed:
+                connection.commit()
+        except Exception:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        finally:
+            self._last_used[id(connection)] = time.monotonic()
+            self._putconn(connection)
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._stats_lock:
+            checkouts = self._checkouts or 1
+            return {
+                "size": self.maxconn,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "broken": self._broken,
+                "wait_avg_ms": self._wait_total / checkouts * 1000,
+                "wait_max_ms": self._wait_max * 1000,
+                "checkout_avg_ms": self._checkout_total / checkouts * 1000,
+                "checkout_max_ms": self._checkout_max * 1000,
+            }
+
+    # Закрывает все соединения; выданные сейчас закрываются и при возврате в пул не сохраняются
+    def close(self):
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            self._idle.clear()
+            self._last_used.clear()
+        for connection in connections:
+            if not connection.closed:
+                connection.close()
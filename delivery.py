@@ -0,0 +1,120 @@
+import gzip
+import io
+import tempfile
+
+
+# Ограничение Telegram на длину сообщения
+TELEGRAM_LIMIT = 4096
+
+
+# Разбиение текста на части не длиннее limit символов по границам строк;
+# строка длиннее limit разрезается
+def split_message(text, limit):
+    parts = []
+    current = []
+    length = 0
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append("\n".join(current))
+                current, length = [], 0
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current and length + 1 + len(line) > limit:
+            parts.append("\n".join(current))
+            current, length = [], 0
+        length += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+# Приёмник вывода: первые байты держатся в памяти, а как только их становится больше, чем помещается
+# в max_messages сообщений, весь вывод пишется потоком через gzip во временный файл
+# (в памяти до spool_size байт сжатых данных)
+class OutputBuffer:
+    def __init__(self, max_messages, limit, spool_size):
+        # Символ UTF-8 занимает не больше 4 байт: пока байтов меньше, текст может поместиться в сообщения
+        self.head_limit = max_messages * limit * 4
+        self.spool_size = spool_size
+        self.size = 0
+        self._head = bytearray()
+        self._file = None
+        self._gzip = None
+
+    @property
+    def compressed(self):
+        return self._gzip is not None
+
+    def write(self, data):
+        self.size += len(data)
+        if self._gzip is not None:
+            self._gzip.write(data)
+            return
+        self._head += data
+        if len(self._head) > self.head_limit:
+            self._compress()
+
+    def _compress(self):
+        self._file = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=6)
+        self._gzip.write(bytes(self._head))
+        self._head = None
+
+    def text(self):
+        return self._head.decode(errors="replace")
+
+    # Сжатый файл, готовый к отправке (перемотан в начало)
+    def gzip_file(self):
+        if self._gzip is None:
+            self._compress()
+        self._gzip.close()
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+# Отправка вывода, уже записанного в OutputBuffer: до max_messages сообщений с разбиением
+# по строкам, иначе — сжатым файлом filename.gz. send(text), если задан, отправляет части
+# вместо message.reply_text (например, через очередь без ожидания)
+def deliver(message, title, buffer, filename, limit, max_messages, send=None):
+    try:
+        if not buffer.compressed:
+            parts = split_message(f"{title}:\n{buffer.text().rstrip()}", limit)
+            if len(parts) <= max_messages:
+                for part in parts:
+                    (send or message.reply_text)(part)
+                return
+        size = buffer.size
+        file = buffer.gzip_file()
+        file.seek(0, 2)
+        compressed = file.tell()
+        file.seek(0)
+        message.reply_document(
+            document=file, filename=f"{filename}.gz",
+            caption=f"{title} ({size / 1024:.0f} КБ, сжато до {compressed / 1024:.0f} КБ)",
+        )
+    finally:
+        buffer.close()
+
+
+# Отправка готовой строки тем же способом
+def deliver_text(message, title, output, filename, limit, max_messages, spool_size, send=None):
+    buffer = OutputBuffer(max_messages, limit, spool_size)
+    buffer.write(output.encode())
+    deliver(message, title, buffer, filename, limit, max_messages, send)
+
+
+# Отправка готовой строки документом filename; текст больше spool_size байт — сжатым файлом filename.gz
+def deliver_file(message, title, output, filename, spool_size):
+    data = output.encode()
+    if len(data) > spool_size:
+        buffer = OutputBuffer(0, TELEGRAM_LIMIT, spool_size)
+        buffer.write(data)
+        deliver(message, title, buffer, filename, TELEGRAM_LIMIT, 0)
+        return
+    message.reply_document(document=io.BytesIO(data), filename=filename, caption=f"{title} ({len(data) / 1024:.0f} КБ)")
@@ -0,0 +1,91 @@
+import re
+from functools import lru_cache
+
+
+# Извлечение email-адресов и номеров телефонов из текста с нормализацией:
+# email — в нижнем регистре, домен в IDNA (punycode), телефоны — в формате E.164.
+# Шаблоны скомпилированы один раз и не содержат вложенных неограниченных повторов:
+# совпадение может начинаться только в начале «слова» (lookbehind), а длины частей ограничены,
+# поэтому время поиска линейно по длине текста даже на длинных строках без совпадений.
+
+# Код страны для номеров без «+» (7XXXXXXXXXX, 8XXXXXXXXXX и десятизначных)
+DEFAULT_COUNTRY_CODE = "7"
+
+EMAIL_RE = re.compile(
+    r"(?<![\w.%+-])"
+    r"[a-zA-Z0-9._%+-]{1,64}"
+    r"@"
+    r"(?:[\w-]{1,63}\.){1,8}"
+    r"[^\W\d_]{2,63}"
+)
+
+PHONE_RE = re.compile(
+    r"(?<![\w+])"
+    r"(?:\+\d{1,3}[\s-]?|[78][\s-]?)?"
+    r"(?:\(\d{3}\)|\d{3})[\s-]?"
+    r"\d{3}[\s-]?\d{2}[\s-]?\d{2}"
+    r"(?!\d)"
+)
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+# Домен в IDNA; кодек idna медленный, а домены в выгрузках повторяются, поэтому результат кэшируется
+@lru_cache(maxsize=4096)
+def _idna(domain):
+    try:
+        return domain.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+
+
+# Email в нижнем регистре с доменом в IDNA; None, если домен недопустим
+def normalize_email(value):
+    value = value.lower()
+    if value.isascii():
+        return value
+    local, _, domain = value.rpartition("@")
+    domain = _idna(domain)
+    if domain is None:
+        return None
+    return f"{local}@{domain}"
+
+
+# Номер телефона в формате E.164 (+79991234567); None, если цифр слишком мало или много
+def normalize_phone(value):
+    digits = _NON_DIGITS.sub("", value)
+    if value.startswith("+"):
+        number = digits
+    elif len(digits) == 11 and digits[0] in "78":
+        number = DEFAULT_COUNTRY_CODE + digits[1:]
+    elif len(digits) == 10:
+        number = DEFAULT_COUNTRY_CODE + digits
+    else:
+        number = digits
+    if not 8 <= len(number) <= 15:
+        return None
+    return "+" + number
+
+
+# Тип данных → (шаблон, нормализация)
+EXTRACTORS = {
+    "email": (EMAIL_RE, normalize_email),
+    "phone": (PHONE_RE, normalize_phone),
+}
+
+
+# Уникальные нормализованные значения в порядке появления за один проход по тексту.
+# Если заданы begin и end, учитываются только совпадения, начинающиеся в [begin, end)
+def extract(kind, text, begin=0, end=None):
+    pattern, normalize = EXTRACTORS[kind]
+    found = {}
+    for match in pattern.finditer(text):
+        start = match.start()
+        if end is not None and start >= end:
+            break
+        if start < begin:
+            continue
+        value = normalize(match.group())
+        if value is not None:
+            found[value] = None
+    return list(found)
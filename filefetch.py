@@ -0,0 +1,137 @@
+import fnmatch
+import posixpath
+import re
+import shlex
+import struct
+import tempfile
+
+
+# Получение файлов журналов с хоста для /get_log: файл читается, фильтруется и сжимается на сервере,
+# в канал SSH идёт только сжатый поток, который порциями пишется во временный файл для отправки документом
+
+# Сжатие на сервере: имя → (команда, расширение файла)
+COMPRESSORS = {
+    "gzip": ("gzip -c", ".gz"),
+    "zstd": ("zstd -c -q", ".zst"),
+}
+
+# Ошибки скрипта (строка "<marker> <код>" в stderr)
+ERRORS = {
+    "missing": "файл не найден",
+    "denied": "путь не входит в разрешённые (LOG_ALLOWED_PATHS)",
+    "unreadable": "нет прав на чтение файла",
+}
+
+
+class FetchError(Exception):
+    pass
+
+
+# Сжатый файл больше допустимого для отправки
+class TooLarge(FetchError):
+    pass
+
+
+# Путь абсолютный, без "..", "." и повторных "/" и подходит под один из шаблонов (fnmatch, "*" включает "/")
+def path_allowed(path, patterns):
+    return (
+        posixpath.isabs(path) and posixpath.normpath(path) == path and not path.startswith("//")
+        and any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns)
+    )
+
+
+# Шаблон для case оболочки: символы подстановки остаются как есть, остальное экранируется
+def _case_pattern(pattern):
+    parts = re.split(r"(\*|\?|\[!?[\w.\-]+\])", pattern)
+    return "".join(part if re.fullmatch(r"\*|\?|\[!?[\w.\-]+\]", part) else shlex.quote(part) for part in parts if part)
+
+
+# Скрипт получения файла: путь раскрывается на сервере (readlink -f) и повторно проверяется по шаблонам,
+# чтобы символическая ссылка не вывела за разрешённые каталоги. С since (в секундах) читаются
+# текущий файл и его ротированные копии (name.1, name.2.gz, name-20240101), изменённые за этот период,
+# от старых к новым; .gz распаковываются. grep — регулярное выражение (grep -E, без учёта регистра).
+# Передаются последние limit байт результата, сжатые compression (zstd, если есть на хосте, иначе gzip).
+# Первая строка вывода — "<marker> <сжатие>", дальше — сжатые данные.
+def fetch_script(path, patterns, marker, limit, since=None, grep=None, compression="gzip"):
+    allowed = "|".join(_case_pattern(pattern) for pattern in patterns)
+    if since:
+        listing = (
+            "d=$(dirname -- \"$r\"); b=$(basename -- \"$r\"); "
+            "find \"$d\" -maxdepth 1 -type f \\( -name \"$b\" -o -name \"$b.[0-9]*\" -o -name \"$b-[0-9]*\" \\) "
+            f"-mmin -{max(1, int(-(-since // 60)))} -printf '%T@ %p\\n' | sort -n | cut -d' ' -f2-"
+        )
+    else:
+        listing = "printf '%s\\n' \"$r\""
+    compress = f"c={shlex.quote(COMPRESSORS['gzip'][0])}; e=gzip; "
+    if compression == "zstd":
+        compress += f"if command -v zstd >/dev/null 2>&1; then c={shlex.quote(COMPRESSORS['zstd'][0])}; e=zstd; fi; "
+    return (
+        f"f={shlex.quote(path)}; "
+        f"fail() {{ echo \"{marker} $1\" >&2; exit 1; }}; "
+        f"allowed() {{ case \"$1\" in {allowed}) return 0;; esac; return 1; }}; "
+        "r=$(readlink -f -- \"$f\") && [ -f \"$r\" ] || fail missing; "
+        "allowed \"$r\" || fail denied; "
+        "[ -r \"$r\" ] || fail unreadable; "
+        + compress +
+        f"echo \"{marker} $e\"; "
+        f"{{ {listing}; }} | while IFS= read -r x; do "
+        "allowed \"$x\" && [ -r \"$x\" ] || continue; "
+        "case \"$x\" in *.gz) gzip -dc -- \"$x\";; *) cat -- \"$x\";; esac; done | "
+        + (f"LC_ALL=C grep -a -i -E -e {shlex.quote(grep)} | " if grep else "")
+        + f"tail -c {int(limit)} | $c"
+    )
+
+
+# Приёмник вывода fetch_script для SSHSession.exec_stream: заголовок разбирается, сжатые данные
+# пишутся во временный файл (в памяти до spool_size байт); при превышении max_size — TooLarge
+class Download:
+    def __init__(self, marker, max_size, spool_size):
+        self.marker = marker.encode()
+        self.max_size = max_size
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self.compression = None
+        self.size = 0
+        self._header = b""
+        self._tail = b""
+
+    def write(self, data):
+        if self.compression is None:
+            self._header += data
+            line, newline, data = self._header.partition(b"\n")
+            if not newline:
+                if len(self._header) > 256:
+                    raise FetchError("некорректный ответ сервера")
+                return
+            name = line[len(self.marker):].strip().decode(errors="replace")
+            if not line.startswith(self.marker) or name not in COMPRESSORS:
+                raise FetchError("некорректный ответ сервера")
+            self.compression = name
+            self._header = None
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise TooLarge(f"сжатый файл больше {self.max_size / 1024 / 1024:.0f} МБ, уточните grep= или since=")
+        self._tail = (self._tail + data)[-4:]
+        self.file.write(data)
+
+    @property
+    def extension(self):
+        return COMPRESSORS[self.compression][1]
+
+    # Размер несжатых данных из конца потока gzip (ISIZE, по модулю 2^32); для zstd неизвестен
+    def original_size(self):
+        if self.compression == "gzip" and len(self._tail) == 4:
+            return struct.unpack("<I", self._tail)[0]
+        return None
+
+    # Проверка stderr скрипта; без заголовка в выводе — ошибка
+    def check(self, stderr, marker):
+        text = stderr.decode(errors="replace")
+        for line in text.splitlines():
+            if line.startswith(marker):
+                code = line[len(marker):].strip()
+                raise FetchError(ERRORS.get(code, code))
+        if self.compression is None:
+            raise FetchError(text.strip() or "не удалось прочитать файл")
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,159 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Границы корзин гистограмм задержек в секундах
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+# Гистограмма задержек с фиксированными корзинами: память не растёт с числом измерений,
+# квантили оцениваются линейной интерполяцией внутри корзины
+class Histogram:
+    __slots__ = ("counts", "total", "count", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[index - 1] if index else 0.0
+                high = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+
+# Набор гистограмм по имени операции и меткам (команда, хост и т. п.)
+class Registry:
+    def __init__(self):
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds, error=False, **labels):
+        with self._lock:
+            histogram = self._get(name, labels)
+            histogram.observe(seconds)
+            if error:
+                histogram.errors += 1
+
+    # Замер длительности блока; исключение считается ошибкой и пробрасывается дальше
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, error=error, **labels)
+
+    # Текущее значение, которое считывается при выдаче метрик: callback() → число
+    def gauge(self, name, callback):
+        with self._lock:
+            self._gauges[name] = callback
+
+    # [(имя, метки, число измерений, ошибок, сумма, p50, p95, p99)] — время в секундах
+    def snapshot(self):
+        with self._lock:
+            items = sorted(self._histograms.items())
+            return [
+                (name, dict(labels), h.count, h.errors, h.total, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                for (name, labels), h in items
+            ]
+
+    # Текстовый формат Prometheus
+    def render_prometheus(self, prefix="bot"):
+        lines = []
+        with self._lock:
+            gauges = sorted(self._gauges.items())
+        # Значения считываются вне блокировки реестра: источник может сам записывать измерения
+        for name, callback in gauges:
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {callback()}")
+        with self._lock:
+            items = sorted(self._histograms.items())
+            names = sorted({name for name, _ in self._histograms})
+            for name in names:
+                lines.append(f"# TYPE {prefix}_{name}_seconds histogram")
+                for (metric, labels), histogram in items:
+                    if metric != name:
+                        continue
+                    base = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        bucket = _join(base, f'le="{bound}"')
+                        lines.append(f"{prefix}_{name}_seconds_bucket{{{bucket}}} {cumulative}")
+                    lines.append(f"{prefix}_{name}_seconds_sum{{{base}}} {histogram.total:.6f}")
+                    lines.append(f"{prefix}_{name}_seconds_count{{{base}}} {histogram.count}")
+                lines.append(f"# TYPE {prefix}_{name}_errors_total counter")
+                for (metric, labels), histogram in items:
+                    if metric == name:
+                        base = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+                        lines.append(f"{prefix}_{name}_errors_total{{{base}}} {histogram.errors}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _join(*parts):
+    return ",".join(part for part in parts if part)
+
+
+# Общий реестр бота
+registry = Registry()
+timer = registry.timer
+observe = registry.observe
+
+
+# HTTP-сервер с метриками в формате Prometheus (GET /metrics) в фоновом потоке
+def start_http_server(port, host="127.0.0.1", source=registry):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = source.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info("Метрики Prometheus доступны на http://%s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import wait
+
+
+# Хост из инвентаря: имя, адрес и учётные данные для SSH; backend — способ выполнения команд
+# ("ssh", "local" или "proc", см. backends.py), root — корень файловой системы хоста на машине бота
+Host = namedtuple("Host", "name host port user password backend root", defaults=("ssh", "/"))
+
+# Результат выполнения команды на одном хосте
+HostResult = namedtuple("HostResult", "host output error latency")
+
+
+# Инвентарь хостов и групп.
+# Формат файла (JSON):
+# {
+#     "hosts": {
+#         "db-1": {"host": "10.0.0.1", "port": 22, "user": "...", "password": "..."},
+#         "self": {"backend": "proc", "root": "/host"}
+#     },
+#     "groups": {"db-cluster": ["db-1", "db-2"]},
+#     "default": "db-1"
+# }
+# Незаданные порт и учётные данные берутся из .env (RM_PORT, RM_USER, RM_PASSWORD).
+class Inventory:
+    def __init__(self, hosts, groups, default):
+        self.hosts = hosts
+        self.groups = groups
+        self.default = default
+
+    # Хост по умолчанию (для команд без @цели): поле default файла, иначе RM_HOST, иначе
+    # для backend local/proc без RM_HOST — "localhost", иначе единственный хост файла.
+    # RM_HOST, уже описанный в файле (по имени или по адресу и порту), второй раз не добавляется
+    @classmethod
+    def load(cls, path, default_host, port, user, password, backend="ssh", root="/"):
+        hosts = {}
+        groups = {}
+        data = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for name, spec in data.get("hosts", {}).items():
+                hosts[name] = Host(
+                    name,
+                    spec.get("host", name),
+                    int(spec.get("port", port)),
+                    spec.get("user", user),
+                    spec.get("password", password),
+                    spec.get("backend", "ssh"),
+                    spec.get("root", "/"),
+                )
+        if not default_host and backend != "ssh":
+            default_host = "localhost"
+        if default_host:
+            existing = next((
+                host for host in hosts.values()
+                if host.name == default_host or (host.host == default_host and host.port == int(port))
+            ), None)
+            if existing is None:
+                hosts = {default_host: Host(default_host, default_host, int(port), user, password, backend, root), **hosts}
+            else:
+                default_host = existing.name
+        default = data.get("default") or default_host or (next(iter(hosts)) if len(hosts) == 1 else None)
+        if default not in hosts:
+            raise ValueError(
+                f"Хост по умолчанию {default} не найден в инвентаре" if default else
+                "Не задан хост по умолчанию: укажите RM_HOST в .env или поле default в файле инвентаря"
+            )
+        for group, members in data.get("groups", {}).items():
+            unknown = [member for member in members if member not in hosts]
+            if unknown:
+                raise ValueError(f"Группа {group} ссылается на неизвестные хосты: {', '.join(unknown)}")
+            groups[group] = [hosts[member] for member in members]
+        if data:
+            logging.info("Загружен инвентарь %s: %d хостов, %d групп", path, len(hosts), len(groups))
+        return cls(hosts, groups, hosts[default])
+
+    # Список хостов по имени группы или хоста; "all" — все хосты инвентаря
+    def resolve(self, target):
+        target = target.lstrip("@")
+        if target == "all":
+            return list(self.hosts.values())
+        if target in self.groups:
+            return list(self.groups[target])
+        if target in self.hosts:
+            return [self.hosts[target]]
+        raise KeyError(f"Неизвестный хост или группа: {target}")
+
+
+def _timed(func, host):
+    started = time.monotonic()
+    try:
+        output = func(host)
+        return HostResult(host, output, None, time.monotonic() - started)
+    except Exception as e:
+        logging.error("Ошибка при выполнении команды на %s: %s", host.name, str(e))
+        return HostResult(host, None, str(e), time.monotonic() - started)
+
+
+# Выполняет func(host) на всех хостах параллельно в пуле executor.
+# Хосты, не ответившие за timeout секунд, помечаются как упавшие по таймауту
+# и не задерживают результаты остальных.
+def fan_out(executor, hosts, func, timeout):
+    futures = {executor.submit(_timed, func, host): host for host in hosts}
+    done, _ = wait(futures, timeout=timeout)
+    results = []
+    for future, host in futures.items():
+        if future in done:
+            results.append(future.result())
+        else:
+            future.cancel()
+            results.append(HostResult(host, None, f"нет ответа за {timeout} с", timeout))
+    return results
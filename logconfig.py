@@ -0,0 +1,120 @@
+import gzip
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Логирование без блокировки обработчиков: записи кладутся в очередь (QueueHandler),
+# а форматирование, запись на диск, ротация и сжатие старых файлов выполняются
+# в отдельном потоке QueueListener.
+
+_request = threading.local()
+_request_ids = itertools.count(1)
+
+
+# Добавляет к записи идентификатор и имя текущего запроса (см. request) в потоке, где запись создана
+class RequestFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = getattr(_request, "id", None)
+        record.request_name = getattr(_request, "name", None)
+        return True
+
+
+# Контекст обработки одного запроса: все записи внутри получают request_id,
+# по завершении пишется запись с длительностью (duration_ms) и результатом
+@contextmanager
+def request(name, user=None):
+    previous = getattr(_request, "id", None), getattr(_request, "name", None)
+    _request.id = f"{next(_request_ids):x}"
+    _request.name = name
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield _request.id
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        duration = (time.perf_counter() - started) * 1000
+        logging.getLogger("requests").info(
+            "Запрос %s от %s завершён (%s) за %.1f мс", name, user, status, duration,
+            extra={"duration_ms": round(duration, 1), "status": status, "user": user},
+        )
+        _request.id, _request.name = previous
+
+
+# Одна JSON-строка на запись
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in ("request_id", "request_name", "duration_ms", "status", "user"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, "request_id", None):
+            text = f"[{record.request_id}] {text}"
+        return text
+
+
+# Ротированные файлы сжимаются gzip (в потоке записи логов)
+def _compress_rotated(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(path, max_bytes, when, backups, compress):
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding="utf-8")
+    elif max_bytes:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    else:
+        return logging.FileHandler(path, encoding="utf-8")
+    if compress:
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _compress_rotated
+    return handler
+
+
+# Настройка корневого логгера; возвращает запущенный QueueListener, который нужно остановить
+# при завершении (stop() дописывает оставшиеся в очереди записи).
+# max_bytes — ротация по размеру, when — по времени (как в TimedRotatingFileHandler: "midnight", "H"...),
+# json_format — одна JSON-строка на запись
+def setup(path, level="INFO", max_bytes=0, when=None, backups=7, compress=True, json_format=False):
+    handler = _file_handler(path, max_bytes, when, backups, compress)
+    if json_format:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s:%(name)s:%(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,96 @@
+import json
+import os
+import shlex
+import threading
+
+
+# Позиции чтения логов, сохраняемые между перезапусками бота в JSON-файле:
+# {"<хост>": {"repl": {"inode": ..., "offset": ...}, "critical": "<курсор journalctl>"}}
+class CursorStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cursors = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._cursors = json.load(f)
+
+    def get(self, host, name):
+        with self._lock:
+            return self._cursors.get(host, {}).get(name)
+
+    def set(self, host, name, value):
+        with self._lock:
+            self._cursors.setdefault(host, {})[name] = value
+            if self.path:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self._cursors, f)
+
+
+# Скрипт для чтения файла с позиции state = {"inode", "offset"} не более limit байт.
+# Если файл ротирован (сменился inode) или усечён, чтение начинается сначала.
+# На сервере печатаются только строки, подходящие под pattern (регулярное выражение awk,
+# сравнивается с строкой в нижнем регистре; передаётся через окружение, а не подставляется
+# в текст программы), и только целые строки: неполная последняя строка
+# не считается прочитанной и будет прочитана в следующий раз.
+# Без сохранённой позиции читаются последние initial байт файла (первая, возможно неполная, строка пропускается).
+def file_tail_script(path, pattern, state, limit, marker, initial=0):
+    if state:
+        inode = state["inode"]
+        offset = int(state["offset"])
+    else:
+        inode = ""
+        offset = -1
+    return (
+        f"f={shlex.quote(path)}; off={offset}; lim={int(limit)}; skip=0; "
+        "s=$(stat -Lc '%i %s' \"$f\") || exit 1; set -- $s; "
+        f"if [ \"$off\" -lt 0 ]; then off=$(($2 - {int(initial)})); skip=1; "
+        "if [ \"$off\" -le 0 ]; then off=0; skip=0; fi; "
+        f"elif [ \"$1\" != {shlex.quote(str(inode))} ] || [ \"$2\" -lt \"$off\" ]; then off=0; fi; "
+        "len=$(($2 - off)); if [ \"$len\" -gt \"$lim\" ]; then len=$lim; fi; "
+        "complete=1; "
+        "if [ \"$len\" -gt 0 ] && [ \"$(tail -c +$((off + len)) \"$f\" | head -c 1 | od -An -c | tr -d ' ')\" != '\\n' ]; "
+        "then complete=0; fi; "
+        f"echo \"{marker} $1 $off $len $complete\"; "
+        "if [ \"$len\" -gt 0 ]; then tail -c +$((off + 1)) \"$f\" | head -c \"$len\"; fi | "
+        f"LC_ALL=C LOG_PATTERN={shlex.quote(pattern)} awk -v complete=\"$complete\" -v skip=\"$skip\" "
+        "'NR > 1 && m { print p } { p = $0; m = !(skip && NR == 1) && (tolower($0) ~ ENVIRON[\"LOG_PATTERN\"]) } "
+        f"END {{ if (m && complete) print p; print \"{marker} \" (complete ? 0 : length(p) + 0) }}'"
+    )
+
+
+# Разбор вывода file_tail_script: (новые подходящие строки, новое состояние)
+def parse_file_tail(output, marker, limit):
+    lines = output.split("\n")
+    header = next((line for line in lines if line.startswith(marker)), None)
+    if header is None:
+        raise ValueError("Не удалось прочитать файл журнала")
+    inode, offset, length, complete = header[len(marker):].split()
+    footer = next(line for line in reversed(lines) if line.startswith(marker))
+    partial = int(footer[len(marker):])
+    start = lines.index(header) + 1
+    end = len(lines) - 1 - lines[::-1].index(footer)
+    consumed = int(length) - (partial if complete == "0" else 0)
+    if consumed == 0 and int(length) >= limit:
+        # Строка длиннее limit — пропускаем её, чтобы не застрять на одном месте
+        consumed = int(length)
+    return lines[start:end], {"inode": inode, "offset": int(offset) + consumed}
+
+
+# Команда journalctl для чтения записей после курсора; без курсора — последние initial записей
+def journal_command(priority, cursor, initial, limit):
+    if cursor:
+        return f"journalctl -p {priority} --no-pager --show-cursor -n {int(limit)} --after-cursor={shlex.quote(cursor)}"
+    return f"journalctl -p {priority} --no-pager --show-cursor -n {int(initial)}"
+
+
+# Разбор вывода journalctl --show-cursor: (записи, новый курсор или None, если записей нет)
+def parse_journal(output):
+    entries = []
+    cursor = None
+    for line in output.splitlines():
+        if line.startswith("-- cursor: "):
+            cursor = line[len("-- cursor: "):].strip()
+        elif not line.startswith("-- "):
+            entries.append(line)
+    return entries, cursor
@@ -0,0 +1,249 @@
+import collections
+import io
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+import instrumentation
+from alerts import RateLimiter
+
+
+# Очередь исходящих сообщений по чатам. Отправкой занимаются несколько потоков: сообщения одного чата
+# уходят строго по порядку и не чаще лимита чата (в группах лимит ниже), все чаты вместе — не чаще
+# общего лимита бота; чаты обслуживаются по кругу. Подряд идущие короткие текстовые сообщения
+# одного чата, накопившиеся в очереди, объединяются в одно. При RetryAfter чат ждёт указанное
+# Telegram время, при сетевой ошибке — с нарастающей задержкой, затем отправка повторяется.
+
+
+# Очередь чата переполнена
+class OutboxFull(Exception):
+    pass
+
+
+# Документ для отправки через очередь: содержимое файла читается сразу, при постановке в очередь,
+# а каждая попытка отправки получает новый поток с начала. InputFile дочитывает поток до конца,
+# так что повтор после RetryAfter иначе загрузил бы пустой файл, а исходный файл к моменту
+# отправки может быть уже закрыт. Возвращает функцию без аргументов, отдающую документ
+def replayable(document):
+    if not hasattr(document, "read"):
+        return lambda: document
+    data = document.read()
+    name = getattr(document, "name", None)
+
+    def reopen():
+        stream = io.BytesIO(data)
+        if isinstance(name, str):
+            stream.name = name
+        return stream
+    return reopen
+
+
+class _Item:
+    __slots__ = ("send", "text", "future", "queued", "attempts")
+
+    def __init__(self, send, text):
+        self.send = send
+        self.text = text
+        self.future = Future()
+        self.queued = time.monotonic()
+        self.attempts = 0
+
+
+class Outbox:
+    def __init__(self, workers=4, rate=25, chat_rate=1, chat_burst=3, group_rate=20 / 60,
+                 max_queue=100, retries=5, limit=4096):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retries = retries
+        self.limit = limit
+        self._global = RateLimiter(rate, max(1, int(rate)))
+        self._private = RateLimiter(chat_rate, chat_burst)
+        self._group = RateLimiter(group_rate, chat_burst)
+        self._queues = collections.OrderedDict()
+        self._busy = set()
+        self._not_before = {}
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stopped = False
+        self._queued = 0
+        self._max_queued = 0
+        self._sent = 0
+        self._coalesced = 0
+        self._retried = 0
+        self._failed = 0
+        self._rejected = 0
+
+    # Запуск потоков отправки; до него сообщения только копятся в очереди
+    def start(self):
+        for number in range(self.workers):
+            threading.Thread(target=self._run, name=f"outbox-{number}", daemon=True).start()
+
+    # Поток отправки: запросы из него выполняются напрямую, без очереди
+    def in_sender(self):
+        return getattr(self._local, "sender", False)
+
+    # Ставит отправку в очередь чата; возвращает Future с результатом send().
+    # Если задан text, сообщение может быть объединено с соседними: тогда первое из них
+    # отправляется вызовом send(объединённый текст)
+    def submit(self, chat_id, send, text=None):
+        item = _Item(send, text)
+        with self._cond:
+            queue = self._queues.get(chat_id)
+            full = queue is not None and len(queue) >= self.max_queue
+            if full:
+                self._rejected += 1
+            else:
+                if queue is None:
+                    queue = self._queues[chat_id] = collections.deque()
+                queue.append(item)
+                self._queued += 1
+                self._max_queued = max(self._max_queued, self._queued)
+                self._cond.notify()
+        if full:
+            logging.warning("Очередь сообщений чата %s переполнена (%d), сообщение отброшено", chat_id, self.max_queue)
+            item.future.set_exception(OutboxFull(f"Очередь сообщений чата {chat_id} переполнена"))
+        return item.future
+
+    # Текстовое сообщение без ожидания отправки; ошибки только пишутся в журнал
+    def post(self, bot, chat_id, text):
+        future = self.submit(chat_id, lambda merged: bot.send_message(chat_id=chat_id, text=merged), text)
+        return self.detach(chat_id, future)
+
+    # Отправка, результата которой никто не ждёт: ошибка только пишется в журнал
+    def detach(self, chat_id, future):
+        future.add_done_callback(lambda done: done.exception() and logging.error(
+            "Не удалось отправить сообщение в чат %s: %s", chat_id, done.exception()))
+        return future
+
+    def _limiter(self, chat_id):
+        return self._group if isinstance(chat_id, str) or chat_id < 0 else self._private
+
+    # Выбор следующего чата (под блокировкой): ((чат, сообщения), None) или (None, время ожидания)
+    def _take(self):
+        wait = self._global.wait_time(None)
+        if wait > 0:
+            return None, wait
+        now = time.monotonic()
+        for chat_id, queue in self._queues.items():
+            if chat_id in self._busy:
+                continue
+            limiter = self._limiter(chat_id)
+            delay = max(self._not_before.get(chat_id, 0) - now, limiter.wait_time(chat_id))
+            if delay > 0:
+                wait = delay if wait == 0 else min(wait, delay)
+                continue
+            limiter.allow(chat_id)
+            self._global.allow(None)
+            self._not_before.pop(chat_id, None)
+            items = [queue.popleft()]
+            length = len(items[0].text) if items[0].text is not None else None
+            while length is not None and queue and queue[0].text is not None and length + 1 + len(queue[0].text) <= self.limit:
+                length += 1 + len(queue[0].text)
+                items.append(queue.popleft())
+            # Чат с оставшимися сообщениями уходит в конец круга
+            if queue:
+                self._queues.move_to_end(chat_id)
+            else:
+                del self._queues[chat_id]
+            self._busy.add(chat_id)
+            self._queued -= len(items)
+            return (chat_id, items), None
+        return None, wait or None
+
+    def _run(self):
+        self._local.sender = True
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    taken, wait = self._take()
+                    if taken is not None:
+                        break
+                    self._cond.wait(wait)
+            self._deliver(*taken)
+
+    def _deliver(self, chat_id, items):
+        first = items[0]
+        try:
+            if first.text is None:
+                result = first.send()
+            else:
+                result = first.send("\n".join(item.text for item in items))
+        except RetryAfter as e:
+            self._retry(chat_id, items, e.retry_after, e)
+        except NetworkError as e:
+            # BadRequest не исправится повтором, а после TimedOut сообщение могло уже дойти
+            if isinstance(e, (BadRequest, TimedOut)):
+                self._finish(chat_id, items, error=e)
+            else:
+                self._retry(chat_id, items, min(2 ** first.attempts, 30), e)
+        except Exception as e:
+            self._finish(chat_id, items, error=e)
+        else:
+            self._finish(chat_id, items, result=result)
+
+    # Сообщения возвращаются в начало очереди чата, чат ждёт delay секунд
+    def _retry(self, chat_id, items, delay, error):
+        attempts = max(item.attempts for item in items) + 1
+        if attempts > self.retries:
+            self._finish(chat_id, items, error=error)
+            return
+        logging.warning("Отправка в чат %s отложена на %s с (попытка %d): %s", chat_id, delay, attempts, error)
+        for item in items:
+            item.attempts = attempts
+        with self._cond:
+            queue = self._queues.setdefault(chat_id, collections.deque())
+            queue.extendleft(reversed(items))
+            self._queued += len(items)
+            self._not_before[chat_id] = time.monotonic() + delay
+            self._busy.discard(chat_id)
+            self._retried += 1
+            self._cond.notify_all()
+
+    def _finish(self, chat_id, items, result=None, error=None):
+        with self._cond:
+            self._busy.discard(chat_id)
+            if error is None:
+                self._sent += 1
+                self._coalesced += len(items) - 1
+            else:
+                self._failed += len(items)
+            self._cond.notify_all()
+        now = time.monotonic()
+        kind = "group" if self._limiter(chat_id) is self._group else "private"
+        for item in items:
+            # Задержка от постановки в очередь до ответа Telegram, включая ожидание лимитов и повторы
+            instrumentation.observe("outbox", now - item.queued, error=error is not None, chat=kind)
+            if error is None:
+                item.future.set_result(result)
+            else:
+                item.future.set_exception(error)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": self._queued,
+                "max_queued": self._max_queued,
+                "chats": len(self._queues),
+                "sending": len(self._busy),
+                "sent": self._sent,
+                "coalesced": self._coalesced,
+                "retried": self._retried,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+    # Остановка потоков; неотправленные сообщения завершаются ошибкой
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            items = [item for queue in self._queues.values() for item in queue]
+            self._queues.clear()
+            self._queued = 0
+            self._cond.notify_all()
+        for item in items:
+            item.future.set_exception(OutboxFull("Бот остановлен"))
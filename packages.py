@@ -0,0 +1,140 @@
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+
+# Установленный пакет
+Package = namedtuple("Package", "name version arch")
+
+# Изменения между двумя состояниями списка пакетов: upgraded — [(старый, новый)]
+PackageDiff = namedtuple("PackageDiff", "timestamp added removed upgraded")
+
+DPKG_STATUS = "/var/lib/dpkg/status"
+
+
+# Скрипт для обновления индекса за один запрос: первая строка — время изменения базы dpkg,
+# список пакетов печатается, только если оно отличается от known_mtime.
+# Имя пакета — binary:Package, чтобы пакеты multiarch для разных архитектур не сливались
+def inventory_script(known_mtime=None):
+    return (
+        f"m=$(stat -c %Y {DPKG_STATUS}) || exit 1; echo \"$m\"; "
+        f"[ \"$m\" = \"{known_mtime or ''}\" ] || "
+        "dpkg-query -W -f='${db:Status-Abbrev}\\t${binary:Package}\\t${Version}\\t${Architecture}\\n'"
+    )
+
+
+# Разбор вывода inventory_script: (время изменения, список пакетов или None, если список не менялся)
+def parse_inventory(output):
+    lines = output.splitlines()
+    if not lines or not lines[0].strip().isdigit():
+        raise ValueError("Не удалось получить список пакетов")
+    mtime = lines[0].strip()
+    if len(lines) == 1:
+        return mtime, None
+    packages = []
+    for line in lines[1:]:
+        fields = line.split("\t")
+        # Учитываются только установленные пакеты (второй символ статуса — «i»),
+        # без удалённых с сохранёнными настройками
+        if len(fields) == 4 and fields[0][1:2] == "i":
+            packages.append(Package(*fields[1:]))
+    return mtime, packages
+
+
+# Индекс пакетов одного хоста: отсортированные имена для поиска по префиксу двоичным поиском
+# и словарь имя → пакет
+class PackageIndex:
+    def __init__(self, packages):
+        self.packages = {package.name: package for package in packages}
+        self.names = sorted(self.packages)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Пакеты, имя которых начинается с query, затем содержащие query в середине имени
+    def search(self, query):
+        query = query.lower()
+        start = bisect.bisect_left(self.names, query)
+        prefix = []
+        for name in self.names[start:]:
+            if not name.startswith(query):
+                break
+            prefix.append(name)
+        matched = set(prefix)
+        substring = [name for name in self.names if query in name and name not in matched]
+        return [self.packages[name] for name in prefix + substring]
+
+    def all(self):
+        return [self.packages[name] for name in self.names]
+
+
+def diff_packages(old, new):
+    added = [new.packages[name] for name in new.names if name not in old.packages]
+    removed = [old.packages[name] for name in old.names if name not in new.packages]
+    upgraded = [
+        (old.packages[name], new.packages[name]) for name in new.names
+        if name in old.packages and old.packages[name].version != new.packages[name].version
+    ]
+    return PackageDiff(time.time(), added, removed, upgraded)
+
+
+# Индексы пакетов по хостам. Список пакетов перечитывается с сервера, только если изменилась
+# база dpkg; при изменении запоминается разница с предыдущим состоянием
+class PackageInventory:
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    # Актуальный индекс хоста; execute(script) выполняет скрипт на хосте и возвращает stdout.
+    # Если база dpkg проверялась не раньше чем max_age секунд назад, индекс отдаётся без обращения к хосту
+    def refresh(self, host, execute, max_age=0):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None and time.monotonic() - state["checked"] < max_age:
+                return state["index"]
+        mtime, packages = parse_inventory(execute(inventory_script(state["mtime"] if state else None)))
+        with self._lock:
+            state = self._hosts.get(host)
+            # Пустой список (без изменений или после сбоя dpkg-query) не заменяет индекс,
+            # а время изменения базы не запоминается, чтобы в следующий раз список был перечитан
+            if not packages:
+                if state is None:
+                    state = self._hosts[host] = {"mtime": None, "index": PackageIndex([]), "diff": None}
+                state["checked"] = time.monotonic()
+                return state["index"]
+            index = PackageIndex(packages)
+            diff = diff_packages(state["index"], index) if state and state["mtime"] else None
+            self._hosts[host] = {
+                "mtime": mtime,
+                "checked": time.monotonic(),
+                "index": index,
+                "diff": diff or (state or {}).get("diff"),
+            }
+            return index
+
+    # Последние изменения списка пакетов хоста (None, если изменений пока не было)
+    def last_diff(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            return state["diff"] if state else None
+
+
+def format_packages(packages):
+    return "\n".join(f"{package.name} {package.version} {package.arch}" for package in packages)
+
+
+def format_diff(diff):
+    if not (diff.added or diff.removed or diff.upgraded):
+        return "Изменений нет."
+    lines = [f"Изменения от {time.strftime('%d.%m %H:%M', time.localtime(diff.timestamp))}:"]
+    if diff.added:
+        lines.append(f"🟢 Установлены ({len(diff.added)}):")
+        lines.extend(f"  {package.name} {package.version}" for package in diff.added)
+    if diff.removed:
+        lines.append(f"🔴 Удалены ({len(diff.removed)}):")
+        lines.extend(f"  {package.name} {package.version}" for package in diff.removed)
+    if diff.upgraded:
+        lines.append(f"🔄 Обновлены ({len(diff.upgraded)}):")
+        lines.extend(f"  {old.name} {old.version} → {new.version}" for old, new in diff.upgraded)
+    return "\n".join(lines)
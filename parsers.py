@@ -0,0 +1,147 @@
+import re
+from collections import namedtuple
+
+
+# Разбор вывода команд мониторинга в компактные записи с числовыми полями.
+# Размеры приводятся к байтам, проценты и загрузка — к float.
+
+DiskUsage = namedtuple("DiskUsage", "filesystem size used avail use_percent mount")
+MemoryUsage = namedtuple("MemoryUsage", "kind total used free shared buff_cache available")
+CpuUsage = namedtuple("CpuUsage", "cpu usr nice sys iowait irq soft steal guest gnice idle")
+Process = namedtuple("Process", "user pid cpu mem vsz rss tty stat start time command")
+Socket = namedtuple("Socket", "netid state recv_q send_q local_address local_port peer_address peer_port")
+LoadAverage = namedtuple("LoadAverage", "users load1 load5 load15")
+
+_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4, "P": 1024 ** 5, "E": 1024 ** 6}
+_SIZE_RE = re.compile(r"^(\d+(?:[.,]\d+)?)([KMGTPE]?)(?:i?B?)$", re.IGNORECASE)
+_LOAD_RE = re.compile(r"load averages?:\s*(\d+[.,]\d+),?\s+(\d+[.,]\d+),?\s+(\d+[.,]\d+)")
+_USERS_RE = re.compile(r"(\d+)\s+users?")
+
+
+def _number(value):
+    return float(value.replace(",", "."))
+
+
+# Размер в байтах из человекочитаемой записи ("5.9Gi", "505M", "0B") или числа байт
+def parse_size(value):
+    match = _SIZE_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Не удалось разобрать размер: {value}")
+    number, unit = match.groups()
+    return int(_number(number) * _UNITS[unit.upper()])
+
+
+# df -h / df -P -B1: по записи на файловую систему
+def parse_df(output):
+    records = []
+    for line in output.splitlines()[1:]:
+        fields = line.split()
+        # Имя файловой системы может содержать пробелы, поэтому поля отсчитываются с конца
+        if len(fields) < 6 or not fields[-2].endswith("%"):
+            continue
+        size, used, avail, percent, mount = fields[-5:]
+        try:
+            record = DiskUsage(
+                " ".join(fields[:-5]), parse_size(size), parse_size(used), parse_size(avail),
+                float(percent[:-1]), mount,
+            )
+        except ValueError:
+            # Псевдофайловые системы без размера ("-")
+            continue
+        records.append(record)
+    return records
+
+
+# free -h / free -b: записи для Mem и Swap. Строка "-/+ buffers/cache" старых версий free
+# (procps до 3.3.10) пропускается: в ней другие колонки
+def parse_free(output):
+    lines = output.splitlines()
+    if not lines:
+        return []
+    columns = lines[0].split()
+    records = []
+    for line in lines[1:]:
+        kind, _, rest = line.partition(":")
+        if not rest or kind.startswith("-/+"):
+            continue
+        values = dict(zip(columns, (parse_size(value) for value in rest.split())))
+        records.append(MemoryUsage(
+            kind.strip(),
+            values.get("total"),
+            values.get("used"),
+            values.get("free"),
+            values.get("shared"),
+            values.get("buff/cache", values.get("buffers")),
+            values.get("available"),
+        ))
+    return records
+
+
+# mpstat [-P ALL]: по записи на процессор ("all" — суммарно); при наличии строк Average берутся они
+def parse_mpstat(output):
+    header = None
+    samples = {}
+    averages = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if "%idle" in fields:
+            header = fields[fields.index("CPU"):]
+            continue
+        if header is None or len(fields) < len(header):
+            continue
+        row = dict(zip(header, fields[-len(header):]))
+        try:
+            record = CpuUsage(
+                row["CPU"],
+                *(_number(row.get(f"%{name}", "0")) for name in CpuUsage._fields[1:]),
+            )
+        except ValueError:
+            continue
+        target = averages if fields[0].startswith("Average") or fields[0].startswith("Среднее") else samples
+        target[record.cpu] = record
+    return list((averages or samples).values())
+
+
+# ps aux: по записи на процесс
+def parse_ps(output):
+    records = []
+    for line in output.splitlines()[1:]:
+        fields = line.split(None, 10)
+        if len(fields) < 11:
+            continue
+        user, pid, cpu, mem, vsz, rss, tty, stat, start, time, command = fields
+        records.append(Process(
+            user, int(pid), _number(cpu), _number(mem), int(vsz) * 1024, int(rss) * 1024,
+            tty, stat, start, time, command,
+        ))
+    return records
+
+
+def _split_address(value):
+    address, _, port = value.rpartition(":")
+    return address.strip("[]"), port
+
+
+# ss -tuln: по записи на сокет
+def parse_ss(output):
+    records = []
+    for line in output.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 6 or not fields[2].isdigit():
+            continue
+        local_address, local_port = _split_address(fields[4])
+        peer_address, peer_port = _split_address(fields[5])
+        records.append(Socket(
+            fields[0], fields[1], int(fields[2]), int(fields[3]),
+            local_address, local_port, peer_address, peer_port,
+        ))
+    return records
+
+
+# uptime: число пользователей и средняя загрузка
+def parse_uptime(output):
+    load = _LOAD_RE.search(output)
+    if not load:
+        raise ValueError(f"Не удалось разобрать вывод uptime: {output.strip()}")
+    users = _USERS_RE.search(output)
+    return LoadAverage(int(users.group(1)) if users else None, *(_number(value) for value in load.groups()))
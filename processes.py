@@ -0,0 +1,116 @@
+import re
+import shlex
+import threading
+
+import parsers
+
+
+# Колонки ps в порядке ps aux, чтобы вывод разбирался parsers.parse_ps;
+# ширина имени пользователя увеличена, иначе длинные имена обрезаются до 8 символов.
+# Время запуска — start_time, как в ps aux ("10:42", "Oct15", "2024"): колонка start для процессов
+# старше суток выводит "Oct 15" с пробелом, и поля после неё сдвигаются
+PS_COLUMNS = "user:32,pid,pcpu,pmem,vsz,rss,tty,stat,start_time,time,args"
+
+# Ключи сортировки /get_ps: имя → ключ сортировки ps (по убыванию, кроме pid)
+SORT_KEYS = {
+    "cpu": "-pcpu",
+    "mem": "-rss",
+    "pid": "pid",
+    "time": "-cputime",
+    "start": "-start_time",
+}
+
+_USER_RE = re.compile(r"^[\w.-]+$")
+
+
+# Команда ps с сортировкой и фильтрами, выполняемыми на сервере: user — точное имя пользователя,
+# match — подстрока командной строки, top — число строк (0 — без ограничения).
+# Заголовок ps сохраняется, чтобы вывод был понятен и разбирался как ps aux
+def ps_command(sort="cpu", user=None, match=None, top=0):
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Неизвестный ключ сортировки: {sort} (доступны: {', '.join(SORT_KEYS)})")
+    if user is not None and not _USER_RE.match(user):
+        raise ValueError(f"Недопустимое имя пользователя: {user}")
+    command = f"ps -eo {PS_COLUMNS} --sort={SORT_KEYS[sort]}"
+    if user or match:
+        # Значения передаются awk через окружение, а не подставляются в текст программы
+        command += (
+            f" | PS_USER={shlex.quote(user or '')} PS_MATCH={shlex.quote(match or '')} awk '"
+            "NR == 1 { print; next } "
+            "{ c = $11; for (i = 12; i <= NF; i++) c = c \" \" $i } "
+            "(ENVIRON[\"PS_USER\"] == \"\" || $1 == ENVIRON[\"PS_USER\"]) && "
+            "(ENVIRON[\"PS_MATCH\"] == \"\" || index(c, ENVIRON[\"PS_MATCH\"])) { print }'"
+        )
+    if top:
+        command += f" | head -n {int(top) + 1}"
+    return command
+
+
+# Последние снимки списка процессов по хостам для /get_ps diff
+class ProcessSnapshots:
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    # Сохраняет новый снимок {pid: Process} и возвращает предыдущий (None, если его не было)
+    def swap(self, host, snapshot):
+        with self._lock:
+            previous = self._snapshots.get(host)
+            self._snapshots[host] = snapshot
+        return previous
+
+
+# Сравнение снимков: (запущенные, завершённые, выросшие по RSS не меньше чем на growth байт).
+# Процесс с тем же pid, но другим временем запуска считается новым (pid переиспользован);
+# командную строку сравнивать нельзя — потоки ядра меняют имя
+def diff_processes(previous, current, growth):
+    started = []
+    grew = []
+    for pid, process in current.items():
+        old = previous.get(pid)
+        if old is None or old.start != process.start:
+            started.append(process)
+        elif process.rss - old.rss >= growth:
+            grew.append((old, process))
+    exited = [
+        process for pid, process in previous.items()
+        if pid not in current or current[pid].start != process.start
+    ]
+    grew.sort(key=lambda pair: pair[1].rss - pair[0].rss, reverse=True)
+    return started, exited, grew
+
+
+def _mb(value):
+    return f"{value / 1048576:.1f} МБ"
+
+
+def _short(command, width=80):
+    return command if len(command) <= width else command[:width - 1] + "…"
+
+
+# Текстовый отчёт о различиях между снимками
+def format_diff(started, exited, grew):
+    if not (started or exited or grew):
+        return "Изменений нет."
+    lines = []
+    if started:
+        lines.append(f"🟢 Запущены ({len(started)}):")
+        lines.extend(f"  {p.pid} {p.user} {_mb(p.rss)} {_short(p.command)}" for p in started)
+    if exited:
+        lines.append(f"🔴 Завершены ({len(exited)}):")
+        lines.extend(f"  {p.pid} {p.user} {_short(p.command)}" for p in exited)
+    if grew:
+        lines.append(f"📈 Выросли ({len(grew)}):")
+        lines.extend(
+            f"  {new.pid} {new.user} {_mb(old.rss)} → {_mb(new.rss)} (+{_mb(new.rss - old.rss)}) {_short(new.command)}"
+            for old, new in grew
+        )
+    return "\n".join(lines)
+
+
+# Разбор вывода ps_command в {pid: Process} без процессов, запущенных самой командой снимка
+def parse_snapshot(output):
+    return {
+        process.pid: process for process in parsers.parse_ps(output)
+        if PS_COLUMNS not in process.command
+    }
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Ожидающий результат выполнения, на который подписываются одинаковые параллельные запросы
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Кэш результатов команд с TTL для каждой записи и вытеснением давно не использованных (LRU).
+# Одновременные запросы с одним ключом объединяются: команда выполняется один раз,
+# остальные запросы ждут её результата.
+class ResultCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Возвращает (значение, возраст в секундах); при промахе или refresh=True вызывает func()
+    def get_or_run(self, key, ttl, func, refresh=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not refresh and now - entry[1] < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], now - entry[1]
+            pending = self._in_flight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._in_flight[key] = _InFlight()
+                self.misses += 1
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value, 0.0
+
+        try:
+            pending.value = func()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if pending.error is None and ttl > 0:
+                    self._entries[key] = (pending.value, time.monotonic())
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            pending.done.set()
+        return pending.value, 0.0
+
+    # Удаляет записи, для которых predicate(key) истинно (или все записи)
+    def invalidate(self, predicate=None):
+        with self._lock:
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def __len__(self):
+        return len(self._entries)
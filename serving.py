@@ -0,0 +1,59 @@
+import hashlib
+import logging
+import queue
+
+from telegram.ext import Dispatcher, JobQueue, Updater
+
+
+# Очередь входящих обновлений ограниченного размера. При опросе (polling) поток получения обновлений
+# просто ждёт свободного места. При работе через webhook (nonblocking) обновление кладётся в очередь
+# из единственного потока IOLoop tornado: ожидание остановило бы весь HTTP-сервер, поэтому при
+# переполнении обновление сразу отклоняется, запрос Telegram завершается ошибкой и Telegram повторит
+# доставку позже
+class UpdateQueue(queue.Queue):
+    def __init__(self, maxsize=0, nonblocking=False):
+        super().__init__(maxsize)
+        self.nonblocking = nonblocking
+        self.rejected = 0
+
+    def put(self, item, block=True, timeout=None):
+        try:
+            super().put(item, block and not self.nonblocking, timeout)
+        except queue.Full:
+            self.rejected += 1
+            logging.warning("Очередь обновлений переполнена (%s), обновление отклонено", self.maxsize)
+            raise
+
+
+# Updater с заданным размером очереди обновлений. Обработчики бота не используют run_async
+# (медленные выполняются в пуле workers.HandlerPool), поэтому диспетчеру достаточно одного
+# воркера run_async; workers можно увеличить для обработчиков с run_async=True
+def build_updater(bot, workers=1, queue_size=0, nonblocking=False):
+    job_queue = JobQueue()
+    dispatcher = Dispatcher(bot, UpdateQueue(queue_size, nonblocking), workers=workers, job_queue=job_queue)
+    job_queue.set_dispatcher(dispatcher)
+    return Updater(dispatcher=dispatcher, workers=None)
+
+
+# Путь webhook по умолчанию: не раскрывает токен, но без него не угадывается
+def webhook_path(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+# Запуск получения обновлений: webhook, если задан url, иначе длинный опрос.
+# url — внешний адрес, по которому Telegram отправляет обновления (обычно за обратным прокси);
+# listen/port — адрес встроенного HTTP-сервера, cert/key — сертификат, если TLS завершается в боте
+def start(updater, url=None, listen="127.0.0.1", port=8443, path=None, cert=None, key=None,
+          max_connections=40, poll_timeout=10, drop_pending_updates=False):
+    if not url:
+        logging.info("Получение обновлений: длинный опрос (timeout=%s с)", poll_timeout)
+        updater.start_polling(timeout=poll_timeout, drop_pending_updates=drop_pending_updates)
+        return "polling"
+    path = (path or webhook_path(updater.bot.token)).strip("/")
+    updater.start_webhook(
+        listen=listen, port=port, url_path=path, cert=cert, key=key,
+        webhook_url=f"{url.rstrip('/')}/{path}", max_connections=max_connections,
+        drop_pending_updates=drop_pending_updates, bootstrap_retries=-1,
+    )
+    logging.info("Получение обновлений: webhook %s:%s (max_connections=%s)", listen, port, max_connections)
+    return "webhook"
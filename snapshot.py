@@ -0,0 +1,63 @@
+import uuid
+
+
+# Разделы снимка состояния хоста: (имя, команда, заголовок)
+SNAPSHOT_SECTIONS = [
+    ("uptime", "uptime", "Время работы системы"),
+    ("free", "free -h", "Информация о памяти"),
+    ("df", "df -h", "Информация о файловой системе"),
+    ("mpstat", "mpstat", "Информация о производительности"),
+    ("ss", "ss -tuln", "Информация об используемых портах"),
+    ("services", "systemctl list-units --type=service --state=running", "Запущенные сервисы"),
+]
+
+
+def new_marker():
+    return f"--snapshot-{uuid.uuid4().hex}--"
+
+
+# Составной скрипт: все команды выполняются в одном канале,
+# вывод каждой обрамляется строками "<marker> begin <имя>" и "<marker> end <имя> <код выхода>"
+def build_script(sections, marker):
+    parts = []
+    for name, command, _ in sections:
+        parts.append(f"echo '{marker} begin {name}'; {command} 2>&1; echo \"{marker} end {name} $?\"")
+    return "; ".join(parts)
+
+
+# Разбор вывода составного скрипта: {имя: (вывод, код выхода)}
+def parse_output(output, marker):
+    sections = {}
+    name = None
+    lines = []
+    for line in output.splitlines():
+        if line.startswith(marker):
+            fields = line[len(marker):].split()
+            if fields[0] == "begin":
+                name = fields[1]
+                lines = []
+            elif fields[0] == "end" and name == fields[1]:
+                code = int(fields[2]) if len(fields) > 2 and fields[2].lstrip("-").isdigit() else None
+                sections[name] = ("\n".join(lines), code)
+                name = None
+        elif name is not None:
+            lines.append(line)
+    if name is not None:
+        # Скрипт прервался посреди раздела — сохраняем то, что успели получить
+        sections[name] = ("\n".join(lines), None)
+    return sections
+
+
+# Сводный отчёт по снимку
+def format_snapshot(sections, parsed):
+    report = []
+    for name, _, title in sections:
+        if name not in parsed:
+            report.append(f"=== {title} — ❌ нет данных ===")
+        else:
+            output, code = parsed[name]
+            status = "" if code == 0 else f" — ❌ код выхода {code}"
+            report.append(f"=== {title}{status} ===")
+            report.append(output.rstrip("\n"))
+        report.append("")
+    return "\n".join(report)
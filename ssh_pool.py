@@ -0,0 +1,202 @@
+import logging
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+
+import instrumentation
+
+
+READ_SIZE = 32768
+
+
+# Команда не завершилась за отведённое время
+class CommandTimeout(Exception):
+    pass
+
+
+# Сессия или пул закрыты окончательно: переподключение не выполняется
+class SessionClosed(Exception):
+    pass
+
+
+# Одна аутентифицированная SSH-сессия (paramiko.Transport) к хосту.
+# Каждая команда выполняется в отдельном канале поверх общего транспорта,
+# число одновременно открытых каналов ограничено семафором.
+class SSHSession:
+    def __init__(self, host, port, username, password, max_channels=4, keepalive=30, connect_timeout=10):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self._transport = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._channels = threading.BoundedSemaphore(max_channels)
+
+    def is_active(self):
+        return self._transport is not None and self._transport.is_active()
+
+    def _connect(self):
+        logging.info("Устанавливается SSH-соединение с %s:%s от имени пользователя %s", self.host, self.port, self.username)
+        with instrumentation.timer("ssh_connect", host=self.host):
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+            # Запросы канала — короткие пакеты подряд: без TCP_NODELAY каждый обмен ждёт
+            # отложенного подтверждения (около 40 мс на команду)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(sock)
+            try:
+                transport.start_client(timeout=self.connect_timeout)
+                transport.auth_password(self.username, self.password)
+            except Exception:
+                transport.close()
+                raise
+        if self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        self._transport = transport
+
+    # Возвращает живой транспорт, при необходимости переподключаясь (кроме закрытой окончательно сессии)
+    def transport(self):
+        with self._lock:
+            if self._closed:
+                raise SessionClosed(f"SSH-сессия с {self.host} закрыта")
+            if not self.is_active():
+                if self._transport is not None:
+                    logging.warning("SSH-соединение с %s потеряно, переподключение", self.host)
+                    self._transport.close()
+                self._connect()
+            return self._transport
+
+    def _open_session(self):
+        try:
+            return self.transport().open_session(timeout=self.connect_timeout)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            # Соединение могло оборваться между проверкой и открытием канала — пробуем ещё раз
+            logging.warning("Не удалось открыть канал к %s (%s), переподключение", self.host, str(e))
+            self.close()
+            return self.transport().open_session(timeout=self.connect_timeout)
+
+    # Открывает канал и запускает в нём команду; канал закрывается при выходе из блока.
+    # Свободного места в лимите каналов ждёт не дольше wait секунд (None — без ограничения)
+    @contextmanager
+    def channel(self, command, timeout=None, wait=None):
+        if not self._channels.acquire(timeout=wait):
+            raise CommandTimeout(f"Нет свободного SSH-канала к {self.host} за {wait:.0f} с")
+        try:
+            chan = self._open_session()
+            try:
+                chan.settimeout(timeout)
+                chan.exec_command(command)
+                yield chan
+            finally:
+                chan.close()
+        finally:
+            self._channels.release()
+
+    # Канал для долгоживущей команды (поток выборок агента сбора метрик): не занимает место
+    # в лимите одновременных каналов, закрывается вызывающим
+    def open_channel(self, command, timeout=None):
+        chan = self._open_session()
+        chan.settimeout(timeout)
+        chan.exec_command(command)
+        return chan
+
+    # Выполняет команду и возвращает (stdout, stderr) в виде байтов.
+    # Если команда не завершилась за timeout секунд, канал закрывается и выбрасывается CommandTimeout.
+    def exec_command(self, command, timeout=None):
+        stdout = []
+        stderr = self.exec_stream(command, stdout.append, timeout=timeout)
+        return b"".join(stdout), stderr
+
+    # Выполняет команду, передавая stdout порциями в write(bytes) по мере получения из канала;
+    # возвращает stderr. Таймаут — как в exec_command, в него входит и ожидание свободного канала.
+    # Чтение продолжается до EOF от сервера: код завершения может прийти раньше последних данных stdout
+    def exec_stream(self, command, write, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stderr = []
+        with instrumentation.timer("ssh_exec", host=self.host), self.channel(command, wait=timeout) as chan:
+            while True:
+                if chan.recv_ready():
+                    write(chan.recv(READ_SIZE))
+                elif chan.recv_stderr_ready():
+                    stderr.append(chan.recv_stderr(READ_SIZE))
+                elif chan.eof_received or chan.closed:
+                    # После EOF данных больше не будет; дочитываем то, что успело прийти после проверок выше
+                    while chan.recv_ready():
+                        write(chan.recv(READ_SIZE))
+                    while chan.recv_stderr_ready():
+                        stderr.append(chan.recv_stderr(READ_SIZE))
+                    break
+                else:
+                    wait = 1.0
+                    if deadline is not None:
+                        wait = deadline - time.monotonic()
+                        if wait <= 0:
+                            logging.warning("Команда '%s' на %s прервана по таймауту %s с", command, self.host, timeout)
+                            raise CommandTimeout(f"Команда не завершилась за {timeout} с")
+                    select.select([chan], [], [], min(wait, 1.0))
+        return b"".join(stderr)
+
+    # Закрывает транспорт; следующая команда переподключится. С final=True сессия закрывается
+    # окончательно: потоки, ещё работающие с ней, не смогут открыть новый транспорт
+    def close(self, final=False):
+        with self._lock:
+            self._closed = self._closed or final
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+                logging.info("SSH-соединение с %s закрыто", self.host)
+
+
+# Пул SSH-сессий: не более одной сессии на (хост, порт, пользователь)
+class SSHSessionManager:
+    def __init__(self, username, password, port=22, max_channels=4, keepalive=30, connect_timeout=10):
+        self.username = username
+        self.password = password
+        self.port = port
+        self.max_channels = max_channels
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self._sessions = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def get(self, host, port=None, username=None, password=None):
+        key = (host, int(port or self.port), username or self.username)
+        with self._lock:
+            if self._closed:
+                raise SessionClosed("Пул SSH-сессий закрыт")
+            session = self._sessions.get(key)
+            if session is None:
+                session = SSHSession(
+                    host, key[1], key[2], password or self.password,
+                    max_channels=self.max_channels,
+                    keepalive=self.keepalive,
+                    connect_timeout=self.connect_timeout,
+                )
+                self._sessions[key] = session
+            return session
+
+    def exec_command(self, host, command, timeout=None, **credentials):
+        return self.get(host, **credentials).exec_command(command, timeout=timeout)
+
+    def exec_stream(self, host, command, write, timeout=None, **credentials):
+        return self.get(host, **credentials).exec_stream(command, write, timeout=timeout)
+
+    # Закрывает сессии к указанному хосту (следующая команда создаст новую сессию) или, если хост
+    # не задан, все сессии и сам пул. Удалённые из пула сессии закрываются окончательно, чтобы поток,
+    # ещё выполняющий в них команду, не переподключил сессию, которую уже никто не закроет
+    def close(self, host=None):
+        with self._lock:
+            if host is None:
+                self._closed = True
+            keys = [key for key in self._sessions if host is None or key[0] == host]
+            sessions = [self._sessions.pop(key) for key in keys]
+        for session in sessions:
+            session.close(final=True)
+        return len(sessions)
@@ -0,0 +1,97 @@
+import pytest
+
+from alerts import AlertEngine, AlertNotifier, AlertRule, RateLimiter, Subscriptions, parse_rules
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("cpu>90", [AlertRule("cpu", ">", 90.0, 0.0, 5.0)]),
+    ("disk:>90/5m", [AlertRule("disk:", ">", 90.0, 300.0, 5.0)]),
+    ("mem > 80 / 30s / 2.5", [AlertRule("mem", ">", 80.0, 30.0, 2.5)]),
+    ("mem_available<10/1h,journal_errors>0", [
+        AlertRule("mem_available", "<", 10.0, 3600.0, 5.0),
+        AlertRule("journal_errors", ">", 0.0, 0.0, 5.0),
+    ]),
+    ("", []),
+])
+def test_parse_rules(spec, expected):
+    assert parse_rules(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["cpu", "cpu>=90", "cpu>90/5x", ">90"])
+def test_parse_rules_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_rules(spec)
+
+
+# Прогоняет выборки [(время, значение)] одной метрики и возвращает [(время, вид события)]
+def run(engine, samples, metric="cpu", host="srv"):
+    return [
+        (timestamp, event.kind)
+        for timestamp, value in samples
+        for event in engine.evaluate(host, timestamp, {metric: value})
+    ]
+
+
+def test_fires_after_duration_and_clears_with_hysteresis():
+    engine = AlertEngine(parse_rules("cpu>90/60s/5"))
+    samples = [
+        (0, 95), (30, 97), (60, 96),   # условие держится 60 с — оповещение
+        (90, 99),                       # уже сработало, повторно не отправляется
+        (120, 88), (150, 85.5),         # ниже порога, но в пределах гистерезиса — не снимается
+        (180, 85),                      # порог минус гистерезис — снято
+        (210, 95),                      # новый отсчёт времени удержания
+        (270, 95),
+    ]
+    assert run(engine, samples) == [(60, "firing"), (180, "resolved"), (270, "firing")]
+
+
+def test_dip_below_threshold_restarts_duration():
+    engine = AlertEngine(parse_rules("cpu>90/60s"))
+    assert run(engine, [(0, 95), (30, 80), (60, 95), (90, 95)]) == []
+    assert run(engine, [(120, 95)]) == [(120, "firing")]
+
+
+def test_zero_duration_fires_immediately():
+    engine = AlertEngine(parse_rules("cpu>90"))
+    assert run(engine, [(0, 90), (10, 90.1)]) == [(10, "firing")]
+
+
+def test_less_than_rule():
+    engine = AlertEngine(parse_rules("mem_available<10/0/2"))
+    samples = [(0, 9), (10, 11), (20, 12)]
+    assert run(engine, samples, metric="mem_available") == [(0, "firing"), (20, "resolved")]
+
+
+def test_prefix_rule_tracks_metrics_and_hosts_separately():
+    engine = AlertEngine(parse_rules("disk:>90"))
+    events = engine.evaluate("a", 0, {"disk:/": 95, "disk:/var": 50, "cpu": 99})
+    events += engine.evaluate("b", 0, {"disk:/": 95})
+    assert [(event.kind, event.host, event.metric) for event in events] == [
+        ("firing", "a", "disk:/"), ("firing", "b", "disk:/"),
+    ]
+    assert sorted((host, metric) for _, host, metric in engine.active()) == [("a", "disk:/"), ("b", "disk:/")]
+    assert [event.kind for event in engine.evaluate("a", 10, {"disk:/": 80})] == ["resolved"]
+    assert [(host, metric) for _, host, metric in engine.active()] == [("b", "disk:/")]
+
+
+def test_event_metrics_fire_every_time_without_resolving():
+    engine = AlertEngine(parse_rules("journal_errors>0/5m"))
+    samples = [(0, 2), (10, 0), (20, 1), (30, 1)]
+    assert run(engine, samples, metric="journal_errors") == [(0, "event"), (20, "event"), (30, "event")]
+    assert engine.active() == []
+
+
+def test_notifier_batches_per_chat():
+    subscriptions = Subscriptions(None)
+    subscriptions.add(1)
+    subscriptions.add(2)
+    notifier = AlertNotifier(subscriptions, RateLimiter(rate=0.001, burst=1), max_lines=2)
+    notifier.push(["a", "b", "c"])
+    sent = []
+    notifier.flush(lambda chat_id, text: sent.append((chat_id, text)))
+    assert sorted(sent) == [(1, "a\nb\n… и ещё 1 оповещений"), (2, "a\nb\n… и ещё 1 оповещений")]
+    # Лимит чата исчерпан: новые оповещения ждут следующей отправки
+    notifier.push(["d"])
+    sent.clear()
+    notifier.flush(lambda chat_id, text: sent.append((chat_id, text)))
+    assert sent == []
@@ -0,0 +1,51 @@
+import pytest
+
+import collector
+import collector_agent
+from backends import ProcBackend
+
+# /proc/stat: user nice system idle iowait irq softirq steal guest guest_nice
+STAT = "cpu  {} 0 {} {} {} 0 0 0 0 0\ncpu0 1 0 1 1 1 0 0 0 0 0\n"
+
+
+@pytest.fixture
+def root(tmp_path):
+    proc = tmp_path / "proc"
+    (proc / "sys" / "kernel").mkdir(parents=True)
+    (proc / "sys" / "kernel" / "hostname").write_text("srv\n")
+    (proc / "sys" / "kernel" / "osrelease").write_text("6.1.0\n")
+    (proc / "loadavg").write_text("0.50 0.40 0.30 1/100 1234\n")
+    (proc / "meminfo").write_text("MemTotal: 1000 kB\nMemFree: 100 kB\nMemAvailable: 250 kB\nSwapTotal: 0 kB\nSwapFree: 0 kB\n")
+    (proc / "1").mkdir()
+    (proc / "1" / "mounts").write_text("")
+    return tmp_path
+
+
+def write_stat(root, user, system, idle, iowait):
+    (root / "proc" / "stat").write_text(STAT.format(user, system, idle, iowait))
+
+
+@pytest.mark.parametrize("user, system, idle, iowait, cpu", [
+    (100, 100, 700, 100, 30.0),
+    (0, 0, 500, 500, 50.0),
+    (50, 50, 900, 0, 10.0),
+])
+def test_iowait_counts_as_busy_in_both_collectors(root, user, system, idle, iowait, cpu):
+    write_stat(root, user, system, idle, iowait)
+    # Агент: загрузка с момента запуска (предыдущая выборка — нули)
+    metrics, _ = collector_agent.sample((0, 0), proc=str(root / "proc"), root=str(root))
+    assert metrics["cpu"] == cpu
+    # mpstat (здесь — его вывод, построенный по тому же /proc/stat) и collector.extract_metrics
+    output = ProcBackend(root=str(root)).mpstat()
+    assert collector.extract_metrics({"mpstat": (output,)})["cpu"] == pytest.approx(cpu, abs=0.01)
+
+
+def test_cpu_from_difference_between_samples(root):
+    write_stat(root, 100, 100, 700, 100)
+    _, previous = collector_agent.sample(None, proc=str(root / "proc"), root=str(root))
+    write_stat(root, 200, 200, 1300, 300)
+    metrics, _ = collector_agent.sample(previous, proc=str(root / "proc"), root=str(root))
+    # За интервал: занято 100 + 100 + 200 (iowait) из 1000
+    assert metrics["cpu"] == 40.0
+    assert metrics["mem"] == 75.0
+    assert metrics["load1"] == 0.5
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+
+import db_pool
+from db_pool import DatabasePool
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.queries.append(query)
+
+    def fetchall(self):
+        return [(table,) for table in db_pool.REQUIRED_TABLES]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+# Подключение к базе: каждое новое соединение ждёт разрешения gate (если задан)
+class Server:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.max_open = 0
+        self.connects = 0
+        self.gate = None
+        self.connecting = threading.Event()
+
+    def connect(self, **kwargs):
+        with self.lock:
+            self.connects += 1
+        if self.gate is not None:
+            self.connecting.set()
+            assert self.gate.wait(5)
+        connection = FakeConnection()
+        original_close = connection.close
+
+        def close():
+            if not connection.closed:
+                with self.lock:
+                    self.open -= 1
+            original_close()
+        connection.close = close
+        with self.lock:
+            self.open += 1
+            self.max_open = max(self.max_open, self.open)
+        return connection
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = Server()
+    monkeypatch.setattr(db_pool.psycopg2, "connect", server.connect)
+    return server
+
+
+def test_schema_checked_once_and_idle_connections_reused(server):
+    pool = DatabasePool(minconn=1, maxconn=3)
+    for _ in range(3):
+        with pool.connection() as connection:
+            pass
+    assert server.connects == 1
+    assert sum("information_schema" in query for query in connection.queries) == 1
+    pool.close()
+    assert server.open == 0
+
+
+def test_missing_tables(server, monkeypatch):
+    monkeypatch.setattr(FakeCursor, "fetchall", lambda self: [("emails",)])
+    pool = DatabasePool(minconn=1, maxconn=2)
+    with pytest.raises(Exception, match="phone_numbers"):
+        with pool.connection():
+            pass
+    assert pool.stats()["in_use"] == 0
+
+
+def test_connections_never_exceed_maxconn(server):
+    pool = DatabasePool(minconn=1, maxconn=3, wait_timeout=5)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def worker():
+        try:
+            barrier.wait(5)
+            for _ in range(20):
+                with pool.connection():
+                    pass
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == []
+    assert server.max_open <= 3
+    assert server.open <= 1
+    pool.close()
+
+
+def test_slow_connect_does_not_block_idle_checkout(server):
+    pool = DatabasePool(minconn=1, maxconn=2, wait_timeout=5)
+    with pool.connection():
+        pass
+    # Первое соединение простаивает в пуле; следующее новое соединение устанавливается медленно
+    server.gate = threading.Event()
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_idle():
+        with pool.connection():
+            held.set()
+            assert release.wait(5)
+
+    def slow():
+        with pool.connection():
+            pass
+
+    holder = threading.Thread(target=hold_idle)
+    holder.start()
+    assert held.wait(5)
+    connecting = threading.Thread(target=slow)
+    connecting.start()
+    assert server.connecting.wait(5)
+    release.set()
+    holder.join(5)
+    # Пока новое соединение устанавливается, простаивающее выдаётся без ожидания
+    done = threading.Event()
+
+    def reuse():
+        with pool.connection():
+            done.set()
+    threading.Thread(target=reuse, daemon=True).start()
+    try:
+        assert done.wait(2)
+    finally:
+        server.gate.set()
+        connecting.join(5)
+    assert server.connects == 2
+    pool.close()
@@ -0,0 +1,39 @@
+import pytest
+
+import extraction
+
+
+@pytest.mark.parametrize("text, phones", [
+    ("79991234567", ["+79991234567"]),
+    ("89991234567", ["+79991234567"]),
+    ("9991234567", ["+79991234567"]),
+    ("7 999 123 45 67", ["+79991234567"]),
+    ("8 (999) 123-45-67", ["+79991234567"]),
+    ("+7 (999) 123-45-67", ["+79991234567"]),
+    ("+1 (212) 555-12-34", ["+12125551234"]),
+    ("звоните 79991234567, или 8-999-123-45-67 или +7 999 765 43 21",
+     ["+79991234567", "+79997654321"]),
+    # Части более длинных чисел и слов не считаются номерами
+    ("179991234567", []),
+    ("799912345678", []),
+    ("id79991234567", []),
+    ("999-12-34", []),
+])
+def test_phones(text, phones):
+    assert extraction.extract("phone", text) == phones
+
+
+@pytest.mark.parametrize("text, emails", [
+    ("Ivan.Petrov@Example.COM", ["ivan.petrov@example.com"]),
+    ("почта: user@пример.рф.", ["user@xn--e1afmkfd.xn--p1ai"]),
+    ("a@b.c и x@y", []),
+    ("first@example.com, second@example.org", ["first@example.com", "second@example.org"]),
+])
+def test_emails(text, emails):
+    assert extraction.extract("email", text) == emails
+
+
+def test_extract_range():
+    text = "a@example.com b@example.com"
+    assert extraction.extract("email", text, 1) == ["b@example.com"]
+    assert extraction.extract("email", text, 0, 1) == ["a@example.com"]
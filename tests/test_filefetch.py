@@ -0,0 +1,118 @@
+import gzip
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import filefetch
+
+PATTERNS = ["/var/log/*", "/opt/app/logs/*.log"]
+MARKER = "@@FETCH"
+
+
+@pytest.mark.parametrize("path, allowed", [
+    ("/var/log/syslog", True),
+    ("/var/log/nginx/access.log", True),
+    ("/opt/app/logs/app.log", True),
+    # Выход из каталога через ".." и другие ненормализованные пути
+    ("/var/log/../../etc/shadow", False),
+    ("/var/log/nginx/../../../etc/shadow", False),
+    ("/var/log/./syslog", False),
+    ("/var/log//syslog", False),
+    ("//var/log/syslog", False),
+    ("/var/log/", False),
+    ("var/log/syslog", False),
+    ("../var/log/syslog", False),
+    # Каталоги с тем же префиксом имени
+    ("/var/log2/syslog", False),
+    ("/var/logs/syslog", False),
+    ("/var/log", False),
+    ("/opt/app/logs/app.log.1", False),
+    ("/opt/app/logs2/app.log", False),
+    ("/etc/shadow", False),
+    ("", False),
+])
+def test_path_allowed(path, allowed):
+    assert filefetch.path_allowed(path, PATTERNS) is allowed
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    ("/var/log/*", "/var/log/*"),
+    ("/var/log/*.log", "/var/log/*.log"),
+    ("/srv/my app/*", "'/srv/my app/'*"),
+    ("/var/log/syslog.[0-9]", "/var/log/syslog.[0-9]"),
+    ("/tmp/a;rm -rf /*", "'/tmp/a;rm -rf /'*"),
+])
+def test_case_pattern(pattern, expected):
+    assert filefetch._case_pattern(pattern) == expected
+
+
+# Скрипт fetch_script выполняется локально: символические ссылки раскрываются и проверяются повторно
+@pytest.mark.skipif(not all(shutil.which(name) for name in ("sh", "readlink", "gzip", "tail")), reason="нужны sh, readlink, gzip")
+class TestFetchScript:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        logs = tmp_path / "logs"
+        logs.mkdir()
+        (logs / "app.log").write_text("line 1\nerror 2\nline 3\n")
+        (tmp_path / "secret.txt").write_text("secret\n")
+        (logs / "escape.log").symlink_to(tmp_path / "secret.txt")
+        (logs / "inside.log").symlink_to(logs / "app.log")
+        lookalike = tmp_path / "logs2"
+        lookalike.mkdir()
+        (lookalike / "app.log").write_text("other\n")
+        (logs / "lookalike.log").symlink_to(lookalike / "app.log")
+        return tmp_path
+
+    def fetch(self, tree, name, **kwargs):
+        script = filefetch.fetch_script(str(tree / name), [f"{tree}/logs/*"], MARKER, 1 << 20, **kwargs)
+        result = subprocess.run(["sh", "-c", script], capture_output=True)
+        download = filefetch.Download(MARKER, 1 << 20, 1 << 20)
+        download.write(result.stdout)
+        download.check(result.stderr, MARKER)
+        download.file.seek(0)
+        data = gzip.decompress(download.file.read()).decode()
+        download.close()
+        return data
+
+    def test_plain_file(self, tree):
+        assert self.fetch(tree, "logs/app.log") == "line 1\nerror 2\nline 3\n"
+
+    def test_grep(self, tree):
+        assert self.fetch(tree, "logs/app.log", grep="ERROR") == "error 2\n"
+
+    def test_symlink_inside_allowed(self, tree):
+        assert self.fetch(tree, "logs/inside.log") == "line 1\nerror 2\nline 3\n"
+
+    @pytest.mark.parametrize("name, error", [
+        ("logs/escape.log", filefetch.ERRORS["denied"]),
+        ("logs/lookalike.log", filefetch.ERRORS["denied"]),
+        ("logs2/app.log", filefetch.ERRORS["denied"]),
+        ("logs/../secret.txt", filefetch.ERRORS["denied"]),
+        ("logs/missing.log", filefetch.ERRORS["missing"]),
+    ])
+    def test_rejected(self, tree, name, error):
+        with pytest.raises(filefetch.FetchError, match=re.escape(error)):
+            self.fetch(tree, name)
+
+    @pytest.mark.skipif(os.geteuid() == 0, reason="root читает любой файл")
+    def test_unreadable(self, tree):
+        os.chmod(tree / "logs" / "app.log", 0)
+        with pytest.raises(filefetch.FetchError, match=filefetch.ERRORS["unreadable"]):
+            self.fetch(tree, "logs/app.log")
+
+
+def test_download_too_large():
+    download = filefetch.Download(MARKER, 10, 1024)
+    with pytest.raises(filefetch.TooLarge):
+        download.write(f"{MARKER} gzip\n".encode() + b"x" * 11)
+    download.close()
+
+
+def test_download_rejects_bad_header():
+    download = filefetch.Download(MARKER, 10, 1024)
+    with pytest.raises(filefetch.FetchError):
+        download.write(b"Welcome!\n")
+    download.close()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import logtail
+
+MARKER = "@@TAIL"
+
+
+@pytest.mark.parametrize("output, limit, lines, state", [
+    # Целые строки: позиция сдвигается на весь прочитанный кусок
+    (f"{MARKER} 42 100 30 1\nwal sender started\nreplication ok\n{MARKER} 0\n", 1000,
+     ["wal sender started", "replication ok"], {"inode": "42", "offset": 130}),
+    # Неполная последняя строка (12 байт) не считается прочитанной
+    (f"{MARKER} 42 0 40 0\nwal receiver\n{MARKER} 12\n", 1000,
+     ["wal receiver"], {"inode": "42", "offset": 28}),
+    # Подходящих строк нет, но прочитанное пропускается
+    (f"{MARKER} 7 10 5 1\n{MARKER} 0\n", 1000, [], {"inode": "7", "offset": 15}),
+    # Строка длиннее limit целиком без перевода строки — пропускается, чтобы не застрять
+    (f"{MARKER} 7 0 64 0\n{MARKER} 64\n", 64, [], {"inode": "7", "offset": 64}),
+    # Строки до заголовка (например, приветствие оболочки) игнорируются
+    (f"motd\n{MARKER} 9 0 0 1\n{MARKER} 0\n", 1000, [], {"inode": "9", "offset": 0}),
+])
+def test_parse_file_tail(output, limit, lines, state):
+    assert logtail.parse_file_tail(output, MARKER, limit) == (lines, state)
+
+
+def test_parse_file_tail_without_header():
+    with pytest.raises(ValueError):
+        logtail.parse_file_tail("stat: cannot stat\n", MARKER, 1000)
+
+
+@pytest.mark.parametrize("output, entries, cursor", [
+    ("Oct 18 10:00:01 srv kernel: oops\nOct 18 10:00:02 srv sshd[1]: error\n-- cursor: s=abc;i=2\n",
+     ["Oct 18 10:00:01 srv kernel: oops", "Oct 18 10:00:02 srv sshd[1]: error"], "s=abc;i=2"),
+    ("-- No entries --\n", [], None),
+    ("-- Boot 1a2b --\nOct 18 10:00:01 srv kernel: oops\n-- cursor: s=abc;i=3", ["Oct 18 10:00:01 srv kernel: oops"], "s=abc;i=3"),
+])
+def test_parse_journal(output, entries, cursor):
+    assert logtail.parse_journal(output) == (entries, cursor)
+
+
+def test_journal_command_quotes_cursor():
+    command = logtail.journal_command("err", "s=a;b'c", 50, 200)
+    assert "--after-cursor='s=a;b'\"'\"'c'" in command
+    assert "-n 200" in command
+    assert logtail.journal_command("err", None, 50, 200).endswith("-n 50")
+
+
+def test_cursor_store_persists(tmp_path):
+    path = str(tmp_path / "cursors.json")
+    store = logtail.CursorStore(path)
+    store.set("srv", "critical", "s=1")
+    store.set("srv", "repl", {"inode": "1", "offset": 10})
+    reloaded = logtail.CursorStore(path)
+    assert reloaded.get("srv", "critical") == "s=1"
+    assert reloaded.get("srv", "repl") == {"inode": "1", "offset": 10}
+    assert reloaded.get("other", "critical") is None
+
+
+# Скрипт file_tail_script выполняется локально на временном файле
+@pytest.mark.skipif(not all(shutil.which(name) for name in ("sh", "awk", "stat", "od")), reason="нужны sh, awk, stat, od")
+class TestFileTailScript:
+    def read(self, path, state, pattern="replication|wal", limit=1000, initial=0):
+        script = logtail.file_tail_script(str(path), pattern, state, limit, MARKER, initial)
+        output = subprocess.run(["sh", "-c", script], capture_output=True, text=True, check=True).stdout
+        return logtail.parse_file_tail(output, MARKER, limit)
+
+    def test_incremental_reads(self, tmp_path):
+        path = tmp_path / "postgresql.log"
+        path.write_text("old WAL line\nother\n")
+        lines, state = self.read(path, None)
+        assert lines == []
+        with open(path, "a") as f:
+            f.write("Replication started\nnoise\nwal sen")
+        lines, state = self.read(path, state)
+        assert lines == ["Replication started"]
+        with open(path, "a") as f:
+            f.write("der ready\n")
+        lines, state = self.read(path, state)
+        assert lines == ["wal sender ready"]
+        assert state["offset"] == os.path.getsize(path)
+
+    def test_initial_skips_partial_first_line(self, tmp_path):
+        path = tmp_path / "postgresql.log"
+        path.write_text("xx wal first\nwal second\nwal third\n")
+        lines, _ = self.read(path, None, initial=len("wal second\nwal third\n") + 3)
+        assert lines == ["wal second", "wal third"]
+
+    def test_rotation_and_truncation_restart(self, tmp_path):
+        path = tmp_path / "postgresql.log"
+        path.write_text("wal one\nwal two\n")
+        _, state = self.read(path, {"inode": "0", "offset": 0})
+        # Файл заменён новым (другой inode)
+        os.rename(path, tmp_path / "postgresql.log.1")
+        path.write_text("wal three\n")
+        lines, state = self.read(path, state)
+        assert lines == ["wal three"]
+        # Файл усечён
+        path.write_text("")
+        lines, state = self.read(path, state)
+        assert (lines, state["offset"]) == ([], 0)
+
+    @pytest.mark.parametrize("pattern, expected", [
+        ("a/b", ["path a/b"]),
+        ("it's", ["it's wal"]),
+        (r"x\.y", ["x.y"]),
+    ])
+    def test_pattern_special_characters(self, tmp_path, pattern, expected):
+        path = tmp_path / "postgresql.log"
+        path.write_text("path a/b\nit's wal\nx.y\nxzy\n")
+        lines, _ = self.read(path, {"inode": "0", "offset": 0}, pattern=pattern)
+        assert lines == expected
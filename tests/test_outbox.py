@@ -0,0 +1,110 @@
+import io
+import logging
+import threading
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from outbox import Outbox, OutboxFull, replayable
+
+
+@pytest.fixture
+def outbox():
+    box = Outbox(workers=2, rate=1000, chat_rate=1000, chat_burst=1000, retries=3)
+    yield box
+    box.stop()
+
+
+def test_queued_texts_are_merged(outbox):
+    sent = []
+    send = lambda merged: sent.append(merged) or len(sent)
+    futures = [outbox.submit(1, send, text) for text in ("a", "b", "c")]
+    outbox.start()
+    assert [future.result(timeout=5) for future in futures] == [1, 1, 1]
+    assert sent == ["a\nb\nc"]
+    assert outbox.stats()["coalesced"] == 2
+
+
+def test_merge_respects_limit_and_documents():
+    box = Outbox(workers=1, rate=1000, chat_rate=1000, chat_burst=1000, limit=5)
+    sent = []
+    futures = [
+        box.submit(1, lambda merged: sent.append(merged), "ab"),
+        box.submit(1, lambda merged: sent.append(merged), "cd"),
+        box.submit(1, lambda merged: sent.append(merged), "ef"),
+        box.submit(1, lambda: sent.append("document")),
+        box.submit(1, lambda merged: sent.append(merged), "gh"),
+    ]
+    box.start()
+    try:
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        box.stop()
+    assert sent == ["ab\ncd", "ef", "document", "gh"]
+
+
+def test_retry_after_resends_full_document(outbox):
+    source = io.BytesIO(b"payload")
+    source.name = "output.txt.gz"
+    document = replayable(source)
+    # Отправитель закрывает свой файл сразу после постановки в очередь (как delivery.deliver)
+    source.close()
+    uploads = []
+
+    def send():
+        stream = document()
+        uploads.append((stream.name, stream.read()))
+        if len(uploads) == 1:
+            raise RetryAfter(0)
+        return "ok"
+
+    future = outbox.submit(1, send)
+    outbox.start()
+    assert future.result(timeout=5) == "ok"
+    assert uploads == [("output.txt.gz", b"payload"), ("output.txt.gz", b"payload")]
+    assert outbox.stats()["retried"] == 1
+
+
+def test_retries_are_limited(outbox):
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise RetryAfter(0)
+
+    future = outbox.submit(1, send)
+    outbox.start()
+    with pytest.raises(RetryAfter):
+        future.result(timeout=5)
+    assert len(calls) == outbox.retries + 1
+    assert outbox.stats()["failed"] == 1
+
+
+def test_replayable_passes_through_non_files():
+    assert replayable("file_id")() == "file_id"
+
+
+def test_detached_failure_is_logged(outbox, caplog):
+    done = threading.Event()
+
+    def send():
+        raise BadRequest("Chat not found")
+
+    future = outbox.detach(42, outbox.submit(42, send))
+    future.add_done_callback(lambda _: done.set())
+    with caplog.at_level(logging.ERROR):
+        outbox.start()
+        assert done.wait(5)
+    assert isinstance(future.exception(), BadRequest)
+    assert any("42" in record.getMessage() for record in caplog.records)
+
+
+def test_full_chat_queue_rejects():
+    box = Outbox(workers=1, max_queue=2)
+    box.submit(1, lambda: None)
+    box.submit(1, lambda: None)
+    with pytest.raises(OutboxFull):
+        box.submit(1, lambda: None).result(timeout=1)
+    assert box.stats()["rejected"] == 1
+    box.stop()
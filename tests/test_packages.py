@@ -0,0 +1,108 @@
+import pytest
+
+import packages
+from packages import Package, PackageIndex, PackageInventory
+
+INDEX = PackageIndex([
+    Package("libssl3", "3.0.2-0ubuntu1.15", "amd64"),
+    Package("openssl", "3.0.2-0ubuntu1.15", "amd64"),
+    Package("openssh-server", "1:8.9p1-3ubuntu0.6", "amd64"),
+    Package("python3", "3.10.6-1~22.04", "amd64"),
+    Package("libpython3.10:i386", "3.10.12-1~22.04.3", "i386"),
+    Package("libpython3.10", "3.10.12-1~22.04.3", "amd64"),
+])
+
+
+@pytest.mark.parametrize("query, names", [
+    # Сначала совпадения по префиксу (по алфавиту), затем по подстроке
+    ("open", ["openssh-server", "openssl"]),
+    ("ssl", ["libssl3", "openssl"]),
+    ("python3", ["python3", "libpython3.10", "libpython3.10:i386"]),
+    ("OpenSSL", ["openssl"]),
+    (":i386", ["libpython3.10:i386"]),
+    ("nginx", []),
+])
+def test_search(query, names):
+    assert [package.name for package in INDEX.search(query)] == names
+
+
+def test_index_all_sorted():
+    assert [package.name for package in INDEX.all()] == sorted(INDEX.names)
+    assert len(INDEX) == 6
+
+
+@pytest.mark.parametrize("old, new, added, removed, upgraded", [
+    ([], [Package("a", "1", "all")], ["a"], [], []),
+    ([Package("a", "1", "all")], [], [], ["a"], []),
+    ([Package("a", "1", "all"), Package("b", "1", "all")], [Package("a", "2", "all"), Package("b", "1", "all")],
+     [], [], [("a", "1", "2")]),
+    ([Package("a", "1", "all")], [Package("a", "1", "all")], [], [], []),
+])
+def test_diff_packages(old, new, added, removed, upgraded):
+    diff = packages.diff_packages(PackageIndex(old), PackageIndex(new))
+    assert [package.name for package in diff.added] == added
+    assert [package.name for package in diff.removed] == removed
+    assert [(a.name, a.version, b.version) for a, b in diff.upgraded] == upgraded
+
+
+@pytest.mark.parametrize("output, mtime, names", [
+    ("1700000000\n", "1700000000", None),
+    ("1700000000\nii \tcurl\t7.81.0\tamd64\nrc \told\t1.0\tamd64\niU \thalf\t2.0\tall\nhi \theld\t3.0\tall\n", "1700000000", ["curl", "held"]),
+    ("1700000000\nmalformed line\n", "1700000000", []),
+])
+def test_parse_inventory(output, mtime, names):
+    parsed_mtime, parsed = packages.parse_inventory(output)
+    assert parsed_mtime == mtime
+    assert (None if parsed is None else [package.name for package in parsed]) == names
+
+
+@pytest.mark.parametrize("output", ["", "stat: cannot stat\n"])
+def test_parse_inventory_rejects(output):
+    with pytest.raises(ValueError):
+        packages.parse_inventory(output)
+
+
+def test_format_diff():
+    diff = packages.PackageDiff(0, [Package("curl", "7.81", "amd64")], [], [])
+    assert "🟢 Установлены (1):" in packages.format_diff(diff)
+    assert packages.format_diff(packages.PackageDiff(0, [], [], [])) == "Изменений нет."
+
+
+# Хост, по очереди возвращающий заданный вывод inventory_script; запоминает выполненные скрипты
+class Host:
+    def __init__(self, *outputs):
+        self.outputs = list(outputs)
+        self.scripts = []
+
+    def __call__(self, script):
+        self.scripts.append(script)
+        return self.outputs.pop(0)
+
+
+def test_refresh_rereads_only_when_dpkg_changes():
+    inventory = PackageInventory()
+    host = Host("100\nii \tcurl\t1\tamd64\n", "100\n", "200\nii \tcurl\t2\tamd64\n")
+    assert len(inventory.refresh("srv", host)) == 1
+    assert len(inventory.refresh("srv", host)) == 1
+    assert inventory.last_diff("srv") is None
+    assert inventory.refresh("srv", host).packages["curl"].version == "2"
+    assert host.scripts == [packages.inventory_script(mtime) for mtime in (None, "100", "100")]
+    assert [(a.version, b.version) for a, b in inventory.last_diff("srv").upgraded] == [("1", "2")]
+
+
+def test_refresh_does_not_cache_empty_list():
+    inventory = PackageInventory()
+    # Первый запрос вернул пустой список (сбой dpkg-query): mtime не запоминается
+    host = Host("100\n", "100\nii \tcurl\t1\tamd64\n")
+    assert len(inventory.refresh("srv", host)) == 0
+    assert len(inventory.refresh("srv", host)) == 1
+    assert host.scripts == [packages.inventory_script(None), packages.inventory_script(None)]
+    assert inventory.last_diff("srv") is None
+
+
+def test_refresh_max_age_skips_host():
+    inventory = PackageInventory()
+    host = Host("100\nii \tcurl\t1\tamd64\n")
+    inventory.refresh("srv", host)
+    assert len(inventory.refresh("srv", host, max_age=60)) == 1
+    assert len(host.scripts) == 1
@@ -0,0 +1,162 @@
+import os
+
+import pytest
+
+import backends
+import collector
+import parsers
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+# Сохранённый вывод команды с наблюдаемого хоста
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0", 0),
+    ("0B", 0),
+    ("16K", 16384),
+    ("1.5G", 1610612736),
+    ("5,9Gi", int(5.9 * 1024 ** 3)),
+    ("397Mi", 397 * 1024 ** 2),
+    ("8199077888", 8199077888),
+])
+def test_parse_size(value, expected):
+    assert parsers.parse_size(value) == expected
+
+
+def test_parse_size_rejects_garbage():
+    with pytest.raises(ValueError):
+        parsers.parse_size("-")
+
+
+def test_parse_df_bytes():
+    records = {record.mount: record for record in parsers.parse_df(fixture("df_P_B1.txt"))}
+    assert len(records) == 7
+    root = records["/"]
+    assert root.filesystem == "/dev/mapper/vg0-root"
+    assert (root.size, root.used, root.avail, root.use_percent) == (52521566208, 38461927424, 11357798400, 78.0)
+    assert records["/var/lib/postgresql"].use_percent == 100.0
+    # Имя файловой системы с пробелом
+    assert records["/mnt/backup"].filesystem == "//nas/backup share"
+
+
+def test_parse_df_human():
+    records = {record.mount: record for record in parsers.parse_df(fixture("df_h.txt"))}
+    assert records["/"].size == 49 * 1024 ** 3
+    assert records["/dev/shm"].used == 16 * 1024
+    assert records["/var/lib/postgresql"].avail == int(1.8 * 1024 ** 3)
+    assert records["/dev"].used == 0
+
+
+def test_parse_free_bytes():
+    mem, swap = parsers.parse_free(fixture("free_b.txt"))
+    assert mem == parsers.MemoryUsage("Mem", 8199077888, 2948222976, 418787328, 109932544, 4832067584, 4845887488)
+    assert swap.kind == "Swap"
+    assert (swap.total, swap.used, swap.free) == (2147479552, 268435456, 1879044096)
+    assert swap.available is None
+
+
+def test_parse_free_human():
+    mem, swap = parsers.parse_free(fixture("free_h.txt"))
+    assert mem.total == int(7.6 * 1024 ** 3)
+    assert mem.free == 399 * 1024 ** 2
+    assert swap.used == 256 * 1024 ** 2
+
+
+def test_parse_free_old_format():
+    records = parsers.parse_free(fixture("free_old.txt"))
+    assert [record.kind for record in records] == ["Mem", "Swap"]
+    assert records[0].buff_cache == 356515840
+    assert records[0].available is None
+
+
+def test_parse_mpstat():
+    (record,) = parsers.parse_mpstat(fixture("mpstat.txt"))
+    assert record.cpu == "all"
+    assert (record.usr, record.sys, record.iowait, record.idle) == (3.12, 1.05, 0.42, 95.32)
+
+
+def test_parse_mpstat_prefers_averages():
+    # Русская локаль: запятая в числах и строки "Среднее:"
+    records = {record.cpu: record for record in parsers.parse_mpstat(fixture("mpstat_interval.txt"))}
+    assert sorted(records) == ["0", "1", "all"]
+    assert records["all"].usr == 12.5
+    assert records["1"].idle == 93.94
+
+
+def test_parse_ps():
+    records = parsers.parse_ps(fixture("ps.txt"))
+    assert [record.pid for record in records] == [1, 2, 812, 845, 611, 1530]
+    postgres = records[2]
+    assert postgres.user == "postgres"
+    assert (postgres.cpu, postgres.mem) == (0.3, 1.2)
+    assert (postgres.vsz, postgres.rss) == (219840 * 1024, 98304 * 1024)
+    # Процесс запущен больше суток назад: время запуска — одно поле, команда не сдвигается
+    assert (postgres.start, postgres.time) == ("Oct15", "01:02:03")
+    assert postgres.command.startswith("/usr/lib/postgresql/14/bin/postgres -D")
+    assert records[3].command == "postgres: 14/main: walsender replicator 192.168.237.225(40412) streaming 0/3000148"
+    assert records[0].start == "2025"
+    assert records[1].command == "[kthreadd]"
+
+
+def test_parse_ss():
+    records = parsers.parse_ss(fixture("ss.txt"))
+    assert len(records) == 6
+    dns = records[0]
+    assert (dns.netid, dns.state, dns.local_address, dns.local_port) == ("udp", "UNCONN", "127.0.0.53%lo", "53")
+    postgres = records[2]
+    assert (postgres.state, postgres.send_q, postgres.local_address, postgres.local_port) == ("LISTEN", 244, "127.0.0.1", "5432")
+    ipv6 = records[4]
+    assert (ipv6.local_address, ipv6.local_port, ipv6.peer_address, ipv6.peer_port) == ("::", "9100", "::", "*")
+
+
+def test_parse_uptime():
+    assert parsers.parse_uptime(fixture("uptime.txt")) == parsers.LoadAverage(2, 0.52, 0.58, 0.59)
+    assert parsers.parse_uptime(fixture("uptime_ru.txt")) == parsers.LoadAverage(1, 1.05, 0.7, 0.31)
+
+
+def test_parse_uptime_rejects_garbage():
+    with pytest.raises(ValueError):
+        parsers.parse_uptime("uptime: command not found")
+
+
+def test_extract_metrics():
+    sections = {
+        "uptime": (fixture("uptime.txt"), 0),
+        "free": (fixture("free_b.txt"), 0),
+        "df": (fixture("df_P_B1.txt"), 0),
+        "mpstat": (fixture("mpstat.txt"), 0),
+        "journal": ("3\ns=abc;i=1\n", 0),
+    }
+    metrics = collector.extract_metrics(sections)
+    assert metrics["load1"] == 0.52
+    assert metrics["mem"] == pytest.approx((8199077888 - 4845887488) / 8199077888 * 100)
+    assert metrics["swap"] == pytest.approx(12.5, abs=0.01)
+    # Только блочные устройства
+    assert sorted(name for name in metrics if name.startswith("disk:")) == ["disk:/", "disk:/boot", "disk:/var/lib/postgresql"]
+    assert metrics["cpu"] == pytest.approx(4.68)
+    assert metrics["journal_errors"] == 3.0
+
+
+# Вывод ProcBackend (backends.py) должен разбираться теми же парсерами, что и вывод настоящих команд
+@pytest.mark.skipif(not os.path.exists("/proc/meminfo"), reason="нужен /proc")
+def test_proc_backend_output_parses():
+    backend = backends.ProcBackend("/")
+
+    def run(command):
+        return backend.exec_command(command)[0].decode()
+
+    assert parsers.parse_uptime(run("uptime")).load1 >= 0
+    for command in ("free -b", "free -h"):
+        mem, swap = parsers.parse_free(run(command))
+        assert (mem.kind, swap.kind) == ("Mem", "Swap")
+        assert 0 < mem.available <= mem.total
+    for command in ("df -P -B1", "df -h"):
+        assert any(record.mount == "/" for record in parsers.parse_df(run(command)))
+    (cpu,) = parsers.parse_mpstat(run("mpstat"))
+    assert cpu.cpu == "all" and 0 <= cpu.idle <= 100
@@ -0,0 +1,77 @@
+import shutil
+import subprocess
+
+import pytest
+
+import processes
+
+
+# Вывод processes.ps_command(): процессы старше суток (Oct15) и прошлого года (2025) вместе с недавними
+PS_OUTPUT = """\
+USER                               PID %CPU %MEM    VSZ   RSS TT       STAT START     TIME COMMAND
+root                                 1  0.0  0.1 168532 13120 ?        Ss   2025   12:01:44 /sbin/init splash
+postgres                           812  0.3  1.2 219840 98304 ?        Ss   Oct15  01:02:03 /usr/lib/postgresql/14/bin/postgres -D /var/lib/postgresql/14/main
+www-data                          1530  2.5  0.8 401232 65536 ?        Sl   09:41 00:00:12 /usr/bin/java -jar /opt/app.jar
+root                              1777  0.0  0.0  10072  3340 ?        R    10:02 00:00:00 ps -eo user:32,pid,pcpu,pmem,vsz,rss,tty,stat,start_time,time,args --sort=pid
+"""
+
+
+def test_parse_snapshot_old_processes():
+    snapshot = processes.parse_snapshot(PS_OUTPUT)
+    assert sorted(snapshot) == [1, 812, 1530]
+    postgres = snapshot[812]
+    assert postgres.start == "Oct15"
+    assert postgres.time == "01:02:03"
+    assert postgres.command.startswith("/usr/lib/postgresql/14/bin/postgres")
+    assert postgres.rss == 98304 * 1024
+    assert snapshot[1].start == "2025"
+
+
+def test_diff_detects_reused_pid():
+    previous = processes.parse_snapshot(PS_OUTPUT)
+    current = processes.parse_snapshot(PS_OUTPUT.replace(
+        "219840 98304 ?        Ss   Oct15  01:02:03 /usr/lib/postgresql/14/bin/postgres",
+        "219840 98304 ?        Ss   10:05 00:00:00 /usr/lib/postgresql/14/bin/postgres",
+    ).replace("401232 65536", "401232 99999"))
+    started, exited, grew = processes.diff_processes(previous, current, 10 * 1048576)
+    assert [p.pid for p in started] == [812]
+    assert [p.pid for p in exited] == [812]
+    assert [new.pid for _, new in grew] == [1530]
+
+
+def test_diff_without_changes():
+    snapshot = processes.parse_snapshot(PS_OUTPUT)
+    assert processes.format_diff(*processes.diff_processes(snapshot, snapshot, 1)) == "Изменений нет."
+
+
+@pytest.mark.skipif(shutil.which("awk") is None, reason="нужен awk")
+@pytest.mark.parametrize("user, match, expected", [
+    ("postgres", None, ["812"]),
+    (None, "java -jar", ["1530"]),
+    (None, "01:02:03", []),
+    ("root", "", ["1", "1777"]),
+])
+def test_remote_filter(user, match, expected):
+    # Фильтр из ps_command применяется к сохранённому выводу ps вместо запуска ps
+    command = processes.ps_command(sort="pid", user=user, match=match)
+    pipeline = command.split(" | ", 1)[1]
+    output = subprocess.run(["sh", "-c", pipeline], input=PS_OUTPUT, capture_output=True, text=True, check=True).stdout
+    lines = output.splitlines()
+    assert lines[0].startswith("USER")
+    assert [line.split()[1] for line in lines[1:]] == expected
+
+
+# Пустой match не должен отбрасывать строки ни в одной реализации awk (в части из них index(c, "") — 0)
+@pytest.mark.parametrize("awk", [name for name in ("gawk", "mawk", "nawk", "busybox") if shutil.which(name)])
+def test_remote_filter_empty_match(awk):
+    command = processes.ps_command(sort="pid", user="root", match="")
+    pipeline = command.split(" | ", 1)[1].replace(" awk '", f" {awk} awk '" if awk == "busybox" else f" {awk} '")
+    output = subprocess.run(["sh", "-c", pipeline], input=PS_OUTPUT, capture_output=True, text=True, check=True).stdout
+    assert [line.split()[1] for line in output.splitlines()[1:]] == ["1", "1777"]
+
+
+def test_ps_command_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        processes.ps_command(sort="name")
+    with pytest.raises(ValueError):
+        processes.ps_command(user="root; rm -rf /")
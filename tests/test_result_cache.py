@@ -0,0 +1,150 @@
+import threading
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return clock
+
+
+def counter():
+    calls = []
+
+    def func():
+        calls.append(1)
+        return len(calls)
+    return func, calls
+
+
+def test_ttl_expiry(clock):
+    cache = ResultCache()
+    func, calls = counter()
+    assert cache.get_or_run("k", 10, func) == (1, 0.0)
+    clock.now += 9
+    assert cache.get_or_run("k", 10, func) == (1, 9.0)
+    clock.now += 1
+    assert cache.get_or_run("k", 10, func) == (2, 0.0)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_zero_ttl_and_refresh_bypass_cache(clock):
+    cache = ResultCache()
+    func, calls = counter()
+    cache.get_or_run("k", 0, func)
+    cache.get_or_run("k", 0, func)
+    assert len(calls) == 2 and len(cache) == 0
+    cache.get_or_run("k", 60, func)
+    assert cache.get_or_run("k", 60, func, refresh=True) == (4, 0.0)
+    assert cache.get_or_run("k", 60, func) == (4, 0.0)
+
+
+def test_lru_eviction(clock):
+    cache = ResultCache(maxsize=2)
+    cache.get_or_run("a", 60, lambda: "a")
+    cache.get_or_run("b", 60, lambda: "b")
+    # Обращение к "a" делает давно не использованной запись "b"
+    cache.get_or_run("a", 60, lambda: "a2")
+    cache.get_or_run("c", 60, lambda: "c")
+    assert len(cache) == 2
+    assert cache.get_or_run("a", 60, lambda: "a3")[0] == "a"
+    assert cache.get_or_run("b", 60, lambda: "b2")[0] == "b2"
+
+
+def test_errors_are_not_cached(clock):
+    cache = ResultCache()
+
+    def fail():
+        raise RuntimeError("ssh")
+    with pytest.raises(RuntimeError):
+        cache.get_or_run("k", 60, fail)
+    assert cache.get_or_run("k", 60, lambda: "ok") == ("ok", 0.0)
+
+
+def test_invalidate():
+    cache = ResultCache()
+    for key in (("srv", "df"), ("srv", "free"), ("db", "emails")):
+        cache.get_or_run(key, 60, lambda: key)
+    assert cache.invalidate(lambda key: key[0] == "srv") == 2
+    assert len(cache) == 1
+    assert cache.invalidate() == 1
+
+
+# Событие, считающее ожидающие его потоки
+class WaitCounter(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.waiting = 0
+        self._counted = threading.Condition()
+
+    def wait(self, timeout=None):
+        with self._counted:
+            self.waiting += 1
+            self._counted.notify_all()
+        return super().wait(timeout)
+
+    def all_waiting(self, count):
+        with self._counted:
+            return self._counted.wait_for(lambda: self.waiting >= count, 5)
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_concurrent_callers_share_one_computation(fail):
+    cache = ResultCache()
+    callers = 8
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        assert release.wait(5)
+        if fail:
+            raise RuntimeError("ssh")
+        return "result"
+
+    results = []
+    lock = threading.Lock()
+
+    def call():
+        try:
+            value = cache.get_or_run("k", 60, slow)[0]
+        except RuntimeError as e:
+            value = e
+        with lock:
+            results.append(value)
+
+    owner = threading.Thread(target=call)
+    owner.start()
+    assert started.wait(5)
+    # Остальные запросы приходят, пока первый ещё выполняется, и ждут его результата
+    done = cache._in_flight["k"].done = WaitCounter()
+    waiters = [threading.Thread(target=call) for _ in range(callers - 1)]
+    for thread in waiters:
+        thread.start()
+    assert done.all_waiting(callers - 1)
+    release.set()
+    for thread in [owner] + waiters:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == callers
+    if fail:
+        assert all(isinstance(value, RuntimeError) for value in results)
+        assert len(cache) == 0
+    else:
+        assert results == ["result"] * callers
+        assert cache.misses == 1
@@ -0,0 +1,66 @@
+import pytest
+
+import ssh_pool
+from ssh_pool import SessionClosed, SSHSessionManager
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.active = False
+
+
+@pytest.fixture
+def transports(monkeypatch):
+    opened = []
+
+    def connect(session):
+        session._transport = FakeTransport()
+        opened.append(session._transport)
+    monkeypatch.setattr(ssh_pool.SSHSession, "_connect", connect)
+    return opened
+
+
+def test_close_host_finalizes_removed_sessions(transports):
+    manager = SSHSessionManager("user", "secret")
+    session = manager.get("srv")
+    session.transport()
+    assert manager.close("srv") == 1
+    assert not transports[0].active
+    # Поток, ещё работающий со старой сессией, не может её переподключить
+    with pytest.raises(SessionClosed):
+        session.transport()
+    assert len(transports) == 1
+    # Новая команда получает новую сессию
+    fresh = manager.get("srv")
+    assert fresh is not session
+    fresh.transport()
+    assert len(transports) == 2
+
+
+def test_reconnect_after_connection_loss(transports):
+    session = SSHSessionManager("user", "secret").get("srv")
+    session.transport().active = False
+    session.transport()
+    assert [transport.active for transport in transports] == [False, True]
+    # Обычное закрытие (например, после ошибки канала) допускает переподключение
+    session.close()
+    session.transport()
+    assert len(transports) == 3
+
+
+def test_closed_manager_refuses_sessions(transports):
+    manager = SSHSessionManager("user", "secret")
+    session = manager.get("srv")
+    session.transport()
+    manager.close()
+    with pytest.raises(SessionClosed):
+        manager.get("other")
+    with pytest.raises(SessionClosed):
+        session.transport()
+    assert not any(transport.active for transport in transports)
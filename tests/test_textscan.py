@@ -0,0 +1,88 @@
+import gzip
+import zipfile
+
+import pytest
+
+import textscan
+
+SIZE = 100
+OVERLAP = 20
+
+
+# Текст длины length из пробелов с адресами, начинающимися в заданных позициях
+def make_text(length, emails):
+    text = [" "] * length
+    for position, email in emails.items():
+        text[position:position + len(email)] = email
+    return "".join(text)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# Все совпадения по всем окнам, без объединения повторов между окнами
+def scan(text, chunk_size):
+    found = []
+    for window, begin, end in textscan.iter_windows(chunked(text, chunk_size), SIZE, OVERLAP):
+        found.extend(textscan.scan_window("email", window, begin, end))
+    return found
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 100, 1000])
+@pytest.mark.parametrize("position, email", [
+    (0, "first@example.com"),
+    # Пересекает границу первого окна: относится к первому, во втором видно только в контексте
+    (SIZE - 5, "cross@example.com"),
+    # Целиком лежит в перекрытии: в тексте первого окна есть, но относится ко второму
+    (SIZE + 2, "overlap@example.com"),
+    # Начинается ровно на границе окна
+    (SIZE, "edge@example.com"),
+    # Граница второго окна
+    (2 * SIZE - 3, "second@example.com"),
+])
+def test_match_reported_once(chunk_size, position, email):
+    text = make_text(3 * SIZE + 10, {position: email})
+    assert scan(text, chunk_size) == [email]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 100, 250])
+def test_windows_cover_text_without_gaps(chunk_size):
+    text = "".join(chr(ord("a") + i % 26) for i in range(5 * SIZE + 37))
+    covered = []
+    offset = 0
+    for window, begin, end in textscan.iter_windows(chunked(text, chunk_size), SIZE, OVERLAP):
+        assert end - begin <= SIZE
+        assert len(window) - end <= OVERLAP
+        assert begin <= OVERLAP
+        covered.append(window[begin:end])
+        assert text[offset:offset + end - begin] == window[begin:end]
+        offset += end - begin
+    assert "".join(covered) == text
+
+
+def test_short_text_is_one_window():
+    assert list(textscan.iter_windows(["a@b.ru"], SIZE, OVERLAP)) == [("a@b.ru", 0, 6)]
+    assert list(textscan.iter_windows([], SIZE, OVERLAP)) == []
+
+
+@pytest.mark.parametrize("kind", ["plain", "gzip", "zip"])
+def test_read_chunks_formats(tmp_path, kind):
+    data = "one@example.com\nдва@пример.рф\n".encode()
+    path = tmp_path / "input"
+    if kind == "gzip":
+        path.write_bytes(gzip.compress(data))
+    elif kind == "zip":
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("a.txt", data)
+            archive.writestr("b.txt", b"three@example.com")
+    else:
+        path.write_bytes(data)
+    progress = []
+    # Порции по 5 байт разрезают многобайтовые символы UTF-8
+    text = "".join(textscan.read_chunks(str(path), 5, lambda done, total: progress.append((done, total))))
+    assert text.startswith(data.decode())
+    if kind == "zip":
+        assert text.endswith("three@example.com\n")
+    assert progress == sorted(progress)
+    assert progress[-1][0] <= progress[-1][1]
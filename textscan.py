@@ -0,0 +1,87 @@
+import codecs
+import gzip
+import zipfile
+
+import extraction
+
+
+# Совпадения длиннее OVERLAP символов на границе окон могут быть потеряны или обрезаны
+OVERLAP = 1024
+
+
+# Двоичные потоки документа: для zip — каждый файл архива, для gzip — распакованный поток,
+# иначе — сам файл. Тип определяется по сигнатуре, а не по имени файла
+def open_streams(path):
+    with open(path, "rb") as f:
+        signature = f.read(4)
+    if signature[:2] == b"\x1f\x8b":
+        with gzip.open(path, "rb") as stream:
+            yield stream
+    elif signature == b"PK\x03\x04":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as stream:
+                    yield stream
+    else:
+        with open(path, "rb") as stream:
+            yield stream
+
+
+# Текст документа порциями по chunk_size байт; progress(прочитано, всего) вызывается после каждой порции.
+# Прогресс считается по сжатому файлу, поэтому для архивов он тоже монотонен
+def read_chunks(path, chunk_size, progress=None):
+    with open(path, "rb") as raw:
+        raw.seek(0, 2)
+        total = raw.tell()
+    for stream in open_streams(path):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+            if progress is not None:
+                progress(_consumed(stream, total), total)
+        # Файлы архива разделяются переводом строки, чтобы совпадения не склеивались
+        yield decoder.decode(b"", final=True) + "\n"
+
+
+def _consumed(stream, total):
+    # Для gzip и zip позиция берётся из нижележащего сжатого файла
+    for name in ("fileobj", "_fileobj"):
+        inner = getattr(stream, name, None)
+        if inner is not None and hasattr(inner, "tell"):
+            try:
+                return min(inner.tell(), total)
+            except (OSError, ValueError):
+                break
+    try:
+        return min(stream.tell(), total)
+    except (OSError, ValueError):
+        return total
+
+
+# Окна для независимого поиска: (текст, начало, конец). Текст окна содержит до overlap символов
+# контекста с каждой стороны, а совпадение относится к окну, если начинается в [начало, конец),
+# поэтому совпадения на границе порций находятся ровно один раз
+def iter_windows(chunks, size, overlap=OVERLAP):
+    buf = ""
+    head = 0
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) - head >= size + overlap:
+            yield buf[:head + size + overlap], head, head + size
+            buf = buf[head + size - overlap:]
+            head = overlap
+    if len(buf) > head:
+        yield buf, head, len(buf)
+
+
+# Поиск в одном окне (выполняется в процессе-воркере); возвращает уникальные нормализованные значения
+# в порядке появления
+def scan_window(kind, text, begin, end):
+    return extraction.extract(kind, text, begin, end)
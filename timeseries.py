@@ -0,0 +1,98 @@
+import threading
+from array import array
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+# Кольцевой буфер фиксированной ёмкости: время и значение хранятся в массивах double,
+# при переполнении перезаписываются самые старые точки
+class RingBuffer:
+    __slots__ = ("capacity", "times", "values", "start", "size")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.values = array("d", [0.0]) * capacity
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp, value):
+        index = (self.start + self.size) % self.capacity
+        self.times[index] = timestamp
+        self.values[index] = value
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    # Точки (время, значение) начиная с момента since, по возрастанию времени
+    def since(self, since):
+        points = []
+        for offset in range(self.size):
+            index = (self.start + offset) % self.capacity
+            if self.times[index] >= since:
+                points.append((self.times[index], self.values[index]))
+        return points
+
+    def last(self):
+        if not self.size:
+            return None
+        index = (self.start + self.size - 1) % self.capacity
+        return self.times[index], self.values[index]
+
+
+# Хранилище временных рядов: отдельный кольцевой буфер на каждую пару (хост, метрика)
+class MetricsStore:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, host, timestamp, metrics):
+        with self._lock:
+            for metric, value in metrics.items():
+                series = self._series.get((host, metric))
+                if series is None:
+                    series = self._series[(host, metric)] = RingBuffer(self.capacity)
+                series.append(timestamp, value)
+
+    def metrics(self, host):
+        with self._lock:
+            return sorted(metric for series_host, metric in self._series if series_host == host)
+
+    def series(self, host, metric, since):
+        with self._lock:
+            series = self._series.get((host, metric))
+            return series.since(since) if series is not None else []
+
+    def last(self, host, metric):
+        with self._lock:
+            series = self._series.get((host, metric))
+            return series.last() if series is not None else None
+
+
+# Прореживание ряда до buckets интервалов: (начало интервала, минимум, среднее, максимум)
+def downsample(points, buckets):
+    if not points:
+        return []
+    start = points[0][0]
+    width = max((points[-1][0] - start) / buckets, 1e-9)
+    groups = {}
+    for timestamp, value in points:
+        bucket = min(int((timestamp - start) / width), buckets - 1)
+        groups.setdefault(bucket, []).append(value)
+    return [
+        (start + bucket * width, min(values), sum(values) / len(values), max(values))
+        for bucket, values in sorted(groups.items())
+    ]
+
+
+# Текстовый график ряда значений
+def sparkline(values, low=None, high=None):
+    if not values:
+        return ""
+    low = min(values) if low is None else low
+    high = max(values) if high is None else high
+    span = (high - low) or 1
+    return "".join(SPARK_CHARS[min(int((value - low) / span * len(SPARK_CHARS)), len(SPARK_CHARS) - 1)] for value in values)
@@ -0,0 +1,71 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Ограниченный пул потоков для обработчиков команд.
+# Диспетчер только ставит задачу в очередь и сразу переходит к следующему обновлению;
+# если в очереди уже max_queue задач, новая задача отклоняется.
+class HandlerPool:
+    def __init__(self, workers=8, max_queue=100):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="handler",
+                                            initializer=self._init_worker)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._max_queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def _init_worker(self):
+        self._local.worker = True
+
+    # Поток пула: в нём можно ждать медленных операций, не задерживая диспетчер
+    def in_worker(self):
+        return getattr(self._local, "worker", False)
+
+    def _run(self, func, args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            func(*args)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            logging.exception("Ошибка в обработчике %s", getattr(func, "__name__", func))
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    # Ставит func(*args) в очередь; возвращает False, если очередь переполнена
+    def submit(self, func, *args):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                logging.warning("Очередь обработчиков переполнена (%d), задача отклонена", self._queued)
+                return False
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        self._executor.submit(self._run, func, args)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)